@@ -0,0 +1,119 @@
+"""
+admission.py
+------------
+Bounded per-system task queues: capacity, predicted wait and load shedding.
+
+Every task gets a predicted duration when it is submitted: the
+sequence_lint cycle-time estimate of its sequence, or a per-action default
+(QUEUE_LIMITS["default_task_s"]) for screen flows and PIN-only tasks,
+whose sequences are only compiled by the worker. Both are calibrated from
+measured runs by duration_model.py. The predicted wait of a new task is
+the remaining time of the running task plus the predicted durations of
+everything queued before it; etas() gives every queued job its predicted
+start and finish.
+
+A submission is refused (QueueFullError) when
+
+- the system already has QUEUE_LIMITS["capacity"] tasks waiting: 429,
+  retry once the running task is done
+- the predicted wait exceeds QUEUE_LIMITS["max_wait"]: 503, retry once the
+  backlog has drained below the limit
+
+Queued tasks older than QUEUE_LIMITS["shed_after"] are shed: they are
+marked "expired" and the worker drops them instead of moving the arm for a
+client that has given up. Per-system overrides live in
+SYSTEMS[system]["queue"].
+
+The bookkeeping (armsideclient.active_jobs) is updated under jobs_lock;
+the functions here only compute on it.
+"""
+
+from config import QUEUE_LIMITS, SYSTEMS
+from duration_model import base_estimate, model as duration_model
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit_task when a system cannot take another task"""
+
+    def __init__(self, message, system, status, estimated_wait, retry_after):
+        super().__init__(message)
+        self.system = system
+        self.status = status                    # HTTP status: 429 or 503
+        self.estimated_wait = estimated_wait    # seconds before a new task would start
+        self.retry_after = retry_after          # seconds until a retry may be admitted
+
+
+def limits_for(system_id):
+    """QUEUE_LIMITS with the system's overrides applied"""
+    return dict(QUEUE_LIMITS, **SYSTEMS.get(system_id, {}).get("queue", {}))
+
+
+def predict_duration(sequence, meta, limits=None):
+    """
+    Predicted seconds of a task: the sequence estimate or the action
+    default, calibrated for the system when the duration model has runs.
+    The uncalibrated estimate is kept in meta["base_s"] for calibration.
+    """
+    defaults = (limits or QUEUE_LIMITS)["default_task_s"]
+    default = defaults.get(meta.get("action"), defaults["default"])
+    base = base_estimate(sequence)
+    meta["base_s"] = base
+    if duration_model is None:
+        return base if base is not None else default
+    return duration_model.predict(meta.get("system"), meta, base, default)
+
+
+def remaining(meta, now):
+    """Predicted seconds left of a queued or running task"""
+    predicted = meta.get("predicted_s", 0)
+    if meta.get("status") == "running" and meta.get("started_at"):
+        return max(0.0, predicted - (now - meta["started_at"]))
+    return predicted
+
+
+def is_stale(meta, now, limits):
+    """True if a queued task has waited longer than the shedding limit"""
+    shed_after = limits.get("shed_after")
+    return bool(shed_after) and meta.get("status") == "queued" and now - meta["queued_at"] > shed_after
+
+
+def backlog(active, now):
+    """(tasks waiting, predicted seconds before a new task would start)"""
+    waiting = sum(1 for m in active if m.get("status") == "queued")
+    return waiting, round(sum(remaining(m, now) for m in active), 1)
+
+
+def etas(active, now):
+    """
+    {job_id: (seconds to start, seconds to finish)} of a system's queued and
+    running jobs, in queue order (`active` in submission order)
+    """
+    out, clock = {}, 0.0
+    for meta in sorted(active, key=lambda m: m.get("status") != "running"):
+        if meta.get("status") not in ("queued", "running"):
+            continue
+        left = remaining(meta, now)
+        out[meta["job_id"]] = (round(clock, 1), round(clock + left, 1))
+        clock += left
+    return out
+
+
+def admit(system_id, active, now, limits=None):
+    """
+    Check a new submission against the system's limits. `active` are the
+    system's queued and running jobs. Returns the predicted wait in seconds,
+    raises QueueFullError when the task must be refused.
+    """
+    limits = limits or limits_for(system_id)
+    waiting, wait = backlog(active, now)
+    capacity = limits.get("capacity")
+    if capacity is not None and waiting >= capacity:
+        running = [remaining(m, now) for m in active if m.get("status") == "running"]
+        retry_after = max(1.0, running[0] if running else wait / max(1, waiting))
+        raise QueueFullError(f"System {system_id} queue is full ({waiting} tasks waiting)",
+                             system_id, 429, wait, round(retry_after, 1))
+    max_wait = limits.get("max_wait")
+    if max_wait is not None and wait > max_wait:
+        raise QueueFullError(f"System {system_id} is overloaded: estimated wait {wait:.0f}s "
+                             f"exceeds {max_wait}s", system_id, 503, wait, round(max(1.0, wait - max_wait), 1))
+    return wait
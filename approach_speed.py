@@ -0,0 +1,145 @@
+"""
+approach_speed.py
+-----------------
+Splits long approach moves into a fast transit and a slow final approach.
+
+Recorders use a handful of fixed speeds: a move runs at one speed across
+its whole length, so a press taught at 20 crawls the full way from the
+previous waypoint, while a grasp taught at 95 arrives at the card as fast
+as it left home. This pass finds the moves that end at a contact target
+and cuts each into two moves along the same joint-space line:
+
+    transit   from the previous pose to APPROACH_SPEED["final_deg"] short
+              of the target, at APPROACH_SPEED["transit_speed"] (the arm's
+              joint speed limit) or the recorded speed if that is higher
+    final     the last final_deg into the target, at the recorded speed,
+              capped at the action's "final_speed"
+
+A move ends at a contact target when it is a slow move (speed at or below
+the action's "contact_speed") or the next step after it, sleeps aside, is
+a gripper, tool move, linear move or unknown step. Moves that start at a contact
+target (retracts, the second half of a press) and the first move of a
+sequence (unknown start pose) are never split, nor are moves shorter than
+the action's "min_deg" or splits that sequence_lint estimates to be no
+faster and no gentler than the recorded move.
+
+set_servo_angle interpolates in joint space, so both halves follow the
+recorded path and sweep the same workspace volume. Thresholds are per
+action type in APPROACH_SPEED["actions"], falling back to "default". The
+worker applies the pass to every task sequence before it runs; recordings
+can be checked offline:
+
+    python approach_speed.py Recorded_file/SYSTEM2/TAP/tap_system2_rack1.json --action tap [--report]
+"""
+
+from config import APPROACH_SPEED, PATH_SIMPLIFY
+from path_simplify import CONTACT_NEIGHBOURS
+from sequence_lint import JOINT_ACCEL_DEG_S2, KNOWN_STEP_TYPES, lint_sequence, move_time
+from warm_start import steps_of
+
+
+def settings_for(action):
+    """Approach settings of an action type, over the defaults"""
+    actions = APPROACH_SPEED["actions"]
+    return dict(actions["default"], **actions.get(action, {}))
+
+
+def _next_step(steps, i):
+    """The nearest non-sleep step after i, or None"""
+    for step in steps[i + 1:]:
+        if step.get("type") != "sleep":
+            return step
+    return None
+
+
+def _contact_targets(steps, contact_speed):
+    """Indices of moves that end at a contact target"""
+    targets = set()
+    for i, step in enumerate(steps):
+        if step.get("type") != "move":
+            continue
+        following = _next_step(steps, i)
+        if step.get("speed", 0) <= contact_speed or (
+                following is not None and (following.get("type") in CONTACT_NEIGHBOURS
+                                           or following.get("type") not in KNOWN_STEP_TYPES)):
+            targets.add(i)
+    return targets
+
+
+def split_approaches(steps, action=None, settings=None):
+    """
+    Return (steps with split approach moves, list of changes). The input
+    is not modified. Each change is {"step": original 1-based index,
+    "change": "split", "reason": ...}.
+    """
+    s = dict(settings_for(action), **(settings or {}))
+    transit_speed, final_deg = APPROACH_SPEED["transit_speed"], s["final_deg"]
+    targets = _contact_targets(steps, s.get("contact_speed", PATH_SIMPLIFY["contact_speed"]))
+    out, changes = [], []
+    joints = None        # pose before the current step, None if unknown
+    at_contact = False   # the arm is at (or still pressing) a contact target
+    for i, step in enumerate(steps):
+        stype = step.get("type")
+        if stype != "move":
+            out.append(dict(step))
+            if stype in ("tool_move", "linear_move") or stype not in KNOWN_STEP_TYPES:
+                joints, at_contact = None, True
+            elif stype != "sleep":
+                at_contact = True
+            continue
+
+        target, speed = step["joints"][:6], step.get("speed", 0)
+        distance = max(abs(a - b) for a, b in zip(joints, target)) if joints is not None else 0.0
+        fast = max(speed, transit_speed)
+        slow = min(speed, s["final_speed"]) if s.get("final_speed") else speed
+        before = move_time(distance, speed, JOINT_ACCEL_DEG_S2)
+        after = (move_time(distance - final_deg, fast, JOINT_ACCEL_DEG_S2)
+                 + move_time(final_deg, slow, JOINT_ACCEL_DEG_S2))
+        if (i in targets and not at_contact and distance >= max(s["min_deg"], 2 * final_deg)
+                and speed > 0 and (after < before or slow < speed)):
+            t = 1.0 - final_deg / distance
+            via = [a + (b - a) * t for a, b in zip(joints, target)] + list(step["joints"][6:])
+            out.append({"type": "move", "joints": [round(v, 3) for v in via], "speed": fast})
+            out.append(dict(step, speed=slow))
+            changes.append({"step": i + 1, "change": "split",
+                            "reason": f"{distance:.1f} deg at {speed}: {distance - final_deg:.1f} deg transit "
+                                      f"at {fast}, {final_deg} deg final at {slow} "
+                                      f"({before:.2f}s -> {after:.2f}s)"})
+        else:
+            out.append(dict(step))
+        joints, at_contact = target, i in targets
+    return out, changes
+
+
+def shape_sequence(sequence, action=None):
+    """split_approaches() for a task sequence in any run_sequence() shape; returns a step list"""
+    steps = steps_of(sequence)
+    if not APPROACH_SPEED["enabled"] or not isinstance(steps, list):
+        return sequence
+    shaped, _ = split_approaches(steps, action)
+    return shaped
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    from sequence_lint import normalise
+
+    parser = argparse.ArgumentParser(description="Show the transit / final approach split of recorded sequences")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--action", default=None, help="action type whose thresholds apply (default: \"default\")")
+    parser.add_argument("--report", action="store_true", help="print every split")
+    args = parser.parse_args()
+
+    for path in args.files:
+        with open(path, "r") as f:
+            segments = normalise(json.load(f))
+        for name, steps in segments.items():
+            shaped, changes = split_approaches(steps, args.action)
+            _, before = lint_sequence(steps, name)
+            _, after = lint_sequence(shaped, name)
+            print(f"{path} [{name}]: {len(changes)} approach moves split, estimated "
+                  f"{before['motion_s'] + before['dwell_s']:.2f}s -> {after['motion_s'] + after['dwell_s']:.2f}s")
+            if args.report:
+                for change in changes:
+                    print(f"  step {change['step']}: {change['reason']}")
@@ -2,34 +2,60 @@ import threading
 import queue
 import json
 import time
+import uuid
 import logging
+from collections import OrderedDict
 from logging.handlers import RotatingFileHandler
 from xarm.wrapper import XArmAPI
-from config import SYSTEMS
+from config import SYSTEMS, PIN_PLANNER, PATH_SIMPLIFY, GRIPPER, RECOVERY, MOTION_PROCESS, PREPOSITION
+from screen_flow import get_planner
+from pin_planner import get_keypad_model
+from rack_frames import get_rack_sequence
+from path_simplify import simplify_data
+from gripper_control import get_tracker, GRIPPER_STEPS
+from warm_start import can_splice, drop_home_tail, drop_home_head, steps_of
+import checkpoints
+from checkpoints import clean_arm_error, MotionError
+from task_journal import journal, arm_joints
+from admission import admit, etas, is_stale, limits_for, predict_duration, QueueFullError
+from duration_model import model as duration_model
+from motion_process import MotionProcess
+from workspace import guard_for
+from prepositioning import IdlePolicy, get_stager
+from approach_speed import shape_sequence
 
 # Logging setup
-log_handler = RotatingFileHandler(
-    'robot_server.log', maxBytes=500*1024, backupCount=3
-)
-logger = logging.getLogger(__name__)
-if not logger.hasHandlers():
+def setup_logging():
+    """
+    Send the log to robot_server.log. Called once by the server entry point:
+    the motion processes import this module too, and several processes
+    rotating one file lose records; they send theirs to the server instead
+    (motion_process.py).
+    """
     handler = RotatingFileHandler(
         'robot_server.log', maxBytes=500*1024, backupCount=3
     )
-    formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)s | %(filename)s:%(lineno)d | %(funcName)s | %(message)s"
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s | %(levelname)s | %(filename)s:%(lineno)d | %(funcName)s | %(message)s",
+        handlers=[handler]
     )
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    logger.setLevel(logging.DEBUG)
 
 # Global variables for threading and queue management
 task_queues = {}           # {system_id: queue.Queue()}
 worker_threads = {}        # {system_id: threading.Thread}
-arm_connections = {}       # {system_id: XArmAPI}
-last_call_lock = threading.Lock()
-last_call = {}             # {ip: timestamp} for rate limiting
+arm_connections = {}       # {system_id: XArmAPI, or its MotionProcess with MOTION_PROCESS["enabled"]}
+arm_status_lock = threading.Lock()
 arm_status = {}            # {system_id: "idle" / "working"}
+jobs_lock = threading.Lock()
+jobs = OrderedDict()       # {job_id: meta} for queued/running/finished tasks
+MAX_FINISHED_JOBS = 1000   # finished jobs kept for status lookups
+dedup_index = {}           # {(system_id, content_key): meta} for queued/running jobs
+idempotency_index = OrderedDict()  # {(system_id, key): (meta, expires_at)}
+IDEMPOTENCY_TTL = 600      # seconds a client idempotency key keeps its job
+DEDUP_FIELDS = ("action", "rack", "choice", "denomination", "exact_amount", "confirm")
+active_jobs = {}           # {system_id: {job_id: meta}} queued/running jobs, for admission.py
+shutting_down = threading.Event()   # set by shutdown_systems(); later submissions are cancelled
 
 # Step handlers
 def handle_tool_move(arm, step):
@@ -43,11 +69,13 @@ def handle_tool_move(arm, step):
         rz = step.get("rz", 0)   # yaw
         speed = step.get("speed", 20)
 
-        arm.set_tool_position(
+        code = arm.set_tool_position(
             x=dx, y=dy, z=dz,
             roll=rx, pitch=ry, yaw=rz,
             speed=speed, wait=True
         )
+        if code != 0:
+            raise MotionError("set_tool_position", code, arm.error_code)
 
         if "delay" in step:
             time.sleep(step["delay"])
@@ -59,18 +87,38 @@ def handle_tool_move(arm, step):
 
 def handle_move(arm, step):
     try:
-        arm.set_servo_angle(
+        code = arm.set_servo_angle(
             angle=step["joints"], 
             speed=step["speed"], 
             is_radian=False, 
             wait=True
         )
+        if code != 0:
+            raise MotionError("set_servo_angle", code, arm.error_code)
         if "delay" in step:
             time.sleep(step["delay"])
     except Exception as e:
         logging.error(f"Move failed: {e}")
         raise
 
+def handle_linear_move(arm, step):
+    """Straight-line Cartesian move to an absolute TCP pose (recorders' move_to_cartesian2)"""
+    try:
+        x, y, z, roll, pitch, yaw = step["cartesian"][:6]
+        code = arm.set_position(
+            x=x, y=y, z=z,
+            roll=roll, pitch=pitch, yaw=yaw,
+            speed=step.get("speed", 20),
+            is_radian=False, relative=False, wait=True
+        )
+        if code != 0:
+            raise MotionError("set_position", code, arm.error_code)
+        if "delay" in step:
+            time.sleep(step["delay"])
+    except Exception as e:
+        logging.error(f"Linear move failed: {e}")
+        raise
+
 def handle_sleep(arm, step):
     """Handle sleep/delay operations"""
     duration = step.get("duration", 0)
@@ -79,6 +127,9 @@ def handle_sleep(arm, step):
 def handle_open(arm, step):
     """Handle gripper open operation"""
     try:
+        if GRIPPER["async"]:
+            get_tracker(arm).command(opening=True)
+            return
         arm.open_lite6_gripper()
         time.sleep(step.get("delay", 0.5))
     except Exception as e:
@@ -88,6 +139,9 @@ def handle_open(arm, step):
 def handle_close(arm, step):
     """Handle gripper close operation"""
     try:
+        if GRIPPER["async"]:
+            get_tracker(arm).command(opening=False)
+            return
         arm.close_lite6_gripper()
         time.sleep(step.get("delay", 0.5))
     except Exception as e:
@@ -100,57 +154,191 @@ STEP_HANDLERS = {
     "gripper_open": handle_open,
     "gripper_close": handle_close,
     "tool_move": handle_tool_move,   # ✅ NEW
+    "linear_move": handle_linear_move,
 }
 
 
-def run_sequence(arm, seq):
-    """Execute a sequence of steps on the robotic arm"""
+def run_sequence(arm, seq, start=0, on_step=None, guard=None):
+    """
+    Execute a sequence of steps on the robotic arm, beginning at step
+    index `start`. `on_step(i)` is called after each step i completes.
+    With a workspace `guard` (workspace.py) every motion step first
+    reserves the volume it sweeps.
+    """
     if not seq:
         logging.warning("Empty sequence provided")
         return
        # Unwrap dict format like {"tap_system2_rack1": [ ... ]}
     if isinstance(seq, dict) and len(seq) == 1:
         seq = list(seq.values())[0]  
+    gripper = get_tracker(arm)
+    previous_type = None
     for i, step in enumerate(seq):
+        if i < start:
+            continue
         try:
             stype = step.get("type")
+            if gripper.pending is not None:
+                # The recorded settle sleep: replaced by a sensed wait, else max(recorded, settle)
+                if stype == "sleep" and previous_type in GRIPPER_STEPS:
+                    gripper.sleep_after(step.get("duration", 0))
+                    previous_type = stype
+                    if on_step:
+                        on_step(i)
+                    continue
+                if not (stype == "move" and gripper.overlap_ok):
+                    gripper.wait()
+            previous_type = stype
             handler = STEP_HANDLERS.get(stype)
             if handler:
                 logging.debug(f"Executing step {i+1}/{len(seq)}: {stype}")
+                if guard:
+                    guard.before(step)
                 handler(arm, step)
+                if guard:
+                    guard.after(step)
             else:
                 logging.warning(f"Unknown step type: {stype} in step {i+1}")
         except Exception as e:
             logging.error(f"Step {i+1} failed: {e}")
             raise
+        if on_step:
+            on_step(i)
+    gripper.wait()
+
 
-def run_pin_sequence(arm, pin_str, system_id):
-    """Execute PIN entry sequence for specific system"""
+def run_with_recovery(arm, system_id, sequence, meta):
+    """
+    Run a task sequence with per-step checkpoints (checkpoints.py). On a
+    step failure the controller error is cleaned and the failed step is
+    re-run up to RECOVERY["resume_attempts"] times; if that is not possible
+    the arm retreats along the executed path and the error is raised.
+    """
+    steps = steps_of(sequence)
+    guard = guard_for(system_id, arm)
+    step_started = [time.time()]
+
+    def journal_step(i, ok=True, error=None):
+        now = time.time()
+        if journal is not None:
+            journal.step(system_id, meta["job_id"], i, steps[i].get("type"), step_started[0],
+                         now - step_started[0], ok, error, arm_joints(arm))
+        step_started[0] = now
+
+    if not RECOVERY["enabled"]:
+        run_sequence(arm, steps, on_step=journal_step, guard=guard)
+        return
+    checkpoints.begin(system_id, meta, steps)
+
+    def tool_start(i):
+        """TCP pose before step i if it is a tool move, to back out of it after a failure"""
+        if i < len(steps) and steps[i].get("type") == "tool_move":
+            try:
+                return list(arm.position)[:6]
+            except Exception:
+                return None
+        return None
+
+    def on_step(i):
+        checkpoints.update(system_id, completed_step=i, tool_start=tool_start(i + 1))
+        journal_step(i)
+
+    attempts = 0
+    while True:
+        record = checkpoints.load_checkpoint(system_id)
+        checkpoints.update(system_id, tool_start=tool_start(record["completed_step"] + 1))
+        step_started[0] = time.time()
+        try:
+            run_sequence(arm, steps, start=record["completed_step"] + 1, on_step=on_step, guard=guard)
+            checkpoints.update(system_id, status="completed")
+            return
+        except Exception as e:
+            failed = record["completed_step"] + 1
+            interrupted = failed < len(steps)
+            if not interrupted:
+                # Every step ran and the final gripper wait failed: book it on the
+                # last gripper step, there is nothing left to re-run
+                failed = max((i for i, s in enumerate(steps) if s.get("type") in GRIPPER_STEPS),
+                             default=len(steps) - 1)
+            journal_step(failed, ok=False, error=e)
+            checkpoints.update(system_id, status="failed", error=str(e))
+            try:
+                clean_arm_error(arm)
+                get_tracker(arm).wait()
+            except Exception as clean_exc:
+                logging.error(f"System {system_id} could not clean the arm error: {clean_exc}")
+                raise e
+            # Relative tool moves cannot be re-run from an unknown point, and
+            # re-running after a collision or limit error would hit it again
+            if (interrupted and attempts < RECOVERY["resume_attempts"]
+                    and steps[failed].get("type") != "tool_move" and checkpoints.resumable(e)):
+                attempts += 1
+                checkpoints.update(system_id, status="running", attempts=attempts)
+                logging.warning(f"System {system_id} resuming job {meta.get('job_id')} at step {failed+1} "
+                                f"(attempt {attempts}) after: {e}")
+                continue
+            if RECOVERY["retreat"]:
+                try:
+                    logging.warning(f"System {system_id} retreating after failed step {failed+1}")
+                    partial = None
+                    if interrupted and steps[failed].get("type") == "tool_move" and record.get("tool_start"):
+                        partial = checkpoints.tool_offset(record["tool_start"], list(arm.position)[:6])
+                    run_sequence(arm, checkpoints.retreat_for(system_id, record, partial), guard=guard)
+                    checkpoints.update(system_id, status="retreated")
+                except Exception as retreat_exc:
+                    logging.error(f"System {system_id} retreat failed: {retreat_exc}")
+            raise
+
+def expand_pin_sequence(system_id, pin_str):
+    """
+    Step list of a PIN entry: the planned keypad path (entry, key-to-key
+    hops, exit) when the planner is enabled, else the recorded entry, one
+    recorded button per digit and the recorded exit
+    """
+    system_cfg = SYSTEMS.get(system_id)
+    if not system_cfg:
+        raise ValueError(f"System {system_id} not found")
+    pin_file = system_cfg["devices"].get("pin_entry")
+    if not pin_file:
+        raise ValueError(f"No PIN entry file configured for system {system_id}")
+    if PIN_PLANNER.get("enabled"):
+        return get_keypad_model(system_id).plan(pin_str)
+    with open(pin_file, "r") as f:
+        pin_steps = json.load(f)
+    steps = list(pin_steps["entry"])
+    for ch in str(pin_str):
+        if ch not in pin_steps["buttons"]:
+            raise ValueError("Invalid PIN character")
+        steps += pin_steps["buttons"][ch]
+    return steps + list(pin_steps["exit"])
+
+
+def run_pin_sequence(arm, pin_str, system_id, job_id=None, first_step=0):
+    """
+    Execute PIN entry sequence for specific system. With a `job_id` every
+    step is journaled as step first_step + i of the job; the journal keeps
+    no joints for it (task_journal.py), the digits are never logged.
+    """
     try:
-        # Get PIN file path from system config
-        system_cfg = SYSTEMS.get(system_id)
-        if not system_cfg:
-            raise ValueError(f"System {system_id} not found")
-            
-        pin_file = system_cfg["devices"].get("pin_entry")
-        if not pin_file:
-            raise ValueError(f"No PIN entry file configured for system {system_id}")
-        # Load PIN steps from system-specific file   
-        with open(pin_file, "r") as f:
-            pin_steps = json.load(f)
-
-        logging.info(f"Starting PIN sequence for system {system_id}: {pin_str}")
-        # Step 1: Move to entry position (system-specific)
-        run_sequence(arm, pin_steps["entry"])
-        # Step 2: Press each PIN digit
-        for i, ch in enumerate(pin_str):
-            if ch not in pin_steps["buttons"]:
-                raise ValueError(f"Invalid character: {ch}")
-            logging.debug(f"Pressing button: {ch} ({i+1}/{len(pin_str)})")
-            # Step 3: Exit sequence (system-specific)
-            run_sequence(arm, pin_steps["buttons"][ch])
-        run_sequence(arm, pin_steps["exit"])
-        
+        steps = expand_pin_sequence(system_id, pin_str)
+        logging.info(f"Starting PIN sequence for system {system_id}: {len(str(pin_str))} digits")
+        step_started = [time.time()]
+        last = [-1]
+
+        def journal_step(i, ok=True, error=None):
+            now = time.time()
+            if journal is not None and job_id is not None:
+                journal.step(system_id, job_id, first_step + i, steps[i].get("type"), step_started[0],
+                             now - step_started[0], ok, error)
+            step_started[0] = now
+            last[0] = i
+
+        try:
+            run_sequence(arm, steps, on_step=journal_step, guard=guard_for(system_id, arm))
+        except Exception as e:
+            journal_step(min(last[0] + 1, len(steps) - 1), ok=False, error=e)
+            raise
+
         logging.info(f"PIN sequence completed successfully for system {system_id}")
         return "PIN sequence completed", True
         
@@ -158,6 +346,199 @@ def run_pin_sequence(arm, pin_str, system_id):
         logging.error(f"PIN sequence failed for system {system_id}: {e}")
         return f"PIN sequence failed: {e}", False
 
+def load_action_sequence(system_id, action, rack):
+    """
+    Resolve and load the recorded sequence for an action/rack on a system.
+    Racks without a recording are generated from the action's rack template
+    when their calibration fit is within rack_frames.FIT_MAX_RMS_MM.
+    Raises KeyError with a readable message if the system, action or rack
+    is not configured.
+    """
+    system_cfg = SYSTEMS.get(system_id)
+    if not system_cfg:
+        raise KeyError(f"System {system_id} not found")
+    actions = system_cfg.get("actions", {})
+    if rack not in actions.get(action, {}) and action in system_cfg.get("templates", {}):
+        return get_rack_sequence(system_id, action, rack)
+    if action not in actions:
+        raise KeyError(f"Action '{action}' not available for system {system_id}")
+    if rack not in actions[action]:
+        raise KeyError(f"Rack {rack} not available for action '{action}' in system {system_id}")
+
+    filepath = actions[action][rack]
+    if isinstance(filepath, str) and filepath.endswith(".json"):
+        with open(filepath, "r") as f:
+            data = json.load(f)
+        if PATH_SIMPLIFY.get("at_load"):
+            data, report = simplify_data(data)
+            removed = sum(len(seg["changes"]) for seg in report["segments"].values())
+            logging.info(f"Simplified {filepath}: {removed} changes")
+        return data
+    return filepath
+
+def _prune_jobs():
+    """Drop the oldest finished jobs once the registry exceeds its bound"""
+    finished = [jid for jid, m in jobs.items() if m["done"].is_set()]
+    for jid in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del jobs[jid]
+
+def _content_key(meta, pin):
+    """Identity of a task's work: two tasks with the same key do the same motion"""
+    return tuple(meta.get(f) for f in DEDUP_FIELDS) + (pin,)
+
+def _find_job_locked(system_id, meta, pin, idempotency_key):
+    """Find an existing job for the same submission. Caller holds jobs_lock."""
+    now = time.time()
+    while idempotency_index:
+        key, (_, expires_at) = next(iter(idempotency_index.items()))
+        if expires_at > now:
+            break
+        del idempotency_index[key]
+
+    if idempotency_key:
+        entry = idempotency_index.get((system_id, idempotency_key))
+        if entry:
+            return entry[0]
+    return dedup_index.get((system_id, _content_key(meta, pin)))
+
+def find_job(system_id, meta, pin, idempotency_key=None):
+    """
+    Return the job a submission would be folded into, or None.
+    Matches on the client idempotency key first, then on identical
+    (action, rack, pin, ...) tasks still queued or running on the system.
+    """
+    with jobs_lock:
+        return _find_job_locked(system_id, meta, pin, idempotency_key)
+
+def _shed_stale_locked(system_id, now, limits):
+    """Expire queued tasks past the shedding limit. Caller holds jobs_lock."""
+    for meta in list(active_jobs.get(system_id, {}).values()):
+        if is_stale(meta, now, limits):
+            meta["status"] = "expired"
+            meta["error"] = f"Shed after {now - meta['queued_at']:.0f}s in the queue"
+            _release_dedup(meta)
+            _release_slot(meta)
+            logging.warning(f"[System {system_id}] Shedding stale job {meta['job_id']}")
+
+def submit_task(system_id, sequence, pin, meta, on_done=None, idempotency_key=None, dedup=True, bounded=True):
+    """
+    Queue a task for a system worker and register it as a job.
+    `on_done(meta)` is called from the worker thread once the job finishes.
+    With `dedup`, a submission matching an existing job (see find_job) is
+    folded into it instead of queuing the motion again.
+    With `bounded`, a new task is checked against the system's queue limits
+    (admission.py) and QueueFullError is raised when it cannot be taken.
+    Returns (job meta, created) where created is False for folded duplicates.
+    Once shutdown_systems() has started, new jobs are cancelled right away.
+    """
+    existing = None
+    call_now = False
+    cancelled = False
+    limits = limits_for(system_id)
+    meta.setdefault("system", system_id)
+    predicted = predict_duration(sequence, meta, limits)
+    with jobs_lock:
+        if dedup:
+            existing = _find_job_locked(system_id, meta, pin, idempotency_key)
+            if existing is not None:
+                existing["duplicates"] = existing.get("duplicates", 0) + 1
+                if on_done:
+                    if existing["done"].is_set():
+                        call_now = True
+                    else:
+                        existing["callbacks"].append(on_done)
+                logging.info(f"[System {system_id}] Folded duplicate submission into job {existing['job_id']}")
+        if existing is None:
+            now = time.time()
+            active = active_jobs.setdefault(system_id, {})
+            _shed_stale_locked(system_id, now, limits)
+            if bounded:
+                meta["estimated_wait"] = admit(system_id, list(active.values()), now, limits)
+            meta["job_id"] = uuid.uuid4().hex
+            meta["status"] = "queued"
+            meta["queued_at"] = now
+            meta["predicted_s"] = predicted
+            active[meta["job_id"]] = meta
+            meta["done"] = threading.Event()
+            meta["callbacks"] = [on_done] if on_done else []
+            jobs[meta["job_id"]] = meta
+            _prune_jobs()
+            if dedup:
+                meta["dedup_key"] = (system_id, _content_key(meta, pin))
+                dedup_index[meta["dedup_key"]] = meta
+            if idempotency_key:
+                meta["idempotency_key"] = idempotency_key
+                idempotency_index[(system_id, idempotency_key)] = (meta, time.time() + IDEMPOTENCY_TTL)
+            # Under jobs_lock: either the drain in shutdown_systems() sees this task or it is cancelled here
+            cancelled = shutting_down.is_set()
+            if not cancelled:
+                task_queues[system_id].put((sequence, pin, meta))
+
+    if existing is not None:
+        if call_now:
+            on_done(existing)
+        return existing, False
+    if cancelled:
+        _finish_job(meta, "cancelled", "Server shutting down")
+    return meta, True
+
+def _release_dedup(meta):
+    """Stop folding new submissions into this job. Caller holds jobs_lock."""
+    key = meta.get("dedup_key")
+    if key is not None and dedup_index.get(key) is meta:
+        del dedup_index[key]
+
+def _release_slot(meta):
+    """Stop counting this job against its system's queue. Caller holds jobs_lock."""
+    active_jobs.get(meta.get("system"), {}).pop(meta.get("job_id"), None)
+
+def cancel_job(job_id):
+    """Mark a queued job as cancelled; the worker skips it when dequeued"""
+    with jobs_lock:
+        meta = jobs.get(job_id)
+        if meta is None or meta["status"] != "queued":
+            return False
+        meta["status"] = "cancelled"
+        _release_dedup(meta)
+        _release_slot(meta)
+    return True
+
+def job_eta(meta):
+    """Live predicted seconds until a job starts and finishes; None once it is done"""
+    with jobs_lock:
+        active = list(active_jobs.get(meta.get("system"), {}).values())
+        eta = etas(active, time.time()).get(meta.get("job_id"))
+    if eta is None:
+        return {"eta_start": None, "eta_finish": None}
+    return {"eta_start": eta[0], "eta_finish": eta[1]}
+
+def job_summary(meta):
+    """JSON-safe view of a job's meta"""
+    return {k: v for k, v in meta.items() if k not in ("done", "callbacks", "dedup_key")}
+
+def _finish_job(meta, status, error=None):
+    """Record the outcome of a job and notify any waiters"""
+    if "job_id" not in meta:
+        return
+    with jobs_lock:
+        meta["status"] = status
+        meta["finished_at"] = time.time()
+        if error is not None:
+            meta["error"] = str(error)
+        _release_dedup(meta)
+        _release_slot(meta)
+        callbacks = list(meta["callbacks"])
+        meta["done"].set()
+    if journal is not None and "started_at" in meta:
+        journal.task_finished(meta.get("system"), meta)
+    if duration_model is not None and status == "completed" and "started_at" in meta:
+        duration_model.observe(meta.get("system"), meta, meta["finished_at"] - meta["started_at"], meta.get("base_s"))
+    for callback in callbacks:
+        try:
+            callback(meta)
+        except Exception as e:
+            logging.error(f"Job {meta['job_id']} callback failed: {e}")
+
 def initialize_arm_connection(system_id):
     """Initialize connection to robotic arm for specific system"""
     try:
@@ -176,110 +557,187 @@ def initialize_arm_connection(system_id):
     except Exception as e:
         logging.error(f"Failed to connect to System {system_id} arm: {e}")
         raise
-def load_interaction_json(system_id):
-    """
-    Loads the interaction/button motion JSON for a system
-    """
-    path = SYSTEMS[system_id]["interaction_file"]
-    with open(path, "r") as f:
-        return json.load(f)
+
+def execute_task(arm, system_id, sequence, pin, meta):
+    """Run a dispatched task's motion: the composed sequence, then a legacy PIN entry"""
+    get_stager(arm).settle(keep=meta.get("prepositioned", False))
+    if sequence:
+        logging.info("Executing composed sequence")
+        run_with_recovery(arm, system_id, sequence, meta)
+
+    # Old PIN-only flow (still works for legacy calls)
+    if pin and not meta.get("choice"):
+        logging.info("Executing PIN sequence")
+        msg, success = run_pin_sequence(arm, pin, system_id, meta.get("job_id"),
+                                        len(steps_of(sequence)) if sequence else 0)
+        if not success:
+            raise RuntimeError(msg)
+        logging.info("PIN sequence completed successfully")
+
+def stop_gripper(arm, system_id):
+    """Stop the gripper valves after a completed task"""
+    try:
+        arm.stop_lite6_gripper(sync=True)
+        get_tracker(arm).stopped()
+        logging.info(f"Gripper stopped for system {system_id} after task completion")
+    except Exception as e:
+        logging.error(f"Failed to stop gripper for system {system_id}: {e}")
+
+def unstage(arm, system_id):
+    """Shutdown: take a pre-positioned arm back home (prepositioning.Stager)"""
+    try:
+        get_stager(arm).settle(keep=False)
+    except Exception as e:
+        logging.error(f"System {system_id} could not return home from pre-positioning: {e}")
 
 def worker_thread(system_id):
     """Worker thread for processing tasks for a specific robotic arm system"""
     logging.info(f"Worker thread started for System {system_id}")
 
-    # Initialize arm connection
+    # Initialize arm connection (in this process or in the arm's motion process)
     try:
-        arm = initialize_arm_connection(system_id)
+        if MOTION_PROCESS["enabled"]:
+            arm = MotionProcess(system_id).start()
+        else:
+            arm = initialize_arm_connection(system_id)
         arm_connections[system_id] = arm
-        with last_call_lock:
+        with arm_status_lock:
             arm_status[system_id] = "idle"
     except Exception as e:
         logging.error(f"System {system_id} worker thread failed to start: {e}")
         return
 
+    previous = checkpoints.load_checkpoint(system_id)
+    if previous and previous["status"] in ("running", "failed"):
+        logging.warning(f"System {system_id} was interrupted in job {previous['job_id']} "
+                        f"after step {previous['completed_step']+1}/{previous['total_steps']}; "
+                        f"the arm may not be at its start pose")
+
     queue_obj = task_queues[system_id]
+    warm_job = None   # job allowed to skip its home move (warm_start.py)
+    policy = IdlePolicy()   # idle pre-positioning (prepositioning.py)
 
     while True:
+        # Wait for task from queue; after a quiet spell stage the likely next task
+        staging = policy.candidate()
+        try:
+            task = queue_obj.get(timeout=PREPOSITION["idle_delay"] if staging else None)
+        except queue.Empty:
+            try:
+                if isinstance(arm, MotionProcess):
+                    started = arm.alive and arm.stage(*staging)
+                else:
+                    started = get_stager(arm).stage(system_id, *staging)
+            except Exception as e:
+                logging.error(f"System {system_id} pre-positioning failed: {e}")
+                started = False
+            if started:
+                policy.staged = staging
+            else:
+                policy.home = None   # retried after the next task
+            continue
+
         try:
-            # Wait for task from queue
-            sequence, pin, meta = queue_obj.get(timeout=None)
+            sequence, pin, meta = task
 
             if sequence is None and pin is None:
                 logging.info(f"System {system_id} worker thread shutting down")
+                if not isinstance(arm, MotionProcess):
+                    unstage(arm, system_id)   # the motion process does it on "stop"
                 break
 
-            with last_call_lock:
+            if meta.get("status") == "queued" and is_stale(meta, time.time(), limits_for(system_id)):
+                meta["status"] = "expired"
+                meta["error"] = f"Shed after {time.time() - meta['queued_at']:.0f}s in the queue"
+            if meta.get("status") in ("cancelled", "expired"):
+                logging.info(f"System {system_id} skipping {meta['status']} task: {meta.get('job_id')}")
+                _finish_job(meta, meta["status"])
+                continue
+
+            with arm_status_lock:
                 arm_status[system_id] = "working"
+            meta["status"] = "running"
+            meta["started_at"] = time.time()
 
-            logging.info(f"System {system_id} processing task: {meta}")
+            logging.info(f"System {system_id} processing task: {job_summary(meta)}")
 
             # ------------------------------------------------------------------
-            # NEW ADDITION: Build dynamic sequence for choice / cash / pin flow
+            # Compiled sequence for choice / cash / pin flow (screen_flow.py)
             # ------------------------------------------------------------------
             if meta.get("choice"):
-                interaction = load_interaction_json(system_id)
-
-                sequence = []
-                sequence += interaction.get("entry", [])
+                sequence = get_planner(system_id).plan(
+                    meta.get("choice"),
+                    denomination=meta.get("denomination"),
+                    exact_amount=meta.get("exact_amount"),
+                    pin=pin,
+                    confirm=meta.get("confirm"),
+                )
 
-                choice = meta.get("choice")
-                denomination = meta.get("denomination")
-                exact_amount = meta.get("exact_amount")
-                confirm = meta.get("confirm")
+            planned = sequence
 
-                # Choice button (food / cash)
-                if choice in interaction.get("buttons", {}):
-                    sequence += interaction["buttons"][choice]
-
-                # Cash logic
-                if choice == "cash":
-                    if denomination in {"0", "20", "30", "40", "50"}:
-                        sequence += interaction["buttons"].get(denomination, [])
-                    elif exact_amount is not None:
-                        for d in str(exact_amount):
-                            sequence += interaction["buttons"].get(d, [])
-
-                # PIN digits
-                if pin:
-                    for d in str(pin):
-                        sequence += interaction["buttons"].get(d, [])
+            # ------------------------------------------------------------------
+            # Pre-positioned for this task: continue from the staging line
+            # ------------------------------------------------------------------
+            if sequence and not (pin and not meta.get("choice")) and policy.matches(sequence):
+                sequence = drop_home_head(sequence)
+                meta["prepositioned"] = True
+                logging.info(f"System {system_id} pre-positioned, skipping the home move")
 
-                # Confirmation
-                if confirm == "yes":
-                    sequence += interaction["buttons"].get("yes", [])
+            # ------------------------------------------------------------------
+            # Warm start: skip the home move shared with the neighbouring task
+            # ------------------------------------------------------------------
+            elif sequence and warm_job == meta["job_id"]:
+                sequence = drop_home_head(sequence)
+                meta["warm_start"] = True
+                logging.info(f"System {system_id} warm start, skipping the home move")
+            warm_job = None
+            next_meta = None
+            if sequence and not (pin and not meta.get("choice")):
+                with queue_obj.mutex:
+                    upcoming = queue_obj.queue[0] if queue_obj.queue else None
+                if (upcoming and upcoming[2].get("status") == "queued"
+                        and can_splice(sequence, upcoming[0],
+                                       transition=(meta.get("action"), upcoming[2].get("action")))):
+                    sequence = drop_home_tail(sequence)
+                    next_meta = upcoming[2]
 
             # ------------------------------------------------------------------
-            # Existing execution logic (UNCHANGED)
+            # Fast transit, slow final approach into contact targets
             # ------------------------------------------------------------------
             if sequence:
-                logging.info("Executing composed sequence")
-                run_sequence(arm, sequence)
+                sequence = shape_sequence(sequence, meta.get("action"))
 
-            # Old PIN-only flow (still works for legacy calls)
-            if pin and not meta.get("choice"):
-                logging.info(f"Executing PIN sequence: {pin}")
-                msg, success = run_pin_sequence(arm, pin, system_id)
-                if not success:
-                    logging.error(f"PIN sequence failed: {msg}")
-                else:
-                    logging.info("PIN sequence completed successfully")
+            if journal is not None:
+                journal.task_started(system_id, meta, steps_of(sequence) if sequence else None, pin)
+
+            if isinstance(arm, MotionProcess):
+                # The motion process also stops the gripper once it has reported back
+                arm.ensure_running()
+                arm.run(sequence, pin, job_summary(meta))
+            else:
+                execute_task(arm, system_id, sequence, pin, meta)
 
             logging.info(f"System {system_id} task completed successfully")
+            _finish_job(meta, "completed")
+            if pin and not meta.get("choice"):
+                policy.record(meta, None, None, True)   # the arm ends at the PIN pad, not home
+            else:
+                policy.record(meta, planned, sequence, True)
+            if next_meta is not None:
+                warm_job = next_meta["job_id"]
 
-            with last_call_lock:
+            with arm_status_lock:
                 arm_status[system_id] = "idle"
 
-            try:
-                arm.stop_lite6_gripper(sync=True)
-                logging.info(f"Gripper stopped for system {system_id} after task completion")
-            except Exception as e:
-                logging.error(f"Failed to stop gripper for system {system_id}: {e}")
+            if not isinstance(arm, MotionProcess):
+                stop_gripper(arm, system_id)
 
-        except queue.Empty:
-            continue
         except Exception as e:
             logging.error(f"System {system_id} worker error: {e}")
+            with arm_status_lock:
+                arm_status[system_id] = "idle"
+            _finish_job(meta, "failed", e)
+            policy.record(meta, None, None, False)
         finally:
             queue_obj.task_done()
 
@@ -299,3 +757,44 @@ def initialize_systems():
         thread.start()
         worker_threads[system_id] = thread
         logging.info(f"System {system_id} initialized with worker thread")
+
+
+def shutdown_systems(timeout=120):
+    """
+    Gracefully stop all workers: cancel the tasks still waiting in the
+    queues at once (so polling clients see "cancelled", not "queued"), let
+    the running tasks finish for up to `timeout` seconds, then stop the
+    grippers and disconnect the arms.
+    """
+    deadline = time.time() + timeout
+    with jobs_lock:
+        shutting_down.set()
+    for system_id, queue_obj in task_queues.items():
+        while True:
+            try:
+                _, _, meta = queue_obj.get_nowait()
+            except queue.Empty:
+                break
+            logging.warning(f"System {system_id} dropping queued task on shutdown: {meta.get('job_id')}")
+            _finish_job(meta, "cancelled", "Server shutting down")
+            queue_obj.task_done()
+        queue_obj.put((None, None, {}))
+
+    for system_id, thread in worker_threads.items():
+        thread.join(timeout=max(1.0, deadline - time.time()))
+        if thread.is_alive():
+            logging.warning(f"System {system_id} worker did not stop in time")
+
+    for system_id, arm in arm_connections.items():
+        if isinstance(arm, MotionProcess):
+            arm.close()   # stops the gripper and disconnects in the motion process
+            continue
+        try:
+            arm.stop_lite6_gripper(sync=True)
+            arm.disconnect()
+            logging.info(f"System {system_id} gripper stopped and arm disconnected")
+        except Exception as e:
+            logging.error(f"Failed to stop System {system_id} arm on shutdown: {e}")
+
+    if duration_model is not None:
+        duration_model.flush()
@@ -7,10 +7,15 @@ image conversion, and serial communication.
 Imported into app.py for clean separation of logic.
 """
 
-import treepoem
-from PIL import Image
-import serial
+from __future__ import annotations
+
 import logging
+from lazy_imports import lazy
+
+# Loaded on the first barcode request (or by the server's prewarm)
+treepoem = lazy("treepoem")
+Image = lazy("PIL.Image")
+serial = lazy("serial")
 
 
 # === Barcode Generator ===
@@ -5,12 +5,16 @@ Utility functions for camera operations, capture, status, and streaming.
 
 import os
 import uuid
-import cv2
-import numpy as np
-from google.cloud import vision
-from dotenv import load_dotenv
-from flask import jsonify, send_file, Response
 from config import SYSTEMS, CAPTURE_DIR
+from lazy_imports import lazy
+
+# Loaded on the first camera / OCR request (or by the server's prewarm)
+cv2 = lazy("cv2")
+np = lazy("numpy")
+vision = lazy("google.cloud.vision")
+# Only needed by the request handlers and OCR
+flask = lazy("flask")
+dotenv = lazy("dotenv")
 
 
 def open_camera(system_number=None):
@@ -49,11 +53,11 @@ def capture_receipt_handler(system_number):
     Creates a separate folder for each system inside CAPTURE_DIR.
     """
     if not system_number or system_number not in SYSTEMS:
-        return jsonify({"status": "error", "message": "Invalid or missing system_number"}), 400
+        return flask.jsonify({"status": "error", "message": "Invalid or missing system_number"}), 400
 
     cam = open_camera(system_number)
     if cam is None:
-        return jsonify({"status": "error", "message": f"Camera not accessible for system {system_number}"}), 500
+        return flask.jsonify({"status": "error", "message": f"Camera not accessible for system {system_number}"}), 500
 
     # Warm-up frames (discard first few to allow camera to adjust)
     for _ in range(5):
@@ -63,7 +67,7 @@ def capture_receipt_handler(system_number):
     cam.release()
 
     if not ret:
-        return jsonify({"status": "error", "message": "Failed to capture image"}), 500
+        return flask.jsonify({"status": "error", "message": "Failed to capture image"}), 500
 
     # Rotate + fisheye correction
     frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
@@ -77,7 +81,7 @@ def capture_receipt_handler(system_number):
     filename = os.path.join(system_dir, f"receipt_{uuid.uuid4().hex}.jpg")
     cv2.imwrite(filename, frame)
 
-    return send_file(filename, mimetype="image/jpeg")
+    return flask.send_file(filename, mimetype="image/jpeg")
 
 
 def camera_status_handler(system_number):
@@ -85,14 +89,14 @@ def camera_status_handler(system_number):
     Check if the camera is accessible.
     """
     if not system_number or system_number not in SYSTEMS:
-        return jsonify({"status": "error", "message": "Invalid or missing system_number"}), 400
+        return flask.jsonify({"status": "error", "message": "Invalid or missing system_number"}), 400
 
     cam = open_camera(system_number)
     if cam:
         cam.release()
-        return jsonify({"status": "success", "message": f"Camera is ON for system {system_number}"})
+        return flask.jsonify({"status": "success", "message": f"Camera is ON for system {system_number}"})
     else:
-        return jsonify({"status": "error", "message": f"Camera not accessible for system {system_number}"}), 500
+        return flask.jsonify({"status": "error", "message": f"Camera not accessible for system {system_number}"}), 500
 
 
 def gen_frames():
@@ -120,7 +124,7 @@ def ocr(frame):
     """
     try:
         # Load .env file (you can place it in project root)
-        load_dotenv()  # reads .env automatically in current dir
+        dotenv.load_dotenv()  # reads .env automatically in current dir
         creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
         if creds_path:
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = creds_path
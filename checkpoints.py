@@ -0,0 +1,248 @@
+"""
+checkpoints.py
+--------------
+Per-step execution checkpoints and error recovery helpers.
+
+The worker records, for each system, the sequence it is running and the
+last step that completed. The record is kept in memory and written to
+RECOVERY["checkpoint_dir"]/system<N>.json after every step (atomic
+replace), so after a crash or restart it is known where the arm stopped
+and what it was doing. When an arm runs in its own motion process
+(motion_process.py) that process owns the file and the server's in-memory
+copy is kept current through mirror().
+
+When a step fails the worker (armsideclient.run_with_recovery) can:
+
+- clean the controller error and re-enable motion (clean_arm_error)
+- resume from the failed step; joint moves are absolute, so re-running
+  the interrupted move is safe. An interrupted tool move is relative and
+  is never re-run.
+- retreat: the action's configured recovery sequence
+  (SYSTEMS[sid]["recovery"][action]) or, by default, the executed path
+  played backwards to the start pose (build_retreat). If a tool move was
+  interrupted, the part of it already travelled is undone along the tool
+  axis first, so a card half in a slot comes straight out. Gripper steps
+  are played inverted at the pose they ran at, so a picked card is put
+  back where it was picked up instead of being carried home.
+
+Motion commands report failures through their return code, not by
+raising; the step handlers turn a non-zero code into MotionError with the
+controller error code. After a collision or limit error
+(RECOVERY["no_resume_errors"]) the failed step is never re-run.
+"""
+
+import os
+import math
+import json
+import time
+import logging
+import threading
+from config import RECOVERY, SYSTEMS
+from screen_flow import join_segments
+from warm_start import steps_of
+
+_lock = threading.Lock()
+_records = {}     # {system_id: checkpoint record}
+_listeners = []   # callbacks(system_id, fields, replace) run on every change
+
+
+def add_listener(callback):
+    """Call `callback(system_id, fields, replace)` after every begin / update"""
+    _listeners.append(callback)
+
+
+def _notify(system_id, fields, replace):
+    for callback in _listeners:
+        try:
+            callback(system_id, fields, replace)
+        except Exception as e:
+            logging.error(f"Checkpoint listener failed: {e}")
+
+
+class MotionError(RuntimeError):
+    """A motion command returned a non-zero code; `error_code` is the controller error at that time"""
+
+    def __init__(self, command, code, error_code=None):
+        super().__init__(f"{command} returned code {code} (controller error {error_code})")
+        self.code = code
+        self.error_code = error_code
+
+
+def resumable(exc):
+    """False for collision and limit errors, where re-running the step would hit the same thing"""
+    return getattr(exc, "error_code", None) not in RECOVERY["no_resume_errors"]
+
+
+def _path(system_id):
+    return os.path.join(RECOVERY["checkpoint_dir"], f"system{system_id}.json")
+
+
+def _save(system_id, record):
+    os.makedirs(RECOVERY["checkpoint_dir"], exist_ok=True)
+    tmp = _path(system_id) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(record, f)
+    os.replace(tmp, _path(system_id))
+
+
+def load_checkpoint(system_id):
+    """Current checkpoint of a system (from disk on first use), or None"""
+    with _lock:
+        if system_id not in _records:
+            try:
+                with open(_path(system_id), "r") as f:
+                    _records[system_id] = json.load(f)
+            except (OSError, ValueError):
+                _records[system_id] = None
+        return _records[system_id]
+
+
+def begin(system_id, meta, steps):
+    """Start checkpointing a sequence run"""
+    record = {
+        "job_id": meta.get("job_id"), "action": meta.get("action"), "rack": meta.get("rack"),
+        "status": "running", "completed_step": -1, "total_steps": len(steps),
+        "attempts": 0, "error": None, "updated_at": time.time(), "steps": steps,
+    }
+    with _lock:
+        _records[system_id] = record
+        _save(system_id, record)
+    _notify(system_id, record, True)
+    return record
+
+
+def update(system_id, **fields):
+    """Update the current checkpoint and persist it"""
+    with _lock:
+        record = _records.get(system_id)
+        if record is None:
+            return
+        record.update(fields, updated_at=time.time())
+        _save(system_id, record)
+    _notify(system_id, dict(fields, updated_at=record["updated_at"]), False)
+
+
+def mirror(system_id, fields, replace=False):
+    """
+    Apply a change made by another process (the arm's motion process) to
+    the in-memory record. The other process owns the checkpoint file, so
+    nothing is written here.
+    """
+    with _lock:
+        if replace or _records.get(system_id) is None:
+            _records[system_id] = dict(fields)
+        else:
+            _records[system_id].update(fields)
+
+
+def summary(record):
+    """Checkpoint without the stored steps, for status responses"""
+    return None if record is None else {k: v for k, v in record.items() if k != "steps"}
+
+
+def clean_arm_error(arm):
+    """Clear controller errors/warnings and put the arm back in position mode"""
+    arm.clean_error()
+    arm.clean_warn()
+    arm.motion_enable(enable=True)
+    arm.set_mode(0)
+    arm.set_state(state=0)
+
+
+def tool_offset(start, now):
+    """
+    Translation from TCP pose `start` to `now` ([x, y, z, roll, pitch, yaw],
+    mm / deg, base frame) expressed in the tool frame at `start`
+    """
+    cr, sr = math.cos(math.radians(start[3])), math.sin(math.radians(start[3]))
+    cp, sp = math.cos(math.radians(start[4])), math.sin(math.radians(start[4]))
+    cy, sy = math.cos(math.radians(start[5])), math.sin(math.radians(start[5]))
+    # R = Rz(yaw) Ry(pitch) Rx(roll); the tool-frame offset is R^T d
+    rotation = [[cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+                [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+                [-sp, cp * sr, cp * cr]]
+    d = [now[k] - start[k] for k in range(3)]
+    return [sum(rotation[row][col] * d[row] for row in range(3)) for col in range(3)]
+
+
+def build_retreat(steps, completed_step, speed=None, partial=None):
+    """
+    The executed part of a sequence played backwards: completed joint
+    waypoints in reverse order and completed tool moves inverted, ending
+    at the sequence's start pose. Completed gripper steps are inverted and
+    run once the arm is back at the pose they ran at (or, if the reversed
+    path never stops there, before it moves past it), with the recorded
+    settle sleep after them; other sleeps are dropped.
+    `partial` is the tool-frame [dx, dy, dz] an interrupted tool move
+    already travelled; it is backed out first.
+    """
+    speed = speed or RECOVERY["retreat_speed"]
+    done = steps[:completed_step + 1]
+
+    def last_motion(i):
+        """Index of the last motion step before step i; -1 is the start pose"""
+        return max((j for j in range(i) if done[j].get("type") in ("move", "tool_move")), default=-1)
+
+    retreat = []
+    pending = []   # (pose index, inverted gripper steps) waiting for the arm to get back there
+    at = last_motion(len(done))
+    interrupted = steps[completed_step + 1] if completed_step + 1 < len(steps) else {}
+    if partial is None and interrupted.get("type") in ("move", "tool_move", "linear_move"):
+        at = len(done)   # stopped somewhere along the failed move, not at a waypoint
+    if partial is not None:
+        retreat.append(_back_out(partial, steps[completed_step + 1].get("speed", 10), speed))
+
+    def release(down_to):
+        while pending and pending[0][0] >= down_to:
+            retreat.extend(pending.pop(0)[1])
+
+    for i in range(len(done) - 1, -1, -1):
+        step = done[i]
+        stype = step.get("type")
+        if stype in ("gripper_open", "gripper_close"):
+            inverted = [{"type": "gripper_close" if stype == "gripper_open" else "gripper_open",
+                         "delay": step.get("delay", 0)}]
+            if i + 1 < len(done) and done[i + 1].get("type") == "sleep":
+                inverted.append(dict(done[i + 1]))
+            pending.append((last_motion(i), inverted))
+            release(at)
+        elif stype == "move":
+            release(i + 1)
+            retreat.append({"type": "move", "joints": step["joints"], "speed": min(step.get("speed", speed), speed)})
+            at = i
+            release(at)
+        elif stype == "tool_move":
+            at = last_motion(i)
+            release(at + 1)
+            back = {"type": "tool_move", "speed": min(step.get("speed", 10), speed)}
+            for k in ("dx", "dy", "dz", "rx", "ry", "rz"):
+                if step.get(k):
+                    back[k] = -step[k]
+            retreat.append(back)
+            release(at)
+    release(-1)
+    return join_segments([retreat])
+
+
+def _back_out(partial, step_speed, speed):
+    back = {"type": "tool_move", "speed": min(step_speed, speed)}
+    for k, v in zip(("dx", "dy", "dz"), partial):
+        if abs(v) >= 0.1:
+            back[k] = -round(v, 2)
+    return back
+
+
+def retreat_for(system_id, record, partial=None):
+    """
+    Recovery sequence for a failed run: the action's configured one or the
+    reversed path, after backing out of an interrupted tool move (`partial`)
+    """
+    configured = SYSTEMS.get(system_id, {}).get("recovery", {}).get(record.get("action"))
+    if configured:
+        with open(configured, "r") as f:
+            steps = json.load(f)
+        if partial is None:
+            return steps
+        failed = record["steps"][record["completed_step"] + 1]
+        return [_back_out(partial, failed.get("speed", 10), RECOVERY["retreat_speed"])] + list(steps_of(steps))
+    return build_retreat(record["steps"], record["completed_step"], partial=partial)
@@ -8,7 +8,24 @@ SYSTEMS = {
         },
         "actions": {
             # You can add tap/insert/swipe later if System 1 has them
-        }
+        },
+        # Actions taught once and generated for every calibrated rack (rack_frames.py), e.g.
+        # "insert": "teach_specs/insert_system2_rack1_down.json"
+        # None configured: no taught rack pair fits within rack_frames.FIT_MAX_RMS_MM yet
+        # (System 1 rack 2: 5.4 mm, System 2 insert_*_down rack 2: 8.6 mm), record the racks instead
+        "templates": {},
+        # Per-endpoint overrides of the server's default rate limits, e.g.
+        # "payment_action": {"capacity": 2, "per_seconds": 60}
+        "rate_limits": {},
+        # Per-action recovery sequences run after a failed step, e.g.
+        # "insert": "Recorded_file/SYSTEM1/RECOVERY/insert_retreat.json"
+        # (default: the executed path played backwards)
+        "recovery": {},
+        # Overrides of QUEUE_LIMITS for this system, e.g. {"capacity": 2}
+        "queue": {},
+        # Arm base [x, y, z, yaw] (mm / deg) in the shared cell frame (workspace.py);
+        # None = out of reach of the other arms, never checked
+        "base": None
     },
 
     2: {
@@ -18,21 +35,28 @@ SYSTEMS = {
             "scanner": "/dev/ttyUSB1",
             "other_device": "/dev/ttyUSB2",
             "camera": "/dev/ttyUSB2",
-            "pin_entry": "Recorded_file/SYSTEM2/PIN.json"
+            "pin_entry": "Recorded_file/SYSTEM2/PIN_ENTRY_SYSTEM2.json"
         },
+        "interaction_file": "Screen_Touch_System2.json",
         "actions": {
             "tap": {
-                1: "Recorded_file/SYSTEM2/TAP/Tap_system2_rack1.json",
+                1: "Recorded_file/SYSTEM2/TAP/tap_system2_rack1.json",
                 
             },
             "insert": {
-                1: "Recorded_file/SYSTEM2/INSERT/Insert_system2_rack1.json"
+                # recorded by insert_system2_rack1.py, which names its file after rack 2
+                1: "Recorded_file/SYSTEM2/INSERT/insert_system2_rack2.json"
             },
             "swipe": {
-                1: "Recorded_file/SYSTEM2/INSERT/Insert_system2_rack1.json"
+                # recorded by swipefirsttryrack1arm1.py
+                1: "Recorded_file/SYSTEM2/SWIPE/swipe_system2_rack1(4a).json"
                 
             }
-        }
+        },
+        "rate_limits": {},
+        "recovery": {},
+        "queue": {},
+        "base": None
     },
 
     3: {
@@ -44,8 +68,156 @@ SYSTEMS = {
         },
         "actions": {
             # Future actions for System 3 can be added here
-        }
+        },
+        "rate_limits": {},
+        "recovery": {},
+        "queue": {},
+        "base": None
     }
 }
 #always save the recorded actions in same way as insert_system2_rack1,because the code is written to undersatnd in such a way.
-CAPTURE_DIR = "captures"
\ No newline at end of file
+CAPTURE_DIR = "captures"
+RACK_CALIBRATION_FILE = "rack_calibration.json"   # per-rack transforms, written by rack_frames.py fit
+
+# Server runtime (roboticserver_u2.py / updatedroboticserver.py)
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 8000
+SERVER_THREADS = 32            # request threads of the production server
+DEVICE_IO_WORKERS = 4          # camera / OCR / barcode jobs run concurrently
+DEVICE_IO_BACKLOG = 8          # extra device jobs allowed to wait before 503
+DEVICE_IO_TIMEOUT = 60         # seconds a request waits for a device job
+SHUTDOWN_DRAIN_TIMEOUT = 120   # seconds running motions get to finish on shutdown (queued ones are cancelled)
+SERVER_DEV_FALLBACK = False    # serve with the Flask development server when waitress is missing
+
+# Device libraries imported on first use (lazy_imports.py) and preloaded in the
+# background once the server is serving; an empty list disables the preload
+LAZY_IMPORTS = {
+    "prewarm": ["cv2", "numpy", "google.cloud.vision", "PIL.Image", "treepoem", "serial"],
+}
+
+# Per-device startup timeouts in seconds (startup.py, legacy servers)
+STARTUP_TIMEOUTS = {"arm": 10, "serial": 3, "camera": 5}
+
+# Per-system task queue limits (admission.py); overrides in SYSTEMS[...]["queue"]
+QUEUE_LIMITS = {
+    "capacity": 5,        # tasks waiting behind the running one; None = unbounded (429 when full)
+    "max_wait": 300,      # seconds of predicted wait before a new task starts; None = off (503 above)
+    "shed_after": None,   # seconds; older queued tasks are dropped as "expired", None = never
+    # predicted seconds of tasks without a precompiled sequence
+    "default_task_s": {"pin_only": 20, "screen_flow": 60, "default": 40},
+}
+
+# Motion execution in one process per arm (motion_process.py)
+MOTION_PROCESS = {
+    "enabled": True,            # False runs the motion on the worker thread in the server process
+    "start_method": "spawn",    # multiprocessing start method; the server has threads, so not "fork"
+    "start_timeout": 30,        # seconds for a motion process to import and connect its arm
+    "reply_timeout": 300,       # seconds without a message from a busy motion process before it is killed as stuck
+}
+
+# Shared-workspace reservations between arms with a "base" (workspace.py)
+WORKSPACE = {
+    "enabled": True,
+    "padding": 60,         # mm around the links (link radius, cables, margin)
+    "tool_length": 120,    # mm from the flange to the tool tip
+    "sample_deg": 5,       # joint travel between swept-volume samples
+    "wait_timeout": 60,    # seconds a step waits for its volume before failing
+}
+
+# Task duration calibration from measured runs (duration_model.py)
+DURATION_MODEL = {
+    "enabled": True,
+    "file": "duration_model.json",   # calibration per system and action
+    "save_interval": 30,             # seconds between writes of a changed calibration
+    "alpha": 0.2,                    # weight of the newest run in the moving average
+    "min_samples": 3,                # runs before a calibration replaces the plain estimate
+    "ratio_bounds": (0.5, 3.0),      # measured / estimated outside this is clipped (aborted or stuck runs)
+}
+
+# PIN planner (pin_planner.py): speeds of the generated keypad path
+PIN_PLANNER = {
+    "enabled": False,      # off: re-times the recorded keys, nothing about the keypad plane is fitted
+    "hop_speed": 100,      # lateral hop between key hover poses
+    "press_speed": None,   # hover -> key contact; None keeps the recorded contact speed (10)
+    "retract_speed": 60,   # key contact -> hover
+    "dwell": None,         # seconds on the key; None keeps the recorded dwell
+    "clearance": 1.0,      # hover height as a fraction of the recorded press depth
+}
+
+# Path simplification (path_simplify.py) of recorded sequences
+PATH_SIMPLIFY = {
+    "at_load": False,                # simplify recordings in load_action_sequence()
+    "contact_speed": 30,             # moves at or below this speed are contact moves
+    "duplicate_tol": 0.5,            # degrees; closer poses are the same waypoint
+    "collinear_tol": 0.5,            # degrees off the joint-space line still counted as on it
+    "strip_move_delay": True,        # drop the recorded "delay" after free moves
+    # drop sleeps between two free moves; off because a taught dwell after a fast move into
+    # a target looks the same, tag such moves "contact": true before turning it on
+    "drop_free_space_sleeps": False,
+}
+
+# Approach speed (approach_speed.py): fast transit, slow final approach into contact targets
+APPROACH_SPEED = {
+    "enabled": True,
+    "transit_speed": 180,   # deg/s, the Lite6 joint speed limit, for the transit part
+    # Per action type; "contact_speed" defaults to PATH_SIMPLIFY["contact_speed"]
+    "actions": {
+        "default": {
+            "min_deg": 20,         # shorter approach moves are left as recorded
+            "final_deg": 8,        # joint travel of the slow final approach
+            "final_speed": None,   # cap of the final approach speed, None = the recorded speed
+        },
+        "tap": {"final_deg": 10, "final_speed": 50},      # card onto the reader, grasps in the rack
+        "insert": {"final_deg": 12, "final_speed": 40},   # card lined up with the slot
+        "swipe": {"final_deg": 10, "final_speed": 50},
+    },
+}
+
+# Gripper (gripper_control.py): asynchronous commands with completion sensing
+GRIPPER = {
+    "async": True,                   # False restores the fixed sleep after each command
+    "settle": 0.3,                   # seconds of jaw travel assumed without a jaw sensor
+    "poll_interval": 0.01,           # seconds between jaw sensor polls
+    "timeout": 1.0,                  # give up waiting for the jaw sensor after this
+    "replace_recorded_sleep": True,  # with a sensor, skip the recorded sleep that follows a gripper step
+    "sensor": None,                  # jaw sensor on a tool input, e.g. {"io": 0, "open": 1, "closed": 0}
+}
+
+# Warm start (warm_start.py): skip the home move between consecutive queued tasks
+WARM_START = {
+    "enabled": False,
+    "home_tolerance": 0.5,   # degrees; end and start pose must match this closely
+    "max_joint_jump": 60,    # degrees any joint may travel on the direct hop
+    # [current action, next action] pairs whose direct hop has been run and
+    # checked for clearance on the cell, e.g. ["tap", "tap"]; others go home
+    "transitions": [],
+}
+
+# Idle pre-positioning towards the likely next task (prepositioning.py)
+PREPOSITION = {
+    "enabled": True,
+    "idle_delay": 2.0,     # seconds of empty queue before the arm is staged
+    "history": 20,         # recent completed tasks per system the prediction looks at
+    "min_share": 0.5,      # share of that history the predicted task must have
+    "fraction": 0.8,       # how far along the home -> entry line the arm is parked
+    "speed": 50,           # joint speed of the staging and return moves
+}
+
+# Checkpoints and error recovery (checkpoints.py)
+RECOVERY = {
+    "enabled": True,
+    "checkpoint_dir": "checkpoints",   # last checkpoint per system, rewritten after every step
+    "resume_attempts": 1,              # re-runs of a failed step after cleaning the error
+    "retreat": True,                   # back out along the executed path when resuming fails
+    "retreat_speed": 30,               # speed cap for the retreat path
+    # controller errors after which the failed step is never re-run: self-collision,
+    # joint angle limit, speed limit, collision current, safety boundary
+    "no_resume_errors": [22, 23, 24, 31, 35],
+}
+
+# Task journal (task_journal.py / replay.py)
+JOURNAL = {
+    "enabled": True,
+    "dir": "journal",          # one JSONL file per system and day
+    "sample_reports": True,    # store the reported joint angles after each step
+}
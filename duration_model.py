@@ -0,0 +1,159 @@
+"""
+duration_model.py
+-----------------
+Task run-time prediction, calibrated from measured executions.
+
+The base prediction of a task with a sequence is the sequence_lint cycle
+time estimate (trapezoidal joint moves from the joint deltas and step
+speeds, tool moves, sleeps, move delays and gripper delays). Real runs
+differ from it by a per-system, per-action factor (controller overhead,
+report latency, warm starts, an attached PIN entry), so every completed
+task updates an exponentially weighted ratio measured / base for its
+(system, action). Tasks whose sequence is only compiled by the worker
+(screen flows, PIN only) have no base estimate; for them the model keeps
+the weighted mean of the measured seconds instead.
+
+A calibration is used once it has DURATION_MODEL["min_samples"] runs;
+until then the base estimate (or QUEUE_LIMITS["default_task_s"]) is used
+as is. Calibrations are stored in DURATION_MODEL["file"] so they survive
+restarts: a run only marks the calibration dirty, and a timer thread
+writes it (temp file + os.replace) at most every
+DURATION_MODEL["save_interval"] seconds, plus once on shutdown (flush()).
+They can be bootstrapped from task journals:
+
+    python duration_model.py calibrate journal/*.jsonl
+    python duration_model.py show
+
+admission.predict_duration() goes through predict(), so the predicted
+waits, the ETAs of queued jobs and the admission limits all use the
+calibrated durations.
+"""
+
+import os
+import json
+import logging
+import threading
+from config import DURATION_MODEL
+from sequence_lint import lint_sequence
+from warm_start import steps_of
+
+
+def base_estimate(sequence):
+    """sequence_lint estimate of a sequence in seconds, or None without steps"""
+    steps = steps_of(sequence) if sequence else None
+    if not isinstance(steps, list) or not steps:
+        return None
+    _, stats = lint_sequence(steps)
+    return round(stats["motion_s"] + stats["dwell_s"], 2)
+
+
+def action_of(meta):
+    return meta.get("action") or "pin_only"
+
+
+class DurationModel:
+    """Per (system, action) calibration of predicted task durations"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # one writer at a time, outside _lock
+        self._dirty = False
+        self._timer = None
+        self.calibration = {}   # {"<system>": {action: {"ratio" | "seconds": float, "n": int}}}
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.calibration = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable duration calibration {path}: {e}")
+
+    def _entry(self, system_id, action):
+        entry = self.calibration.get(str(system_id), {}).get(action)
+        if entry and entry["n"] >= DURATION_MODEL["min_samples"]:
+            return entry
+        return None
+
+    def predict(self, system_id, meta, base, default):
+        """Calibrated seconds of a task; `base` is its estimate or None, `default` the fallback"""
+        with self._lock:
+            entry = self._entry(system_id, action_of(meta))
+        if base is not None:
+            return round(base * entry["ratio"], 2) if entry and "ratio" in entry else base
+        return round(entry["seconds"], 2) if entry and "seconds" in entry else default
+
+    def observe(self, system_id, meta, elapsed, base=None):
+        """Fold one measured run of a completed task into its calibration"""
+        if elapsed is None or elapsed <= 0:
+            return
+        alpha = DURATION_MODEL["alpha"]
+        low, high = DURATION_MODEL["ratio_bounds"]
+        if base:
+            field, value = "ratio", min(high, max(low, elapsed / base))
+        else:
+            field, value = "seconds", elapsed
+        with self._lock:
+            entries = self.calibration.setdefault(str(system_id), {})
+            entry = entries.setdefault(action_of(meta), {"n": 0})
+            previous = entry.get(field)
+            entry[field] = round(value if previous is None else previous + alpha * (value - previous), 4)
+            entry["n"] += 1
+            self._dirty = True
+            if self.path and self._timer is None:
+                self._timer = threading.Timer(DURATION_MODEL["save_interval"], self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the calibration now if it changed since the last write"""
+        with self._save_lock:
+            with self._lock:
+                timer, self._timer = self._timer, None
+                if not self._dirty or not self.path:
+                    return
+                blob = json.dumps(self.calibration, indent=1, sort_keys=True)
+                self._dirty = False
+            if timer is not None:
+                timer.cancel()   # flushed before the timer fired
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w") as f:
+                    f.write(blob)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logging.error(f"Could not save duration calibration: {e}")
+
+
+model = DurationModel(DURATION_MODEL["file"]) if DURATION_MODEL["enabled"] else None
+
+
+def calibrate_from_journal(target, tasks):
+    """Feed the completed tasks of replay.load_journal() into a model; returns how many were used"""
+    used = 0
+    for task in tasks:
+        end = task["end"]
+        if end is None or end["status"] != "completed":
+            continue
+        meta = {"action": task["request"].get("action")}
+        target.observe(task["system"], meta, end["elapsed"], base_estimate(task["steps"]))
+        used += 1
+    return used
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or bootstrap the task duration calibration")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="print the current calibration")
+    p_cal = sub.add_parser("calibrate", help="fold the completed tasks of task journals into the calibration")
+    p_cal.add_argument("journals", nargs="+")
+    args = parser.parse_args()
+
+    target = model or DurationModel(DURATION_MODEL["file"])
+    if args.command == "calibrate":
+        from replay import load_journal
+        used = calibrate_from_journal(target, load_journal(args.journals))
+        target.flush()
+        print(f"Calibrated from {used} completed tasks")
+    print(json.dumps(target.calibration, indent=2, sort_keys=True))
@@ -0,0 +1,114 @@
+"""
+gripper_control.py
+------------------
+Asynchronous Lite6 gripper commands with completion sensing.
+
+The recorded sequences open/close the gripper and then sleep a fixed time
+(handler default 0.5 s plus the recorders' timed_sleep(0.5)). With
+GRIPPER["async"] the command is issued without waiting, and the worker
+waits for completion only before the next step that depends on it:
+
+- completion is only sensed with a jaw sensor wired to a tool input
+  (GRIPPER["sensor"]), which is polled until it shows the commanded
+  state. Without one nothing on the arm reflects the jaw (the tool
+  outputs read back as soon as they are set), so the wait is the jaw
+  travel time GRIPPER["settle"] after the command.
+- an open issued while the gripper holds nothing (pre-grasp) lets the
+  following moves run while the jaw opens; releasing a held card and
+  every close are waited for before the arm moves.
+- the recorded sleep right after a gripper step is replaced by the
+  sensed wait (GRIPPER["replace_recorded_sleep"]) only with a sensor.
+  Without one it is kept, lengthened to the settle time if shorter, since
+  taught dwells after a grip (a card settling in the reader) can be
+  longer than the jaw travel.
+"""
+
+import time
+import logging
+import threading
+from config import GRIPPER
+
+GRIPPER_STEPS = ("gripper_open", "gripper_close")
+
+
+class GripperTracker:
+    """Pending gripper command and grip state of one arm"""
+
+    def __init__(self, arm, settings=None):
+        self.arm = arm
+        self.settings = dict(GRIPPER, **(settings or {}))
+        self.pending = None        # (opening, issued_at) of a command not yet confirmed
+        self.holding = False       # last command was a close
+        self.overlap_ok = False    # moves may run while the pending command completes
+
+    def command(self, opening):
+        """Issue open/close without blocking on the jaw"""
+        self.wait()
+        if opening:
+            code = self.arm.open_lite6_gripper(sync=False)
+        else:
+            code = self.arm.close_lite6_gripper(sync=False)
+        if code != 0:
+            logging.warning(f"Gripper {'open' if opening else 'close'} returned code {code}")
+        self.pending = (opening, time.time())
+        self.overlap_ok = opening and not self.holding
+        self.holding = not opening
+
+    def _confirmed(self, opening, sensor):
+        code, value = self.arm.get_tgpio_digital(sensor["io"])
+        return code == 0 and value == sensor["open" if opening else "closed"]
+
+    def wait(self):
+        """Block until the pending command has completed (no-op if none)"""
+        if self.pending is None:
+            return
+        opening, issued_at = self.pending
+        self.pending = None
+        s = self.settings
+        sensor = s.get("sensor")
+        if sensor:
+            deadline = issued_at + s["timeout"]
+            while not self._confirmed(opening, sensor):
+                if time.time() >= deadline:
+                    logging.warning(f"Gripper {'open' if opening else 'close'} not confirmed "
+                                    f"within {s['timeout']}s, continuing")
+                    break
+                time.sleep(s["poll_interval"])
+        else:
+            remaining = issued_at + s["settle"] - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+        logging.debug(f"Gripper {'open' if opening else 'close'} done after {time.time() - issued_at:.3f}s")
+
+    def sleep_after(self, duration):
+        """
+        The recorded sleep following a gripper step: skipped after a sensed
+        wait, otherwise max(recorded, settle) counted from the command
+        """
+        issued_at = self.pending[1] if self.pending is not None else time.time()
+        self.wait()
+        if self.settings.get("sensor") and self.settings["replace_recorded_sleep"]:
+            logging.debug(f"Skipping recorded gripper sleep of {duration}s")
+            return
+        remaining = issued_at + max(duration, self.settings["settle"]) - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def stopped(self):
+        """The gripper was stopped (stop_lite6_gripper): nothing pending, nothing held"""
+        self.pending = None
+        self.holding = False
+        self.overlap_ok = False
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(arm):
+    """Shared tracker per arm connection"""
+    with _trackers_lock:
+        tracker = _trackers.get(id(arm))
+        if tracker is None or tracker.arm is not arm:
+            tracker = _trackers[id(arm)] = GripperTracker(arm)
+        return tracker
@@ -0,0 +1,256 @@
+"""
+kinematics.py
+-------------
+Inverse kinematics for offline motion compilation.
+
+IKSolver resolves Cartesian poses [x, y, z, roll, pitch, yaw] (mm / deg) to
+joint angles (deg). Solutions are cached on disk, so recompiling a library
+whose poses have not changed never touches the arm. On a cache miss the
+solver uses a local solver function if one is given, otherwise it connects
+to the arm once and asks the controller (get_inverse_kinematics), like the
+recorder scripts do. The misses of a whole spec or path are sent as one
+pipelined batch (get_inverse_kinematics_batch) instead of one round trip
+per pose.
+
+Every solution gets the recorders' shortest-path unwrap against the
+previous joints and the joint-limit check. The Lite6 wrist axes meet in
+one point, so (J4 + 180, -J5, J6 + 180) reaches the same pose on the other
+wrist branch (the sign of J5). A path stays on the branch it is on: the
+cached solution is used when the previous joints are on its branch, its
+wrist flip when they are on the other one (the cache holds one solution
+per pose, recordings reach some poses on either branch). A solution that
+is out of range on the path's branch is an error, never a silent flip.
+
+The module also holds the rigid-transform helpers used for rack frames
+(poses use the xArm roll/pitch/yaw convention, R = Rz(yaw) Ry(pitch) Rx(roll))
+and a local Lite6 forward kinematics (link_points) used for workspace
+volumes (workspace.py).
+"""
+
+import os
+import math
+import json
+import logging
+from lazy_imports import lazy
+
+np = lazy("numpy")
+
+JOINT_LIMITS_DEG = [        # Lite6 joint ranges
+    (-360, 360),   # J1
+    (-150, 150),   # J2
+    (-3.5, 300),   # J3
+    (-360, 360),   # J4
+    (-124, 124),   # J5
+    (-360, 360),   # J6
+]
+
+LITE6_DH = [                # modified D-H: a (mm), d (mm), alpha (rad), theta offset (rad)
+    (0.0, 243.3, 0.0, 0.0),
+    (0.0, 0.0, -math.pi / 2, -math.pi / 2),
+    (200.0, 0.0, math.pi, -math.pi / 2),
+    (87.0, 227.6, math.pi / 2, 0.0),
+    (0.0, 0.0, math.pi / 2, 0.0),
+    (0.0, 61.5, -math.pi / 2, 0.0),
+]
+
+
+class IKError(ValueError):
+    """Raised when a pose has no usable IK solution"""
+
+
+def within_limits(joints):
+    """True if every joint is inside JOINT_LIMITS_DEG"""
+    return all(low <= a <= high for a, (low, high) in zip(joints, JOINT_LIMITS_DEG))
+
+
+def unwrap_to(joints, previous):
+    """Shift each joint by +-360 so it moves the short way from `previous`"""
+    joints = list(joints)
+    if previous:
+        for i in range(min(6, len(previous))):
+            diff = joints[i] - previous[i]
+            if diff > 180:
+                joints[i] -= 360
+            elif diff < -180:
+                joints[i] += 360
+    return joints
+
+
+def wrist_branch(joints):
+    """+1 / -1: the side of the wrist singularity (J5 = 0) a solution is on"""
+    return 1 if joints[4] >= 0 else -1
+
+
+def wrist_flip(joints):
+    """The other wrist branch of a solution: same flange pose, J5 mirrored"""
+    joints = list(joints)
+    return joints[:3] + [joints[3] + 180, -joints[4], joints[5] + 180] + joints[6:]
+
+
+def rpy_to_matrix(rpy_deg):
+    """(N, 3) roll/pitch/yaw in degrees -> (N, 3, 3) rotation matrices"""
+    r, p, y = np.radians(np.atleast_2d(rpy_deg)).T
+    cr, sr, cp, sp, cy, sy = np.cos(r), np.sin(r), np.cos(p), np.sin(p), np.cos(y), np.sin(y)
+    return np.stack([
+        np.stack([cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr], axis=-1),
+        np.stack([sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr], axis=-1),
+        np.stack([-sp, cp * sr, cp * cr], axis=-1),
+    ], axis=-2)
+
+
+def matrix_to_rpy(mats):
+    """(N, 3, 3) rotation matrices -> (N, 3) roll/pitch/yaw in degrees"""
+    mats = np.asarray(mats).reshape(-1, 3, 3)
+    pitch = np.arcsin(np.clip(-mats[:, 2, 0], -1.0, 1.0))
+    roll = np.arctan2(mats[:, 2, 1], mats[:, 2, 2])
+    yaw = np.arctan2(mats[:, 1, 0], mats[:, 0, 0])
+    return np.degrees(np.stack([roll, pitch, yaw], axis=-1))
+
+
+def transform_poses(poses, rotation, translation):
+    """
+    Apply the rigid transform p' = R p + t to (N, 6) poses, rotating the
+    tool orientation with it. Vectorised over all poses.
+    """
+    poses = np.atleast_2d(np.asarray(poses, dtype=float))
+    rotation = np.asarray(rotation, dtype=float)
+    positions = poses[:, :3] @ rotation.T + np.asarray(translation, dtype=float)
+    orientations = matrix_to_rpy(rotation @ rpy_to_matrix(poses[:, 3:6]))
+    return np.hstack([positions, orientations])
+
+
+def fit_rigid_transform(src, dst):
+    """
+    Least-squares rigid transform mapping points src -> dst (Kabsch).
+    With fewer than 3 non-collinear points the rotation is not observable,
+    so only the mean translation is fitted. Returns (R, t, rms residual).
+    """
+    src = np.asarray(src, dtype=float)
+    dst = np.asarray(dst, dtype=float)
+    src_c, dst_c = src.mean(axis=0), dst.mean(axis=0)
+    if len(src) >= 3 and np.linalg.matrix_rank(src - src_c, tol=1.0) >= 2:
+        u, _, vt = np.linalg.svd((src - src_c).T @ (dst - dst_c))
+        d = np.sign(np.linalg.det(vt.T @ u.T))
+        rotation = vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+    else:
+        rotation = np.eye(3)
+    translation = dst_c - rotation @ src_c
+    residual = dst - (src @ rotation.T + translation)
+    return rotation, translation, float(np.sqrt((residual ** 2).sum(axis=1).mean()))
+
+
+def link_points(joints, tool_length=0.0):
+    """
+    Base-frame positions (mm) of the base, every joint frame and the tool
+    tip `tool_length` mm beyond the flange, for joint angles in degrees.
+    The links are the straight segments between consecutive points.
+    Returns (points (N, 3), flange rotation matrix).
+    """
+    frame = np.eye(4)
+    points = [frame[:3, 3].copy()]
+    for (a, d, alpha, offset), angle in zip(LITE6_DH, joints):
+        theta = np.radians(angle) + offset
+        ca, sa, ct, st = np.cos(alpha), np.sin(alpha), np.cos(theta), np.sin(theta)
+        frame = frame @ np.array([
+            [ct, -st, 0.0, a],
+            [st * ca, ct * ca, -sa, -sa * d],
+            [st * sa, ct * sa, ca, ca * d],
+            [0.0, 0.0, 0.0, 1.0],
+        ])
+        points.append(frame[:3, 3].copy())
+    if tool_length:
+        points.append(frame[:3, 3] + frame[:3, 2] * tool_length)
+    return np.array(points), frame[:3, :3]
+
+
+def pose_key(pose):
+    return ",".join(f"{float(v):.3f}" for v in pose)
+
+
+class IKSolver:
+    """
+    Cached IK. `local_solver(pose) -> joints` is used on cache misses when
+    given; otherwise the arm at `arm_ip` is connected on the first miss.
+    """
+
+    def __init__(self, arm_ip=None, cache_file="ik_cache.json", local_solver=None):
+        self.arm_ip = arm_ip
+        self.cache_file = cache_file
+        self.local_solver = local_solver
+        self._arm = None
+        self.cache = {}
+        self.misses = 0
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                self.cache = json.load(f)
+
+    def _connect(self):
+        if self._arm is None:
+            if not self.arm_ip:
+                raise IKError("IK cache miss and no arm_ip or local solver available")
+            from xarm.wrapper import XArmAPI
+            logging.info(f"IK solver connecting to arm at {self.arm_ip}")
+            self._arm = XArmAPI(self.arm_ip)
+            self._arm.connect()
+        return self._arm
+
+    def _solve_uncached(self, pose):
+        if self.local_solver is not None:
+            return self.local_solver(pose)
+        code, joints = self._connect().get_inverse_kinematics(
+            pose, input_is_radian=False, return_is_radian=False
+        )
+        if code != 0 or not joints:
+            raise IKError(f"IK failed (code {code}) for pose {pose}")
+        return joints
+
+    def solve(self, pose, previous=None):
+        """Joint angles for `pose`, unwrapped against `previous` and limit-checked"""
+        key = pose_key(pose)
+        joints = self.cache.get(key)
+        if joints is None:
+            self.misses += 1
+            joints = [float(a) for a in self._solve_uncached(list(pose))[:6]]
+            self.cache[key] = joints
+        if previous and wrist_branch(previous) != wrist_branch(joints):
+            joints = wrist_flip(joints)
+        joints = unwrap_to(joints, previous)
+        if not within_limits(joints):
+            raise IKError(f"Pose {pose} is out of joint range: {[round(a, 2) for a in joints]}")
+        return joints
+
+    def prefetch(self, poses):
+        """Fill the cache for all missing poses with one pipelined IK batch"""
+        missing = list({pose_key(p): list(p) for p in poses if pose_key(p) not in self.cache}.values())
+        if len(missing) < 2 or self.local_solver is not None or not self.arm_ip:
+            return
+        arm = self._connect()
+        if not hasattr(arm, "get_inverse_kinematics_batch"):
+            return
+        _, results = arm.get_inverse_kinematics_batch(missing, input_is_radian=False, return_is_radian=False)
+        if not isinstance(results, list):
+            return   # not connected: solve() reports the failure per pose
+        for pose, (code, joints) in zip(missing, results):
+            if code == 0 and joints:
+                self.misses += 1
+                self.cache[pose_key(pose)] = [float(a) for a in joints[:6]]
+
+    def solve_many(self, poses, previous=None):
+        """Solve a path of poses in order, each unwrapped against the last"""
+        self.prefetch(poses)
+        out = []
+        for pose in poses:
+            previous = self.solve(pose, previous)
+            out.append(previous)
+        return out
+
+    def save(self):
+        if self.cache_file:
+            with open(self.cache_file, "w") as f:
+                json.dump(self.cache, f, indent=1, sort_keys=True)
+
+    def close(self):
+        self.save()
+        if self._arm is not None:
+            self._arm.disconnect()
+            self._arm = None
@@ -0,0 +1,140 @@
+"""
+lazy_imports.py
+---------------
+Deferred loading of the heavy device libraries (OpenCV, Google Vision,
+treepoem, PIL, pyserial).
+
+camera_util and barcode_utils used to import them at module load, so every
+start of roboticserver_u2.py paid for OpenCV and the Vision client before
+the first arm could take a task. They now bind module proxies instead:
+
+    cv2 = lazy("cv2")
+
+The real module is imported on the first attribute access (the first
+camera / OCR / barcode request) and the proxy forwards to it from then on.
+prewarm() imports the LAZY_IMPORTS["prewarm"] modules on a background
+thread once the server is up, so the first device request usually finds
+them loaded without start-up waiting for them.
+
+Every load is timed; import_profile() reports where import time goes.
+
+Usage:
+    python lazy_imports.py                   # per-module cold import time of the server
+    python lazy_imports.py camera_util --top 15
+"""
+
+import time
+import logging
+import importlib
+import threading
+from config import LAZY_IMPORTS
+
+_lock = threading.RLock()
+load_times = {}   # {module name: seconds its first import took}
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is used"""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = load(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy(name):
+    """Proxy for module `name` that imports it on first use"""
+    return LazyModule(name)
+
+
+def load(name):
+    """Import a module now (timed once); safe to call from several threads"""
+    with _lock:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        if name not in load_times:
+            load_times[name] = round(time.perf_counter() - start, 3)
+            logging.info(f"Loaded {name} in {load_times[name]:.3f}s")
+    return module
+
+
+def _prewarm(names):
+    for name in names:
+        try:
+            load(name)
+        except Exception as e:
+            # Missing on this host: the endpoint using it reports the error
+            logging.warning(f"Prewarm of {name} failed: {e}")
+
+
+def prewarm(names=None):
+    """Import the device libraries on a background thread; returns the thread"""
+    names = LAZY_IMPORTS["prewarm"] if names is None else names
+    thread = threading.Thread(target=_prewarm, args=(list(names),), daemon=True, name="ImportPrewarm")
+    thread.start()
+    return thread
+
+
+def import_profile():
+    """{module: seconds} of every module loaded through this helper so far"""
+    with _lock:
+        return dict(load_times)
+
+
+def profile_imports(target, top=20):
+    """
+    Cold-import `target` in a fresh interpreter with -X importtime and
+    return [(cumulative seconds, self seconds, module)] of the target and
+    the modules it imports directly, slowest first.
+    """
+    import sys
+    import subprocess
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"],
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue   # header line
+        name = fields[2].rstrip()
+        if len(name) - len(name.lstrip()) > 3:
+            continue   # nested deeper than a direct import
+        rows.append((int(fields[1]) / 1e6, int(fields[0]) / 1e6, name.strip()))
+    if result.returncode != 0:
+        logging.error(f"import {target} failed: {result.stderr.strip().splitlines()[-1]}")
+    return sorted(rows, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report where cold-start import time goes")
+    parser.add_argument("target", nargs="?", default="roboticserver_u2")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = profile_imports(args.target, args.top)
+    print(f"{'cumulative':>10} {'self':>8}  module")
+    for cumulative, own, name in rows:
+        print(f"{cumulative:>9.3f}s {own:>7.3f}s  {name}")
+    lazy_names = sorted(set(LAZY_IMPORTS["prewarm"]))
+    print(f"deferred until first use or prewarm: {', '.join(lazy_names)}")
@@ -0,0 +1,241 @@
+"""
+motion_process.py
+-----------------
+One OS process per arm for motion execution.
+
+The arm workers, the Flask handlers and the camera / OCR / barcode jobs
+all share one interpreter and its GIL, so a CPU-heavy OCR preprocessing
+or barcode render could delay the dispatch of the next motion command or
+the parsing of the arm's report stream. With MOTION_PROCESS["enabled"]
+each arm is connected and driven from its own process instead:
+
+    front end (armsideclient.worker_thread)        motion process
+    queue, admission, warm start, planning   -->   ("run", sequence, pin, job)
+    journal step records, checkpoint mirror  <--   ("step", ...), ("checkpoint", ...)
+    workspace reservations (workspace.py)    <--   ("reserve", ...) --> ("granted", ok)
+                                             <--   ("release", ...)
+    idle pre-positioning (prepositioning.py) -->   ("stage", home, entry)
+                                             <--   ("staged", ok)
+    job finished / failed                    <--   ("done", seconds) / ("failed", message)
+
+The job registry, queues and journal file stay in the server process; the
+motion process owns the arm, the gripper tracker and the checkpoint file.
+Commands and status go over a duplex multiprocessing Pipe: the messages
+are a few per motion step, so a shared-memory ring would only add
+complexity. If the motion process dies, or sends nothing for
+MOTION_PROCESS["reply_timeout"] seconds while the server waits for it
+(it is then killed as stuck), the running job fails and the process is
+restarted before the next task.
+
+Only the server writes robot_server.log: the motion process hands its log
+records to a multiprocessing queue, and a listener thread in the server
+passes them to the server's loggers.
+"""
+
+import time
+import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
+from config import MOTION_PROCESS
+
+
+class MotionProcessError(RuntimeError):
+    """Raised when the motion process is not running or stopped mid-task"""
+
+
+class _ServerLog(logging.Handler):
+    """Passes a motion process's log records to the server's loggers"""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+class MotionProcess:
+    """Front-end handle of one arm's motion process"""
+
+    def __init__(self, system_id):
+        self.system_id = system_id
+        self._context = multiprocessing.get_context(MOTION_PROCESS["start_method"])
+        self.process = None
+        self.conn = None
+        self._log_listener = None
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def start(self):
+        """Spawn the process and wait until it has connected the arm"""
+        self.conn, child_conn = self._context.Pipe()
+        log_queue = self._context.Queue()
+        self._log_listener = QueueListener(log_queue, _ServerLog())
+        self._log_listener.start()
+        self.process = self._context.Process(target=motion_main, args=(self.system_id, child_conn, log_queue),
+                                             daemon=True, name=f"System-{self.system_id}-Motion")
+        self.process.start()
+        child_conn.close()
+        timeout = MOTION_PROCESS["start_timeout"]
+        if not self.conn.poll(timeout):
+            self.close()
+            raise MotionProcessError(f"System {self.system_id} motion process not ready within {timeout}s")
+        kind, detail = self._recv()
+        if kind != "ready":
+            self.close()
+            raise MotionProcessError(f"System {self.system_id} motion process failed to start: {detail}")
+        logging.info(f"System {self.system_id} motion process {self.pid} ready")
+        return self
+
+    def ensure_running(self):
+        """Restart the process if it has died since the last task"""
+        if not self.alive:
+            logging.warning(f"System {self.system_id} motion process is not running, restarting it")
+            self.close()
+            self.start()
+
+    def _recv(self):
+        timeout = MOTION_PROCESS["reply_timeout"]
+        try:
+            if not self.conn.poll(timeout):
+                self.process.kill()
+                self.process.join(1.0)
+                raise MotionProcessError(f"System {self.system_id} motion process sent nothing for "
+                                         f"{timeout}s and was killed")
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(1.0)
+            raise MotionProcessError(f"System {self.system_id} motion process exited "
+                                     f"(exit code {self.process.exitcode})")
+
+    def run(self, sequence, pin, job):
+        """
+        Execute a task in the motion process and block until it is done.
+        Step and checkpoint records are applied here as they arrive; a
+        failed task raises RuntimeError with the motion process's message.
+        """
+        self.conn.send(("run", sequence, pin, job))
+        return self._serve("done")
+
+    def stage(self, home, entry):
+        """Start a pre-positioning move (prepositioning.Stager); True if it was started"""
+        self.conn.send(("stage", home, entry))
+        return self._serve("staged")
+
+    def _serve(self, final):
+        """Handle the motion process's messages until the `final` reply arrives"""
+        from task_journal import journal
+        import checkpoints
+        import workspace
+
+        while True:
+            kind, detail = self._recv()
+            if kind == final:
+                return detail
+            elif kind == "step":
+                if journal is not None:
+                    journal.step(*detail)
+            elif kind == "checkpoint":
+                checkpoints.mirror(*detail)
+            elif kind == "reserve":
+                self.conn.send(("granted", workspace.table.acquire(*detail)))
+            elif kind == "release":
+                workspace.table.release_to(*detail)
+            elif kind == "failed":
+                raise RuntimeError(detail)
+
+    def close(self, timeout=5.0):
+        """Stop the gripper, disconnect the arm and end the process"""
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self.conn.send(("stop",))
+            except (OSError, ValueError):
+                pass
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(1.0)
+        self.conn.close()
+        self.process = None
+        self._log_listener.stop()
+        self._log_listener = None
+
+
+def _relay_step(conn):
+    """Stand-in for the journal in the motion process: sends step records to the server"""
+
+    class JournalRelay:
+        def step(self, system_id, job_id, i, stype, started, duration, ok=True, error=None, joints=None):
+            conn.send(("step", (system_id, job_id, i, stype, started, duration, ok,
+                                None if error is None else str(error), joints)))
+
+    return JournalRelay()
+
+
+def _relay_reservations(conn):
+    """Stand-in for the workspace table in the motion process: the table lives in the server"""
+
+    class TableRelay:
+        def acquire(self, system_id, box, timeout):
+            conn.send(("reserve", (system_id, box, timeout)))
+            kind, granted = conn.recv()
+            return granted
+
+        def release_to(self, system_id, box):
+            conn.send(("release", (system_id, box)))
+
+    return TableRelay()
+
+
+def motion_main(system_id, conn, log_queue):
+    """Entry point of the motion process: connect the arm, then execute tasks from the pipe"""
+    handler = QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter(f"[MOTION {system_id}] %(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+    import armsideclient
+    import checkpoints
+    import workspace
+    from prepositioning import get_stager
+
+    try:
+        arm = armsideclient.initialize_arm_connection(system_id)
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+    if armsideclient.journal is not None:
+        armsideclient.journal = _relay_step(conn)
+    workspace.table = _relay_reservations(conn)
+    checkpoints.add_listener(lambda sid, fields, replace: conn.send(("checkpoint", (sid, fields, replace))))
+    conn.send(("ready", {"pid": multiprocessing.current_process().pid}))
+
+    while True:
+        try:
+            op, *args = conn.recv()
+        except EOFError:
+            break   # server gone
+        if op == "stop":
+            break
+        if op == "stage":
+            conn.send(("staged", get_stager(arm).stage(system_id, *args)))
+            continue
+        sequence, pin, job = args
+        started = time.time()
+        try:
+            armsideclient.execute_task(arm, system_id, sequence, pin, job)
+        except Exception as e:
+            conn.send(("failed", str(e)))
+            continue
+        conn.send(("done", round(time.time() - started, 3)))
+        armsideclient.stop_gripper(arm, system_id)
+
+    armsideclient.unstage(arm, system_id)
+    try:
+        arm.stop_lite6_gripper(sync=True)
+        arm.disconnect()
+        logging.info(f"System {system_id} gripper stopped and arm disconnected")
+    except Exception as e:
+        logging.error(f"Failed to stop System {system_id} arm: {e}")
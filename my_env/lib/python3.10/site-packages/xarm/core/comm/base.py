@@ -142,7 +142,10 @@ class Port(threading.Thread):
         timeout_count = 0
         size = 0
         data_num = 0
-        buffer = b''
+        # Reports are received in place into one reusable buffer; each
+        # complete report is handed on as a single immutable copy.
+        buffer = bytearray(max(self.buffer_size, 1024))
+        view = memoryview(buffer)
         size_is_not_confirm = False
 
         data_prev_us = 0
@@ -160,7 +163,7 @@ class Port(threading.Thread):
         try:
             while self.connected and self.alive:
                 try:
-                    data = self.com_read(4 - data_num if size == 0 else (size - data_num))
+                    recv_num = self.com.recv_into(view[data_num:4 if size == 0 else size])
                 except socket.timeout:
                     timeout_count += 1
                     if timeout_count > 3:
@@ -169,7 +172,7 @@ class Port(threading.Thread):
                         break
                     continue
                 else:
-                    if len(data) == 0:
+                    if recv_num == 0:
                         failed_read_count += 1
                         if failed_read_count > 5:
                             self._connected = False
@@ -177,28 +180,33 @@ class Port(threading.Thread):
                             break
                         time.sleep(0.1)
                         continue
-                    data_num += len(data)
-                    buffer += data
+                    data_num += recv_num
                     if size == 0:
                         if data_num != 4:
                             continue
-                        size = convert.bytes_to_u32(buffer[0:4])
+                        size = convert.bytes_to_u32(view[0:4])
                         if size == 233:
                             size_is_not_confirm = True
                             size = 245
+                        if size > len(buffer):
+                            view.release()
+                            buffer = buffer[:data_num] + bytearray(size - data_num)
+                            view = memoryview(buffer)
                         logger.info('report_data_size: {}, size_is_not_confirm={}'.format(size, size_is_not_confirm))
                     else:
                         if data_num < size:
                             continue
-                        if size_is_not_confirm:
-                            size_is_not_confirm = True
-                            if convert.bytes_to_u32(buffer[233:237]) == 233:
-                                size = 233
-                                buffer = buffer[233:]
-                                continue
+                        if size_is_not_confirm and size == 245 and convert.bytes_to_u32(view[233:237]) == 233:
+                            # The reports really are 233 bytes: keep the start of the next one
+                            size_is_not_confirm = False
+                            size = 233
+                            buffer[:data_num - 233] = view[233:data_num]
+                            data_num -= 233
+                            continue
 
-                        if convert.bytes_to_u32(buffer[0:4]) != size and not (size_is_not_confirm and size == 245 and convert.bytes_to_u32(buffer[0:4]) == 233):
-                            logger.error('report data error, close, length={}, size={}'.format(convert.bytes_to_u32(buffer[0:4]), size))
+                        length = convert.bytes_to_u32(view[0:4])
+                        if length != size and not (size_is_not_confirm and size == 245 and length == 233):
+                            logger.error('report data error, close, length={}, size={}'.format(length, size))
                             break
 
                         # # buffer[494:502]
@@ -236,8 +244,7 @@ class Port(threading.Thread):
 
                         if self.rx_que.qsize() > 1:
                             self.rx_que.get()
-                        self.rx_parse.put(buffer, True)
-                        buffer = b''
+                        self.rx_parse.put(bytes(view[:size]), True)
                         data_num = 0
 
                     timeout_count = 0
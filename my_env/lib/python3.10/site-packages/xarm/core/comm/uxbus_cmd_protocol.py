@@ -8,93 +8,80 @@
 # Author: Vinman <vinman.wen@ufactory.cc> <vinman.cub@gmail.com>
 
 
+import threading
 from ..utils import crc16
 from ..utils.log import logger
 
 # ux2_hex_protocol define
-UX2HEX_RXSTART_FROMID = 0
-UX2HEX_RXSTART_TOID = 1
-UX2HEX_RXSTATE_LEN = 2
-UX2HEX_RXSTATE_DATA = 3
-UX2HEX_RXSTATE_CRC1 = 4
-UX2HEX_RXSTATE_CRC2 = 5
 UX2HEX_RXLEN_MAX = 50
 
 
 class Ux2HexProtocol(object):
     """
     fromid and toid: broadcast address is 0xFF
+    frame: toid, fromid, len, data[len], crc_lo, crc_hi
+    Received chunks are appended to one bytearray and scanned frame by
+    frame; only complete frames are copied out. put() runs on the receive
+    thread and flush() on the command thread, so both hold _lock.
     """
     def __init__(self, rx_que, fromid, toid):
         self.rx_que = rx_que
-        self.rxstate = UX2HEX_RXSTART_FROMID
-        self.data_idx = 0
-        self.len = 0
         self.fromid = fromid
         self.toid = toid
-        self.rxbuf = None
+        self.rxbuf = bytearray()
+        self._lock = threading.Lock()
 
     # wipe cache , set from_id and to_id
     def flush(self, fromid=-1, toid=-1):
-        self.rxstate = UX2HEX_RXSTART_FROMID
-        self.data_idx = 0
-        self.len = 0
-        if fromid != -1:
-            self.fromid = fromid
-        if toid != -1:
-            self.toid = toid
+        with self._lock:
+            self.rxbuf.clear()
+            if fromid != -1:
+                self.fromid = fromid
+            if toid != -1:
+                self.toid = toid
 
     def put(self, rxstr, length=0):
         if length == 0:
             length = len(rxstr)
         if len(rxstr) < length:
             logger.error('len(rxstr) < length')
+        with self._lock:
+            self._put(rxstr[:length] if length < len(rxstr) else rxstr)
 
-        for i in range(length):
-            rxch = bytes([rxstr[i]])
-            # print_hex(self.DB_FLG, rxch, 1)
-            # print('state:%d' % (self.rxstate))
-            if UX2HEX_RXSTART_FROMID == self.rxstate:
-                if self.toid == rxch[0] or 255 == self.toid:
-                    self.rxbuf = rxch
-                    self.rxstate = UX2HEX_RXSTART_TOID
-
-            elif UX2HEX_RXSTART_TOID == self.rxstate:
-                if self.fromid == rxch[0] or self.fromid == 0xFF:
-                    self.rxbuf += rxch
-                    self.rxstate = UX2HEX_RXSTATE_LEN
-                else:
-                    self.rxstate = UX2HEX_RXSTART_FROMID
-
-            elif UX2HEX_RXSTATE_LEN == self.rxstate:
-                if rxch[0] < UX2HEX_RXLEN_MAX:
-                    self.rxbuf += rxch
-                    self.len = rxch[0]
-                    self.data_idx = 0
-                    self.rxstate = UX2HEX_RXSTATE_DATA
-                else:
-                    self.rxstate = UX2HEX_RXSTART_FROMID
-
-            elif UX2HEX_RXSTATE_DATA == self.rxstate:
-                if self.data_idx < self.len:
-                    self.rxbuf += rxch
-                    self.data_idx += 1
-                    if self.data_idx == self.len:
-                        self.rxstate = UX2HEX_RXSTATE_CRC1
-                else:
-                    self.rxstate = UX2HEX_RXSTART_FROMID
-
-            elif UX2HEX_RXSTATE_CRC1 == self.rxstate:
-                self.rxbuf += rxch
-                self.rxstate = UX2HEX_RXSTATE_CRC2
-
-            elif UX2HEX_RXSTATE_CRC2 == self.rxstate:
-                self.rxbuf += rxch
-                self.rxstate = UX2HEX_RXSTART_FROMID
-                crc = crc16.crc_modbus(self.rxbuf[:self.len + 3])
-                if crc[0] == self.rxbuf[self.len + 3] and crc[1] == self.rxbuf[self.len + 4]:
-                    if self.rx_que.full():
-                        self.rx_que.get()
-                    self.rx_que.put(self.rxbuf)
-                    # print(self.rxbuf)
-
+    def _put(self, data):
+        buf = self.rxbuf
+        buf += data
+        size = len(buf)
+        start_byte = bytes([self.toid])
+        i = 0
+        while i < size:
+            if self.toid != 0xFF:
+                i = buf.find(start_byte, i)
+                if i < 0:
+                    i = size
+                    break
+            if i + 3 > size:
+                break
+            if buf[i + 1] != self.fromid and self.fromid != 0xFF:
+                i += 2
+                continue
+            data_len = buf[i + 2]
+            if data_len >= UX2HEX_RXLEN_MAX:
+                i += 3
+                continue
+            if data_len == 0:
+                # an empty frame is never complete, its next byte is dropped
+                if i + 4 > size:
+                    break
+                i += 4
+                continue
+            end = i + data_len + 5
+            if end > size:
+                break
+            frame = bytes(buf[i:end])
+            i = end
+            if crc16.crc_modbus(frame[:-2]) == frame[-2:]:
+                if self.rx_que.full():
+                    self.rx_que.get()
+                self.rx_que.put(frame)
+        del buf[:i]
@@ -10,6 +10,29 @@
 
 import struct
 
+# Precompiled formats for the report/response decoders. unpack_from reads
+# straight out of bytes, bytearray and memoryview without slicing copies;
+# responses assembled as lists of ints go through bytes() first.
+_FP32 = struct.Struct('<f')
+_FP32S = {}
+_U16S = {}
+_I16S = {}
+_NUM32 = {}
+
+
+def _struct_of(cache, fmt, n):
+    st = cache.get(n)
+    if st is None:
+        st = cache[n] = struct.Struct(fmt.format(n))
+    return st
+
+
+def _unpack(st, data):
+    try:
+        return st.unpack_from(data)
+    except TypeError:
+        return st.unpack_from(bytes(data[:st.size]))
+
 
 def fp32_to_bytes(data, is_big_endian=False):
     """小端字节序"""
@@ -32,12 +55,7 @@ def int32s_to_bytes(data, n):
 
 def bytes_to_fp32(data):
     """小端字节序"""
-    byte = bytes([data[0]])
-    byte += bytes([data[1]])
-    byte += bytes([data[2]])
-    byte += bytes([data[3]])
-    ret = struct.unpack('<f', byte)
-    return ret[0]
+    return _unpack(_FP32, data)[0]
 
 
 def fp32s_to_bytes(data, n):
@@ -51,10 +69,9 @@ def fp32s_to_bytes(data, n):
 
 def bytes_to_fp32s(data, n):
     """小端字节序"""
-    ret = [0] * n
-    for i in range(n):
-        ret[i] = bytes_to_fp32(data[i * 4:i * 4 + 4])
-    return ret
+    if n <= 0:
+        return []
+    return list(_unpack(_struct_of(_FP32S, '<{}f', n), data))
 
 
 def u16_to_bytes(data):
@@ -82,18 +99,16 @@ def bytes_to_u16(data):
 
 def bytes_to_u16s(data, n):
     """大端字节序"""
-    ret = [0] * n
-    for i in range(n):
-        ret[i] = bytes_to_u16(data[i * 2: i * 2 + 2])
-    return ret
+    if n <= 0:
+        return []
+    return list(_unpack(_struct_of(_U16S, '>{}H', n), data))
 
 
 def bytes_to_16s(data, n):
     """大端字节序"""
-    ret = [0] * n
-    for i in range(n):
-        ret[i] = struct.unpack('>h', bytes(data[i * 2: i * 2 + 2]))[0]
-    return ret
+    if n <= 0:
+        return []
+    return list(_unpack(_struct_of(_I16S, '>{}h', n), data))
 
 
 def bytes_to_u32(data):
@@ -108,12 +123,10 @@ def bytes_to_u64(data):
 
 
 def bytes_to_num32(data, fmt='>l'):
-    byte = bytes([data[0]])
-    byte += bytes([data[1]])
-    byte += bytes([data[2]])
-    byte += bytes([data[3]])
-    ret = struct.unpack(fmt, byte)
-    return ret[0]
+    st = _NUM32.get(fmt)
+    if st is None:
+        st = _NUM32[fmt] = struct.Struct(fmt)
+    return _unpack(st, data)[0]
 
 
 def bytes_to_long_big(data):
@@ -57,20 +57,15 @@ CRC_TABLE_L = (
 0x80, 0x40)
 
 
-def crc_modbus(data):
-    leng = len(data)
-    init_crch = 0xFF
-    init_crcl = 0xFF
-    i = 0
+# Both tables folded into one 16-bit table for the reflected (low byte
+# first) update: crc = (crc >> 8) ^ CRC_TABLE[(crc ^ byte) & 0xFF]
+CRC_TABLE = tuple(l << 8 | h for h, l in zip(CRC_TABLE_H, CRC_TABLE_L))
 
-    while leng > 0:
-        index = init_crch ^ data[i]
-        i += 1
-        init_crch = init_crcl ^ CRC_TABLE_H[index]
-        init_crcl = CRC_TABLE_L[index]
-        leng -= 1
-    s = init_crch << 8 | init_crcl
-    crc = bytes([s // 256 % 256])
-    crc += bytes([s % 256])
-    return crc
 
+def crc_modbus(data):
+    """CRC-16/MODBUS of bytes, bytearray or memoryview data, low byte first"""
+    crc = 0xFFFF
+    table = CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return bytes((crc & 0xFF, crc >> 8))
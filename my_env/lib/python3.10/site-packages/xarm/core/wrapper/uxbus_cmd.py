@@ -223,6 +223,36 @@ class UxbusCmd(object):
         data[1:rxn+1] = convert.bytes_to_fp32s(ret[1:rxn * 4 + 1], rxn)
         return data
 
+    @lock_require
+    def pipeline(self, requests, timeout=None):
+        """
+        Run several independent requests; this base version sends them one
+        at a time (the TCP transport overrides it to pipeline them).
+        :param requests: [(funcode, pdu_data, pdu_len, rx_len), ...]
+        :return: one response per request, in request order
+        """
+        timeout = self._G_TOUT if timeout is None else timeout
+        results = []
+        for funcode, pdu_data, pdu_len, rx_len in requests:
+            ret = self.send_modbus_request(funcode, pdu_data, pdu_len)
+            if ret == -1:
+                results.append([XCONF.UxbusState.ERR_NOTTCP] * (rx_len + 1))
+                continue
+            results.append(self.recv_modbus_response(funcode, ret, rx_len, timeout))
+        return results
+
+    def swop_nfp32_many(self, funcode, datas_list, txn, rxn):
+        """swop_nfp32 for a batch of independent requests, in one pipeline"""
+        requests = [(funcode, convert.fp32s_to_bytes(datas, txn), txn * 4, rxn * 4) for datas in datas_list]
+        results = []
+        for ret in self.pipeline(requests):
+            data = [0] * (1 + rxn)
+            data[0] = ret[0]
+            if len(ret) >= rxn * 4 + 1:
+                data[1:rxn+1] = convert.bytes_to_fp32s(ret[1:rxn * 4 + 1], rxn)
+            results.append(data)
+        return results
+
     @lock_require
     def is_nfp32(self, funcode, datas, txn):
         hexdata = convert.fp32s_to_bytes(datas, txn)
@@ -636,6 +666,12 @@ class UxbusCmd(object):
     def get_fk(self, angles):
         return self.swop_nfp32(XCONF.UxbusReg.GET_FK, angles, 7, 6)
 
+    def get_iks(self, poses):
+        return self.swop_nfp32_many(XCONF.UxbusReg.GET_IK, poses, 6, 7)
+
+    def get_fks(self, angles_list):
+        return self.swop_nfp32_many(XCONF.UxbusReg.GET_FK, angles_list, 7, 6)
+
     def is_joint_limit(self, joint):
         return self.is_nfp32(XCONF.UxbusReg.IS_JOINT_LIMIT, joint, 7)
 
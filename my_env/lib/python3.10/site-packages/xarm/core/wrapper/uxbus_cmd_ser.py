@@ -64,8 +64,8 @@ class UxbusCmdSer(UxbusCmd):
     
     def send_modbus_request(self, reg, txdata, num, prot_id=-1, t_id=None):
         send_data = bytes([self.fromid, self.toid, num + 1, reg])
-        for i in range(num):
-            send_data += bytes([txdata[i]])
+        if num > 0:
+            send_data += bytes(txdata[:num])
         send_data += crc16.crc_modbus(send_data)
         self.arm_port.flush()
         if self._debug:
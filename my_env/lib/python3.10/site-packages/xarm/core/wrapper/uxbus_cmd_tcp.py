@@ -87,16 +87,17 @@ class UxbusCmdTcp(UxbusCmd):
         self._has_err_warn = False
         return 0
     
-    def send_modbus_request(self, unit_id, pdu_data, pdu_len, prot_id=-1, t_id=None):
+    def send_modbus_request(self, unit_id, pdu_data, pdu_len, prot_id=-1, t_id=None, flush=True):
         trans_id = self._transaction_id if t_id is None else t_id
         prot_id = self._protocol_identifier if prot_id < 0 else prot_id
         send_data = convert.u16_to_bytes(trans_id)
         send_data += convert.u16_to_bytes(prot_id)
         send_data += convert.u16_to_bytes(pdu_len + 1)
         send_data += bytes([unit_id])
-        for i in range(pdu_len):
-            send_data += bytes([pdu_data[i]])
-        self.arm_port.flush()
+        if pdu_len > 0:
+            send_data += bytes(pdu_data[:pdu_len])
+        if flush:
+            self.arm_port.flush()
         if self._debug:
             debug_log_datas(send_data, label='send({})'.format(unit_id))
         ret = self.arm_port.write(send_data)
@@ -127,29 +128,87 @@ class UxbusCmdTcp(UxbusCmd):
                     return ret
                 else:
                     continue
-            if prot_id != STANDARD_MODBUS_TCP_PROTOCOL and not ret_raw:
-                # Private Modbus TCP Protocol
-                ret[0] = self.check_private_protocol(rx_data)
-                num = convert.bytes_to_u16(rx_data[4:6]) - 2
-                ret = ret[:num + 1] if len(ret) >= num + 1 else [ret[0]] * (num + 1)
-                length = len(rx_data) - 8
-                for i in range(num):
-                    if i >= length:
-                        break
-                    ret[i + 1] = rx_data[i + 8]       
-            else:
-                # Standard Modbus TCP Protocol
-                ret[0] = 0
-                num = convert.bytes_to_u16(rx_data[4:6]) + 6
-                ret = ret[:num + 1] if len(ret) >= num + 1 else [ret[0]] * (num + 1)
-                length = len(rx_data)
-                for i in range(num):
-                    if i >= length:
-                        break
-                    ret[i + 1] = rx_data[i]
-            return ret
+            return self._unpack_response(rx_data, num, prot_id, ret_raw)
+        return ret
+
+    def _unpack_response(self, rx_data, num, prot_id, ret_raw=False):
+        ret = [0] * 320 if num == -1 else [0] * (num + 1)
+        if prot_id != STANDARD_MODBUS_TCP_PROTOCOL and not ret_raw:
+            # Private Modbus TCP Protocol
+            ret[0] = self.check_private_protocol(rx_data)
+            num = convert.bytes_to_u16(rx_data[4:6]) - 2
+            ret = ret[:num + 1] if len(ret) >= num + 1 else [ret[0]] * (num + 1)
+            length = len(rx_data) - 8
+            for i in range(num):
+                if i >= length:
+                    break
+                ret[i + 1] = rx_data[i + 8]
+        else:
+            # Standard Modbus TCP Protocol
+            ret[0] = 0
+            num = convert.bytes_to_u16(rx_data[4:6]) + 6
+            ret = ret[:num + 1] if len(ret) >= num + 1 else [ret[0]] * (num + 1)
+            length = len(rx_data)
+            for i in range(num):
+                if i >= length:
+                    break
+                ret[i + 1] = rx_data[i]
         return ret
 
+    @lock_require
+    def pipeline(self, requests, timeout=None, max_inflight=8):
+        """
+        Send independent requests back-to-back and match the responses by
+        transaction id, instead of one round trip per request.
+        :param requests: [(funcode, pdu_data, pdu_len, rx_len), ...]
+        :param timeout: seconds to wait for the next response
+        :param max_inflight: requests sent ahead of their responses
+        :return: one response per request, in request order, as recv_modbus_response returns them
+        """
+        timeout = self._G_TOUT if timeout is None else timeout
+        prot_id = self._protocol_identifier
+        results = [None] * len(requests)
+        pending = {}  # {trans_id: (index, funcode, rx_len)}
+        self.arm_port.flush()
+        index = 0
+        expired = time.monotonic() + timeout
+        while index < len(requests) or pending:
+            while index < len(requests) and len(pending) < max_inflight:
+                funcode, pdu_data, pdu_len, rx_len = requests[index]
+                trans_id = self.send_modbus_request(funcode, pdu_data, pdu_len, flush=False)
+                if trans_id == -1:
+                    results[index] = [XCONF.UxbusState.ERR_NOTTCP] * (rx_len + 1)
+                else:
+                    pending[trans_id] = (index, funcode, rx_len)
+                index += 1
+            if not pending:
+                continue
+            remaining = expired - time.monotonic()
+            if remaining <= 0:
+                break
+            rx_data = self.arm_port.read(remaining)
+            if rx_data == -1:
+                time.sleep(0.001)
+                continue
+            self._last_comm_time = time.monotonic()
+            if self._debug:
+                debug_log_datas(rx_data, label='recv(pipeline)')
+            trans_id = convert.bytes_to_u16(rx_data[0:2])
+            entry = pending.pop(trans_id, None)
+            if entry is None:
+                continue
+            expired = time.monotonic() + timeout
+            i, funcode, rx_len = entry
+            code = self.check_protocol_header(rx_data, trans_id, prot_id, funcode)
+            if code != 0:
+                results[i] = [code] + [0] * rx_len
+            else:
+                results[i] = self._unpack_response(rx_data, rx_len, prot_id)
+        for i, ret in enumerate(results):
+            if ret is None:
+                results[i] = [XCONF.UxbusState.ERR_TOUT] + [0] * requests[i][3]
+        return results
+
     # def send_hex_request(self, send_data):
     #     trans_id = int('0x' + str(send_data[0]) + str(send_data[1]), 16)
     #     data_str = b''
@@ -1749,6 +1749,20 @@ class XArmAPI(object):
         """
         return self._arm.get_inverse_kinematics(pose, input_is_radian=input_is_radian, return_is_radian=return_is_radian)
 
+    def get_inverse_kinematics_batch(self, poses, input_is_radian=None, return_is_radian=None):
+        """
+        Get inverse kinematics of several poses at once. Over TCP the requests
+        are pipelined (sent back-to-back and matched by transaction id), so the
+        batch costs about one round trip instead of one per pose.
+
+        :param poses: [[x(mm), y(mm), z(mm), roll(rad or °), pitch(rad or °), yaw(rad or °)], ...]
+        :param input_is_radian: the param pose values(only roll/pitch/yaw) are in radians or not, default is self.default_is_radian
+        :param return_is_radian: the returned values are in radians or not, default is self.default_is_radian
+        :return: tuple((code, results)), code is the first non-zero code of the batch or 0
+            results: [(code, angles), ...] in the order of poses, each as get_inverse_kinematics returns it
+        """
+        return self._arm.get_inverse_kinematics_batch(poses, input_is_radian=input_is_radian, return_is_radian=return_is_radian)
+
     def get_forward_kinematics(self, angles, input_is_radian=None, return_is_radian=None):
         """
         Get forward kinematics
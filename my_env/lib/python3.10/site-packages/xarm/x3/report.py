@@ -3,7 +3,7 @@ from xarm.core.utils import convert
 
 class ReportHandler(object):
     def __init__(self, report_type):
-        self.buffer = b''
+        self.buffer = bytearray()
         self.report_size = 0
         self.report_type = report_type
         if self.report_type == 'devlop':
@@ -18,17 +18,23 @@ class ReportHandler(object):
         self.parse_dict = {}
 
     def reset(self):
-        self.buffer = b''
+        self.buffer.clear()
         self.report_size = 0
 
+    def _take(self, size):
+        # one copy out of the receive buffer; the consumed bytes are dropped in place
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
     def process_report_data(self, recv_data):
         if recv_data == -1:
             return
-        self.buffer += recv_data
+        self.buffer.extend(recv_data)
         if len(self.buffer) < 4:
             return
         if self.report_size == 0:
-            self.report_size = convert.bytes_to_u32(self.buffer[:4])
+            self.report_size = convert.bytes_to_u32(self.buffer)
         if len(self.buffer) < self.report_size:
             return
         if self.report_type == 'rich' and self.report_size == 233 and len(self.buffer) >= 245:
@@ -37,29 +43,24 @@ class ReportHandler(object):
                 if len(self.buffer) >= 249:
                     if convert.bytes_to_u32(self.buffer[245:249]) != self.report_size:
                         if convert.bytes_to_u32(self.buffer[233:237]) == self.report_size:
-                            data = self.buffer[:self.report_size]
-                            self.buffer = self.buffer[self.report_size:]
+                            data = self._take(self.report_size)
                         else:
                             self.reset()
                             # TODO reconnect
                             return -1
                     else:
-                        data = self.buffer[:245]
-                        self.buffer = self.buffer[245:]
+                        data = self._take(245)
                 else:
                     if convert.bytes_to_u32(self.buffer[233:237]) != self.report_size:
-                        data = self.buffer[:245]
-                        self.buffer = self.buffer[245:]
+                        data = self._take(245)
                     else:
-                        data = self.buffer[:self.report_size]
-                        self.buffer = self.buffer[self.report_size:]
+                        data = self._take(self.report_size)
             except:
                 self.reset()
                 # TODO reconnect
                 return -1
         else:
-            data = self.buffer[:self.report_size]
-            self.buffer = self.buffer[self.report_size:]
+            data = self._take(self.report_size)
         self.source_data = data
         if self.parse_handler:
             return self.parse_handler(data)
@@ -1044,6 +1044,26 @@ class XArm(Gripper, Servo, Record, RobotIQ, BaseBoard, Track, FtSensor, ModbusTc
                 angles = [math.degrees(angle) for angle in angles]
         return ret[0], angles
 
+    @xarm_is_connected(_type='get')
+    def get_inverse_kinematics_batch(self, poses, input_is_radian=None, return_is_radian=None):
+        input_is_radian = self._default_is_radian if input_is_radian is None else input_is_radian
+        return_is_radian = self._default_is_radian if return_is_radian is None else return_is_radian
+        tcp_poses = []
+        for pose in poses:
+            assert len(pose) >= 6
+            tcp_poses.append([to_radian(pose[i], input_is_radian or i <= 2) for i in range(6)])
+        results = []
+        for ret in self.arm_cmd.get_iks(tcp_poses):
+            angles = []
+            code = self._check_code(ret[0])
+            if code == 0:
+                angles = [ret[i] for i in range(1, 8)]
+                if not return_is_radian:
+                    angles = [math.degrees(angle) for angle in angles]
+            results.append((code, angles))
+        code = next((c for c, _ in results if c != 0), 0)
+        return code, results
+
     @xarm_is_connected(_type='get')
     def get_forward_kinematics(self, angles, input_is_radian=None, return_is_radian=None):
         input_is_radian = self._default_is_radian if input_is_radian is None else input_is_radian
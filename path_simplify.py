@@ -0,0 +1,217 @@
+"""
+path_simplify.py
+----------------
+Shortens recorded sequences without touching their contact phases.
+
+Contact steps are kept exactly as recorded: moves tagged "contact": true,
+slow moves (speed at or below PATH_SIMPLIFY["contact_speed"]), the last
+move before and the first move after a gripper, tool move, linear move or unknown
+step, and sleeps next to any of them. Everything else is free-space
+motion, where the passes below apply:
+
+- move delay    handle_move sleeps a recorded "delay" (the measured move
+                time) after the blocking move; it is dropped on free moves
+- free sleeps   a sleep between two free moves waits on an arm that has
+                already stopped (moves are blocking). It is only dropped
+                with PATH_SIMPLIFY["drop_free_space_sleeps"], which is off
+                by default: a taught dwell at a target reached at full
+                speed (a card held on the reader after a 75 tap move)
+                looks exactly like it. Tag such moves "contact": true
+                before enabling it.
+- sleeps        back-to-back sleeps become one sleep of the same total
+- duplicates    a move to the pose the arm already holds is dropped
+- collinear     set_servo_angle interpolates in joint space, so a free
+                waypoint on the straight joint-space line between its
+                neighbours (same speed on both legs) is dropped; the arm
+                follows the same path without stopping in the middle
+
+Every change is listed in a report alongside the before/after estimate of
+sequence_lint. Settings live in PATH_SIMPLIFY in config.py; with "at_load"
+enabled load_action_sequence() applies the pass to every recording.
+
+Usage:
+    python path_simplify.py Recorded_file/SYSTEM2/TAP/tap_system2_rack1.json [--out-dir compiled] [--report]
+"""
+
+import os
+import json
+from lazy_imports import lazy
+from config import PATH_SIMPLIFY
+from screen_flow import same_pose
+from sequence_lint import KNOWN_STEP_TYPES, lint_sequence, normalise
+
+np = lazy("numpy")
+
+CONTACT_NEIGHBOURS = {"gripper_open", "gripper_close", "tool_move", "linear_move"}
+STATIONARY_STEPS = {"sleep", "gripper_open", "gripper_close"}   # steps that leave the arm where it is
+
+
+def _protected_moves(steps, contact_speed):
+    """Indices of moves that belong to a contact phase"""
+    moves = [i for i, s in enumerate(steps) if s.get("type") == "move"]
+    protected = {i for i in moves if steps[i].get("contact") or steps[i].get("speed", 0) <= contact_speed}
+    for i, step in enumerate(steps):
+        if step.get("type") in CONTACT_NEIGHBOURS or step.get("type") not in KNOWN_STEP_TYPES:
+            before = [m for m in moves if m < i]
+            after = [m for m in moves if m > i]
+            if before:
+                protected.add(before[-1])
+            if after:
+                protected.add(after[0])
+    return protected
+
+
+def _neighbour(steps, i, direction):
+    """Index of the nearest non-sleep step from i in a direction, or None"""
+    j = i + direction
+    while 0 <= j < len(steps) and steps[j].get("type") == "sleep":
+        j += direction
+    return j if 0 <= j < len(steps) else None
+
+
+def _on_segment(a, b, c, tol):
+    """True if joint pose b lies on the joint-space segment a -> c within tol degrees"""
+    a, b, c = (np.asarray(x, dtype=float) for x in (a, b, c))
+    ac = c - a
+    length2 = float(ac @ ac)
+    if length2 < 1e-12:
+        return False
+    t = float((b - a) @ ac) / length2
+    if not 0.0 < t < 1.0:
+        return False
+    return float(np.linalg.norm(a + t * ac - b)) <= tol
+
+
+def simplify(steps, settings=None):
+    """
+    Return (simplified steps, list of changes). The input is not modified.
+    Each change is {"step": original 1-based index, "change": ..., "reason": ...}.
+    """
+    s = dict(PATH_SIMPLIFY, **(settings or {}))
+    steps = [dict(step) for step in steps]
+    protected = _protected_moves(steps, s["contact_speed"])
+    changes = []
+    keep = [True] * len(steps)
+
+    def drop(i, change, reason):
+        keep[i] = False
+        changes.append({"step": i + 1, "change": change, "reason": reason})
+
+    def free(i):
+        return i is not None and steps[i].get("type") == "move" and i not in protected
+
+    # Recorded move durations slept again after free moves
+    if s["strip_move_delay"]:
+        for i, step in enumerate(steps):
+            if free(i) and step.get("delay"):
+                changes.append({"step": i + 1, "change": "delay_removed",
+                                "reason": f"{step['delay']:.2f}s slept after a blocking free move"})
+                del step["delay"]
+
+    # Sleeps between two free moves
+    if s["drop_free_space_sleeps"]:
+        for i, step in enumerate(steps):
+            if step.get("type") == "sleep" and free(_neighbour(steps, i, -1)) and free(_neighbour(steps, i, 1)):
+                drop(i, "removed", f"{step.get('duration', 0)}s sleep between free moves")
+
+    # Back-to-back sleeps
+    last_sleep = None
+    for i, step in enumerate(steps):
+        if not keep[i]:
+            continue
+        if step.get("type") == "sleep":
+            if last_sleep is not None:
+                steps[last_sleep]["duration"] = steps[last_sleep].get("duration", 0) + step.get("duration", 0)
+                steps[last_sleep].pop("delay", None)
+                drop(i, "merged", f"sleep folded into step {last_sleep + 1}")
+            else:
+                last_sleep = i
+        else:
+            last_sleep = None
+
+    # Duplicate and collinear waypoints
+    last_move = None     # last move still in the sequence
+    stationary = True    # nothing kept since last_move has moved the arm
+    run = []             # kept moves with no other step between them
+    for i, step in enumerate(steps):
+        if not keep[i]:
+            continue
+        if step.get("type") != "move":
+            run = []
+            stationary = stationary and step.get("type") in STATIONARY_STEPS
+            continue
+        if last_move is not None and stationary and same_pose(steps[last_move], step, s["duplicate_tol"]):
+            drop(i, "removed", f"duplicate of step {last_move + 1}")
+            continue
+        if (len(run) >= 2 and free(run[-1]) and steps[run[-1]].get("speed") == step.get("speed")
+                and _on_segment(steps[run[-2]]["joints"], steps[run[-1]]["joints"], step["joints"], s["collinear_tol"])):
+            drop(run.pop(), "removed", "on the joint-space line between its neighbours")
+        run.append(i)
+        last_move = i
+        stationary = True
+
+    return [step for i, step in enumerate(steps) if keep[i]], changes
+
+
+def simplify_data(data, settings=None):
+    """
+    Simplify every segment of loaded recording data.
+    Returns (data in its own shape, report).
+    """
+    segments = normalise(data)
+    report = {"segments": {}}
+    simplified = {}
+    for name, steps in segments.items():
+        new_steps, changes = simplify(steps, settings)
+        _, before = lint_sequence(steps, name)
+        _, after = lint_sequence(new_steps, name)
+        simplified[name] = new_steps
+        report["segments"][name] = {
+            "steps": [len(steps), len(new_steps)],
+            "moves": [before["moves"], after["moves"]],
+            "estimated_s": [round(before["motion_s"] + before["dwell_s"], 2),
+                            round(after["motion_s"] + after["dwell_s"], 2)],
+            "changes": changes,
+        }
+
+    if isinstance(data, list):
+        out = simplified["sequence"]
+    elif "buttons" in data or "entry" in data:
+        out = dict(data, entry=simplified["entry"], exit=simplified["exit"],
+                   buttons={k: simplified[f"button:{k}"] for k in data.get("buttons", {})})
+    else:
+        out = dict(data, **simplified)
+    return out, report
+
+
+def simplify_file(path, settings=None):
+    """simplify_data() for a file on disk"""
+    with open(path, "r") as f:
+        out, report = simplify_data(json.load(f), settings)
+    report["file"] = path
+    return out, report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Remove redundant waypoints and sleeps from recorded sequences")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--out-dir", default="compiled", help="where simplified files are written")
+    parser.add_argument("--report", action="store_true", help="print every change")
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for path in args.files:
+        data, report = simplify_file(path)
+        out = os.path.join(args.out_dir, os.path.basename(path))
+        with open(out, "w") as f:
+            json.dump(data, f, indent=4)
+        for name, seg in report["segments"].items():
+            print(f"{path} [{name}]: steps {seg['steps'][0]} -> {seg['steps'][1]}, "
+                  f"moves {seg['moves'][0]} -> {seg['moves'][1]}, "
+                  f"est. {seg['estimated_s'][0]}s -> {seg['estimated_s'][1]}s")
+            if args.report:
+                for c in seg["changes"]:
+                    print(f"    step {c['step']:3d} {c['change']:14} {c['reason']}")
+        print(f"  -> {out}")
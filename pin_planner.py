@@ -0,0 +1,165 @@
+"""
+pin_planner.py
+--------------
+Keypad PIN speed profile.
+
+The PIN entry files store every key as its own approach - press - sleep -
+retract list, taught at conservative speeds. The planner keeps the taught
+geometry and only re-times it: each key's recorded hover pose (first move)
+and press pose (slowest later move, joint space, degrees) give its stroke,
+and one press segment per key is precomputed as hover, press, dwell, lift,
+with the hover pulled along the key's own stroke by the clearance setting.
+A PIN path is: entry, lateral hop between hover poses, press, ..., exit.
+Only the free moves (hop and lift) are sped up: the press keeps the
+recorded contact speed, every move keeps its recorded settle delay and the
+recorded dwell is kept unless PIN_PLANNER overrides it. Nothing about the
+keypad beyond the recorded key poses is learned, so the planner is off by
+default (PIN_PLANNER["enabled"]).
+Building a plan at request time is a list concatenation over precomputed
+segments. Keys without a hover / press pair play their recording.
+
+Run as a script to show the key strokes and print plans:
+    python pin_planner.py Recorded_file/SYSTEM2/PIN_ENTRY_SYSTEM2.json --pin 1234
+"""
+
+import os
+import json
+import logging
+import threading
+from config import SYSTEMS, PIN_PLANNER
+from screen_flow import join_segments, count_moves
+
+
+def _split_button(steps):
+    """Return the recorded (hover, press, lift) move steps and dwell seconds of a button, or None"""
+    moves = [s for s in steps if s.get("type") == "move"]
+    if len(moves) < 2:
+        return None
+    press = min(moves[1:], key=lambda s: s.get("speed", 0))
+    after = moves[moves.index(press) + 1:]
+    dwell = sum(s.get("duration", 0) for s in steps if s.get("type") == "sleep")
+    return moves[0], press, after[-1] if after else moves[0], dwell
+
+
+class KeypadModel:
+    """Per-key hover / press poses of a recorded keypad"""
+
+    def __init__(self, pin_steps, settings=None):
+        self.settings = dict(PIN_PLANNER, **(settings or {}))
+        self.entry = list(pin_steps.get("entry", []))
+        self.exit = list(pin_steps.get("exit", []))
+        self.recorded = pin_steps.get("buttons", {})
+
+        self.centres, self.strokes, self.recorded_dwell, self.recorded_moves = {}, {}, {}, {}
+        for key, steps in self.recorded.items():
+            parts = _split_button(steps)
+            if parts is None:
+                logging.warning(f"PIN planner: button '{key}' has no hover/press pair, using recording")
+                continue
+            hover, press, lift, dwell = parts
+            self.centres[key] = [float(p) for p in press["joints"]]
+            self.strokes[key] = [float(p) - float(h) for h, p in zip(hover["joints"], press["joints"])]
+            self.recorded_dwell[key] = dwell
+            self.recorded_moves[key] = (hover, press, lift)
+        self.segments = {k: self._press_segment(k) for k in self.centres}
+
+    def hover_pose(self, key):
+        """Hover above a key along its own stroke, scaled by the clearance setting"""
+        clearance = self.settings["clearance"]
+        return [c - clearance * d for c, d in zip(self.centres[key], self.strokes[key])]
+
+    def _press_segment(self, key):
+        s = self.settings
+        hover = self.hover_pose(key)
+        press = list(self.centres[key])
+        rec_hover, rec_press, rec_lift = self.recorded_moves[key]
+        dwell = s["dwell"] if s.get("dwell") is not None else self.recorded_dwell[key]
+        press_speed = s["press_speed"] if s.get("press_speed") is not None else rec_press.get("speed", 10)
+
+        def move(joints, speed, recorded):
+            step = {"type": "move", "joints": joints, "speed": speed}
+            if "delay" in recorded:
+                step["delay"] = recorded["delay"]
+            return step
+
+        segment = [
+            move(hover, s["hop_speed"], rec_hover),
+            move(press, press_speed, rec_press),
+        ]
+        if dwell:
+            segment.append({"type": "sleep", "duration": dwell})
+        segment.append(move(hover, s["retract_speed"], rec_lift))
+        return segment
+
+    def plan(self, pin_str):
+        """Full PIN path: entry, one press segment per key, exit"""
+        segments = [self.entry]
+        for ch in str(pin_str):
+            if ch in self.segments:
+                segments.append(self.segments[ch])
+            elif ch in self.recorded:
+                segments.append(self.recorded[ch])
+            else:
+                raise ValueError("Invalid PIN character")
+        segments.append(self.exit)
+        return join_segments(segments)
+
+    def describe(self):
+        """JSON-safe summary of the key strokes"""
+        return {
+            "keys": sorted(self.centres),
+            "stroke_deg": {k: round(max(abs(d) for d in v), 3) for k, v in self.strokes.items()},
+            "settings": self.settings,
+        }
+
+
+def load_pin_steps(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_keypad_model(system_id):
+    """
+    Keypad model for a system's PIN entry file, rebuilt when the file
+    changes. Returns None if the system has no PIN file.
+    """
+    pin_file = SYSTEMS.get(system_id, {}).get("devices", {}).get("pin_entry")
+    if not pin_file:
+        return None
+    mtime = os.path.getmtime(pin_file)
+    with _models_lock:
+        cached = _models.get(system_id)
+        if cached and cached[0] == (pin_file, mtime):
+            return cached[1]
+        model = KeypadModel(load_pin_steps(pin_file))
+        _models[system_id] = ((pin_file, mtime), model)
+        logging.info(f"PIN planner loaded keypad for system {system_id}: {len(model.segments)} keys")
+        return model
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the key strokes of a PIN entry file and plan PIN paths")
+    parser.add_argument("pin_file")
+    parser.add_argument("--pin", action="append", default=[], help="PIN to plan (repeatable)")
+    parser.add_argument("--out", help="write the planned sequences to this JSON file")
+    args = parser.parse_args()
+
+    steps = load_pin_steps(args.pin_file)
+    model = KeypadModel(steps)
+    print(json.dumps(model.describe(), indent=2))
+
+    planned = {}
+    for pin in args.pin:
+        seq = model.plan(pin)
+        recorded = join_segments([steps["entry"]] + [steps["buttons"][c] for c in pin] + [steps["exit"]])
+        print(f"PIN {pin}: {count_moves(seq)} moves planned, {count_moves(recorded)} recorded")
+        planned[pin] = seq
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(planned, f, indent=4)
@@ -0,0 +1,158 @@
+"""
+prepositioning.py
+-----------------
+Idle-time pre-positioning: while a system has nothing queued, park the arm
+part of the way towards the entry pose of the task it will most likely
+get next.
+
+Recorded actions start with a move to home and then travel from home to
+their first working pose (the entry), often a long way. IdlePolicy keeps
+the recent (action, rack, choice) history of each system. When the queue
+has been empty for PREPOSITION["idle_delay"] seconds, the arm ended its
+last task at home, and one task makes up at least PREPOSITION["min_share"]
+of the history, the worker stages the arm PREPOSITION["fraction"] of the
+way along the joint-space line from home to that task's entry.
+
+The staging pose lies on the path the predicted task's own first move
+takes, and returning home takes the same line backwards, so staging never
+enters space the recorded sequences do not already sweep:
+
+- the predicted task arrives: its home move is dropped and the arm
+  continues from wherever it is on the line to the entry
+- any other task arrives: the arm goes back home first, then runs the task
+  as recorded
+
+The staging move is issued without waiting (Stager, on the arm's side), so
+a task that arrives mid-move stops it at once (set_state(4)) and does not
+wait for it. On shutdown a staged arm is sent back home before it is
+disconnected. Staging also reserves its volume in the shared workspace
+(workspace.py), and is skipped when another arm holds that space.
+"""
+
+import time
+import logging
+import threading
+from collections import Counter, deque
+from config import PREPOSITION
+from checkpoints import MotionError
+from screen_flow import same_pose
+from warm_start import steps_of
+
+_stagers = {}
+_stagers_lock = threading.Lock()
+
+
+def task_key(meta):
+    return meta.get("action"), meta.get("rack"), meta.get("choice")
+
+
+class IdlePolicy:
+    """Request history of one system and the staging decision (worker side)"""
+
+    def __init__(self):
+        self.history = deque(maxlen=PREPOSITION["history"])
+        self.sequences = {}   # {task key: its last full sequence}
+        self.home = None      # joints the arm ended the last task at, None if unknown
+        self.staged = None    # (home joints, entry joints) while the arm is staged
+
+    def record(self, meta, planned, executed, completed):
+        """
+        Note a finished task: `planned` is its full sequence, `executed` what
+        actually ran (warm start or staging may have dropped the home moves).
+        The arm is at the last executed move only after a completed run.
+        """
+        self.staged = None
+        planned = steps_of(planned) if planned else None
+        executed = steps_of(executed) if executed else None
+        if not completed or not isinstance(planned, list) or not planned or not executed:
+            self.home = None
+            return
+        self.history.append(task_key(meta))
+        self.sequences[task_key(meta)] = planned
+        last = executed[-1]
+        self.home = last["joints"][:6] if last.get("type") == "move" else None
+
+    def candidate(self):
+        """(home joints, entry joints) of the likely next task, or None"""
+        if not PREPOSITION["enabled"] or self.home is None or self.staged or not self.history:
+            return None
+        key, count = Counter(self.history).most_common(1)[0]
+        if count < PREPOSITION["min_share"] * len(self.history):
+            return None
+        steps = self.sequences.get(key) or []
+        if len(steps) < 2 or steps[1].get("type") != "move":
+            return None
+        if not same_pose(steps[0], {"type": "move", "joints": self.home}):
+            return None
+        return self.home, steps[1]["joints"][:6]
+
+    def matches(self, sequence):
+        """True if a task starts home -> the entry the arm is staged towards"""
+        steps = steps_of(sequence) if sequence else None
+        if not self.staged or not isinstance(steps, list) or len(steps) < 2:
+            return False
+        home, entry = self.staged
+        return (same_pose(steps[0], {"type": "move", "joints": home})
+                and same_pose(steps[1], {"type": "move", "joints": entry}))
+
+
+def staging_pose(home, entry, fraction=None):
+    fraction = PREPOSITION["fraction"] if fraction is None else fraction
+    return [h + (e - h) * fraction for h, e in zip(home, entry)]
+
+
+class Stager:
+    """Issues and cancels the staging move of one arm (arm side)"""
+
+    def __init__(self, arm):
+        self.arm = arm
+        self.home = None   # joints to return to, while staged
+
+    def stage(self, system_id, home, entry):
+        """Start the staging move without waiting; False if it was not started"""
+        from workspace import guard_for, WorkspaceTimeout
+
+        step = {"type": "move", "joints": staging_pose(home, entry), "speed": PREPOSITION["speed"]}
+        guard = guard_for(system_id, self.arm)
+        if guard:
+            try:
+                guard.before(step, timeout=0)
+            except WorkspaceTimeout:
+                logging.info(f"System {system_id} not pre-positioning: the space is reserved by another arm")
+                return False
+        code = self.arm.set_servo_angle(angle=step["joints"], speed=step["speed"], wait=False)
+        if code != 0:
+            logging.warning(f"System {system_id} pre-positioning move refused (code {code})")
+            return False
+        self.home = list(home)
+        logging.info(f"System {system_id} pre-positioning towards the next likely entry pose")
+        return True
+
+    def settle(self, keep):
+        """
+        Before a task: stop a staging move that is still running and, unless
+        the task continues from the staging line (`keep`), go back home.
+        Raises MotionError if the arm does not get home.
+        """
+        if self.home is None:
+            return
+        home, self.home = self.home, None
+        if self.arm.get_is_moving():
+            self.arm.set_state(state=4)   # stop and drop the queued motion
+            deadline = time.time() + 1.0
+            while self.arm.get_is_moving() and time.time() < deadline:
+                time.sleep(0.01)
+            self.arm.set_state(state=0)
+        if not keep:
+            code = self.arm.set_servo_angle(angle=home, speed=PREPOSITION["speed"], wait=True)
+            if code != 0:
+                raise MotionError("set_servo_angle", code, self.arm.error_code)
+
+
+def get_stager(arm):
+    """Shared stager per arm connection"""
+    with _stagers_lock:
+        stager = _stagers.get(id(arm))
+        if stager is None or stager.arm is not arm:
+            stager = _stagers[id(arm)] = Stager(arm)
+        return stager
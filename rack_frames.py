@@ -0,0 +1,264 @@
+"""
+rack_frames.py
+--------------
+Rack-relative action templates.
+
+An action is taught once, on a reference rack, as a teach spec whose
+rack-dependent steps (the card pickup and return) carry "rack": true.
+Every other rack of the system is described by a rigid calibration
+transform relative to the reference rack, kept in RACK_CALIBRATION_FILE:
+
+    {
+        "1": {
+            "reference_rack": 1,
+            "racks": {
+                "1": {"translation": [0, 0, 0], "rpy": [0, 0, 0]},
+                "2": {"translation": [-0.65, 47.35, -1.25], "rpy": [0, 0, 0], "rms_mm": 1.2}
+            }
+        }
+    }
+
+Sequences for all racks are generated from the one template: the rack
+poses of every rack are transformed in a single vectorised step, then
+solved through kinematics.IKSolver. A rack whose poses have no IK solution
+or leave the joint limits is reported as unreachable instead of producing
+a sequence, and so is a rack whose fit residual ("rms_mm") is above
+FIT_MAX_RMS_MM: the racks are then not rigid copies of each other and the
+rack has to be recorded.
+
+The template used for an action is configured per system in
+SYSTEMS[sid]["templates"]; load_action_sequence() falls back to it for
+racks without a recorded file. Only enable a template once every rack it
+serves has been fitted within FIT_MAX_RMS_MM. At runtime only the IK cache is used, so
+run `generate` once after teaching or recalibrating.
+
+Usage:
+    python rack_frames.py fit teach_specs/insert_system2_rack1_down.json teach_specs/insert_system2_rack2_down.json --rack 2
+    python rack_frames.py generate teach_specs/insert_system2_rack1_down.json [--racks 1 2] [--offline]
+"""
+
+import os
+import json
+import copy
+import logging
+import threading
+from lazy_imports import lazy
+from config import SYSTEMS, RACK_CALIBRATION_FILE
+from kinematics import IKSolver, IKError, rpy_to_matrix, matrix_to_rpy, fit_rigid_transform
+from teach_compiler import load_spec, compile_spec, COMPILED_DIR, IK_CACHE_DIR
+
+np = lazy("numpy")
+
+FIT_MAX_RMS_MM = 2.0   # a rigid transform must explain a rack to within this to be generated
+
+
+def load_calibration(path=RACK_CALIBRATION_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_calibration(calibration, path=RACK_CALIBRATION_FILE):
+    with open(path, "w") as f:
+        json.dump(calibration, f, indent=2, sort_keys=True)
+
+
+def rack_transform(calibration, system, rack):
+    """(R, t) of a rack relative to the system's reference rack"""
+    system_cal = calibration.get(str(system), {})
+    if str(rack) == str(system_cal.get("reference_rack")):
+        return np.eye(3), np.zeros(3)
+    entry = system_cal.get("racks", {}).get(str(rack))
+    if entry is None:
+        raise KeyError(f"Rack {rack} is not calibrated for system {system}")
+    if entry.get("rms_mm", 0.0) > FIT_MAX_RMS_MM:
+        raise KeyError(f"Rack {rack} fit residual {entry['rms_mm']} mm is above {FIT_MAX_RMS_MM} mm, "
+                       f"record the rack instead of generating it")
+    return rpy_to_matrix(entry.get("rpy", [0, 0, 0]))[0], np.asarray(entry["translation"], dtype=float)
+
+
+def _rack_steps(spec):
+    """Indices, keys and poses of the template's rack-relative steps"""
+    waypoints = spec.get("waypoints", {})
+    indices, keys, poses = [], [], []
+    for i, step in enumerate(spec["steps"]):
+        if not step.get("rack"):
+            continue
+        key = "pose" if "pose" in step else "linear" if "linear" in step else None
+        if key is None:
+            continue
+        target = step[key]
+        indices.append(i)
+        keys.append(key)
+        poses.append(waypoints[target] if isinstance(target, str) else target)
+    return indices, keys, np.asarray(poses, dtype=float).reshape(-1, 6)
+
+
+def transform_racks(poses, transforms):
+    """
+    Transform (N, 6) template poses into every rack at once.
+    `transforms` is a list of (R, t); returns an (len(transforms), N, 6) array.
+    """
+    rotations = np.stack([r for r, _ in transforms])                  # (K, 3, 3)
+    translations = np.stack([t for _, t in transforms])               # (K, 3)
+    positions = np.einsum("kij,nj->kni", rotations, poses[:, :3]) + translations[:, None, :]
+    tool = rpy_to_matrix(poses[:, 3:6])                                # (N, 3, 3)
+    orientations = matrix_to_rpy(np.einsum("kij,njl->knil", rotations, tool)).reshape(len(transforms), -1, 3)
+    return np.concatenate([positions, orientations], axis=-1)
+
+
+def generate(spec, system, racks, solver, calibration=None):
+    """
+    Build the playback steps of a template for several racks.
+    Returns {rack: {"steps": [...]}} or {rack: {"error": "..."}} per rack.
+    """
+    calibration = load_calibration() if calibration is None else calibration
+    indices, keys, poses = _rack_steps(spec)
+    results, transforms, valid = {}, [], []
+    for rack in racks:
+        try:
+            transforms.append(rack_transform(calibration, system, rack))
+            valid.append(rack)
+        except KeyError as e:
+            results[rack] = {"error": e.args[0]}
+    if not valid:
+        return results
+
+    rack_poses = transform_racks(poses, transforms) if indices else None
+    for k, rack in enumerate(valid):
+        rack_spec = copy.deepcopy(spec)
+        for j, (i, key) in enumerate(zip(indices, keys)):
+            step = rack_spec["steps"][i]
+            step[key] = [round(float(v), 3) for v in rack_poses[k, j]]
+            step.pop("rack")
+        try:
+            results[rack] = {"steps": compile_spec(rack_spec, solver)}
+        except (IKError, ValueError) as e:
+            results[rack] = {"error": f"unreachable: {e}"}
+    return results
+
+
+def fit_rack(template, other):
+    """
+    Fit the transform from the template's rack to the rack of another
+    recording of the same action. Both specs must have the same step
+    layout; pose steps that differ are the rack-dependent ones.
+    Returns (rack step indices, R, t, rms residual in mm).
+    """
+    if len(template["steps"]) != len(other["steps"]):
+        raise ValueError("Specs have different step layouts, record both racks with the same script")
+    indices, src, dst = [], [], []
+    for i, (a, b) in enumerate(zip(template["steps"], other["steps"])):
+        key = "pose" if "pose" in a else "linear" if "linear" in a else None
+        if key is None or key not in b:
+            continue
+        if not np.allclose(a[key], b[key], atol=1e-6):
+            indices.append(i)
+            src.append(a[key][:3])
+            dst.append(b[key][:3])
+    if not indices:
+        raise ValueError("Specs are identical, nothing to fit")
+    # Repeated visits to the same pickup pose add no information
+    pairs = {tuple(s): d for s, d in zip(src, dst)}
+    rotation, translation, rms = fit_rigid_transform(list(pairs), list(pairs.values()))
+    return indices, rotation, translation, rms
+
+
+_sequences = {}
+_sequences_lock = threading.Lock()
+
+
+def get_rack_sequence(system_id, action, rack):
+    """
+    Sequence of an action template for a rack, generated in memory from the
+    IK cache and reused until the template or calibration file changes.
+    Raises KeyError with a readable message when it cannot be produced.
+    """
+    template = SYSTEMS.get(system_id, {}).get("templates", {}).get(action)
+    if not template:
+        raise KeyError(f"Action '{action}' not available for system {system_id}")
+    stamp = tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in (template, RACK_CALIBRATION_FILE))
+    key = (system_id, action, rack)
+    with _sequences_lock:
+        cached = _sequences.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        solver = IKSolver(cache_file=os.path.join(IK_CACHE_DIR, f"system{system_id}.json"))
+        result = generate(load_spec(template), system_id, [rack], solver)[rack]
+        if "error" in result:
+            raise KeyError(f"Rack {rack} not available for action '{action}' in system {system_id}: "
+                           f"{result['error']}")
+        _sequences[key] = (stamp, result["steps"])
+        logging.info(f"Generated '{action}' for system {system_id} rack {rack} from {template}")
+        return result["steps"]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [RACK] %(message)s")
+    parser = argparse.ArgumentParser(description="Calibrate rack frames and generate per-rack sequences")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_fit = sub.add_parser("fit", help="fit a rack transform from two recordings of one action")
+    p_fit.add_argument("template", help="teach spec recorded on the reference rack")
+    p_fit.add_argument("other", help="teach spec of the same action recorded on another rack")
+    p_fit.add_argument("--rack", type=int, required=True, help="rack number of the other recording")
+    p_fit.add_argument("--reference-rack", type=int, default=1)
+
+    p_gen = sub.add_parser("generate", help="generate playback JSON for every calibrated rack")
+    p_gen.add_argument("template")
+    p_gen.add_argument("--racks", nargs="+", type=int, help="default: all calibrated racks")
+    p_gen.add_argument("--offline", action="store_true", help="fail on IK cache misses instead of connecting")
+    p_gen.add_argument("--out-dir", default=COMPILED_DIR)
+
+    args = parser.parse_args()
+    calibration = load_calibration()
+
+    if args.command == "fit":
+        template, other = load_spec(args.template), load_spec(args.other)
+        system = template.get("system")
+        indices, rotation, translation, rms = fit_rack(template, other)
+        system_cal = calibration.setdefault(str(system), {"reference_rack": args.reference_rack, "racks": {}})
+        system_cal["racks"][str(args.reference_rack)] = {"translation": [0, 0, 0], "rpy": [0, 0, 0]}
+        system_cal["racks"][str(args.rack)] = {
+            "translation": [round(float(v), 3) for v in translation],
+            "rpy": [round(float(v), 4) + 0.0 for v in matrix_to_rpy(rotation)[0]],
+            "rms_mm": round(rms, 2),
+        }
+        save_calibration(calibration)
+        # Mark the rack-dependent steps in the template
+        for i in indices:
+            template["steps"][i]["rack"] = True
+        with open(args.template, "w") as f:
+            json.dump(template, f, indent=2)
+        print(f"System {system} rack {args.rack}: {system_cal['racks'][str(args.rack)]}, "
+              f"{len(indices)} rack steps marked in {args.template}")
+        if rms > FIT_MAX_RMS_MM:
+            logging.warning(f"Rack {args.rack} fit residual {rms:.2f} mm: the racks are not a rigid copy, "
+                            f"the rack will not be generated until it is refitted within {FIT_MAX_RMS_MM} mm")
+    else:
+        spec = load_spec(args.template)
+        system = spec.get("system")
+        racks = args.racks or sorted(int(r) for r in calibration.get(str(system), {}).get("racks", {}))
+        arm_ip = None if args.offline else SYSTEMS.get(system, {}).get("arm_ip")
+        os.makedirs(IK_CACHE_DIR, exist_ok=True)
+        solver = IKSolver(arm_ip=arm_ip, cache_file=os.path.join(IK_CACHE_DIR, f"system{system}.json"))
+        action = spec.get("name", "action").split("_")[0]
+        os.makedirs(args.out_dir, exist_ok=True)
+        failed = 0
+        try:
+            for rack, result in generate(spec, system, racks, solver, calibration).items():
+                if "error" in result:
+                    failed += 1
+                    logging.error(f"Rack {rack}: {result['error']}")
+                    continue
+                name = f"{action}_system{system}_rack{rack}"
+                out = os.path.join(args.out_dir, f"{name}.json")
+                with open(out, "w") as f:
+                    json.dump({name: result["steps"]}, f, indent=4)
+                print(f"Rack {rack} -> {out} ({len(result['steps'])} steps)")
+        finally:
+            solver.close()
+        raise SystemExit(1 if failed else 0)
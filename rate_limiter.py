@@ -0,0 +1,114 @@
+"""
+rate_limiter.py
+---------------
+Token-bucket rate limiting per (client, system, endpoint).
+
+Buckets live in a fixed number of shards, each with its own lock and an
+LRU-ordered dict, so admission never contends with arm status updates and
+the cost per request stays flat as the client population grows.
+A bucket that has been idle long enough to refill completely is identical
+to a fresh one, so it is evicted (TTL); each shard is also capped at
+`max_entries_per_shard` to bound memory.
+
+Limits are configured per endpoint as {"capacity": N, "per_seconds": T}
+(N requests per T seconds, bursts up to N). Per-system overrides come from
+SYSTEMS[system]["rate_limits"][endpoint] in config.py. Every limit is
+checked when the limiter is created: capacity must be at least 1 (a bucket
+that can never hold a whole token would refuse every request) and
+per_seconds positive; a bad limit raises ValueError at startup.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from config import SYSTEMS
+
+
+def _check_limit(cfg, where):
+    """Raise ValueError unless cfg is a usable {"capacity", "per_seconds"} limit"""
+    try:
+        capacity, per_seconds = float(cfg.get("capacity", 1)), float(cfg["per_seconds"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise ValueError(f"Rate limit {where}: needs a numeric capacity and per_seconds, got {cfg!r}")
+    if capacity < 1:
+        raise ValueError(f"Rate limit {where}: capacity must be at least 1, got {capacity:g}")
+    if per_seconds <= 0:
+        raise ValueError(f"Rate limit {where}: per_seconds must be positive, got {per_seconds:g}")
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()   # {key: [tokens, last_ts, expires_at]}
+
+
+class TokenBucketLimiter:
+    """
+    Sharded token-bucket limiter with TTL eviction and a bounded footprint.
+    `default_limits` maps endpoint name -> {"capacity", "per_seconds"};
+    endpoints without a configured limit are not rate limited.
+    """
+
+    def __init__(self, default_limits, shards=16, max_entries_per_shard=4096):
+        for endpoint, cfg in default_limits.items():
+            if cfg:
+                _check_limit(cfg, f"'{endpoint}'")
+        for system, system_cfg in SYSTEMS.items():
+            for endpoint, cfg in system_cfg.get("rate_limits", {}).items():
+                if cfg:
+                    _check_limit(cfg, f"'{endpoint}' of system {system}")
+        self.default_limits = default_limits
+        self.max_entries_per_shard = max_entries_per_shard
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def limit_for(self, system, endpoint):
+        """Return (capacity, refill_rate) for an endpoint, or None if unlimited"""
+        overrides = SYSTEMS.get(system, {}).get("rate_limits", {})
+        cfg = overrides.get(endpoint, self.default_limits.get(endpoint))
+        if not cfg:
+            return None
+        capacity = float(cfg.get("capacity", 1))
+        return capacity, capacity / float(cfg["per_seconds"])
+
+    def allow(self, client, system, endpoint, now=None):
+        """
+        Take one token for (client, system, endpoint).
+        Returns (allowed, retry_after_seconds).
+        """
+        limit = self.limit_for(system, endpoint)
+        if limit is None:
+            return True, 0.0
+        capacity, rate = limit
+        now = time.monotonic() if now is None else now
+        key = (client, system, endpoint)
+        shard = self._shards[hash(key) % len(self._shards)]
+
+        with shard.lock:
+            buckets = shard.buckets
+            # Evict expired buckets from the LRU end
+            while buckets:
+                oldest_key, oldest = next(iter(buckets.items()))
+                if oldest[2] > now and len(buckets) <= self.max_entries_per_shard:
+                    break
+                buckets.popitem(last=False)
+
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [capacity, now, now]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+            if tokens < 1.0:
+                bucket[0], bucket[1] = tokens, now
+                buckets.move_to_end(key)
+                return False, (1.0 - tokens) / rate
+
+            tokens -= 1.0
+            # Idle time after which the bucket is full again, i.e. a fresh one
+            expires_at = now + (capacity - tokens) / rate
+            buckets[key] = [tokens, now, expires_at]
+            buckets.move_to_end(key)
+            return True, 0.0
+
+    def size(self):
+        """Number of tracked buckets across all shards"""
+        return sum(len(s.buckets) for s in self._shards)
@@ -0,0 +1,240 @@
+"""
+replay.py
+---------
+Offline replay of task journals (task_journal.py).
+
+Two modes, both much faster than real time:
+
+    timing    recorded task and step durations per action and step type,
+              and the error of the sequence_lint estimate against them
+    simulate  every journaled sequence is run through the real engine
+              (armsideclient.run_sequence, gripper handling included) on a
+              simulated arm with a virtual clock; the simulated cycle time
+              is compared with the recorded one (tasks without an end
+              record, still running or cut off, are only counted). --simplify runs the
+              path_simplify pass first, to benchmark engine changes
+              against the recorded traffic mix.
+
+Usage:
+    python replay.py timing journal/system2-2026-10-19.jsonl
+    python replay.py simulate journal/*.jsonl [--simplify] [--json]
+"""
+
+import json
+import time
+import statistics
+from contextlib import contextmanager
+from sequence_lint import JOINT_ACCEL_DEG_S2, TOOL_ACCEL_MM_S2, lint_sequence, move_time
+
+
+def load_journal(paths):
+    """Tasks of one or more journal files, in start order"""
+    sequences, tasks = {}, {}
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                kind = record["t"]
+                if kind == "sequence":
+                    sequences[record["hash"]] = record["steps"]
+                elif kind == "task":
+                    tasks[record["job"]] = dict(record, executed=[], end=None)
+                elif kind in ("step", "end") and record["job"] in tasks:
+                    if kind == "step":
+                        tasks[record["job"]]["executed"].append(record)
+                    else:
+                        tasks[record["job"]]["end"] = record
+    for task in tasks.values():
+        task["steps"] = sequences.get(task.get("hash"))
+    return sorted(tasks.values(), key=lambda t: t["ts"])
+
+
+def _stats(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        "n": len(values),
+        "mean": round(statistics.mean(values), 3),
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def timing_report(tasks):
+    """Recorded durations per action and per step type, plus estimate error"""
+    by_action, by_step, estimate_error = {}, {}, []
+    for task in tasks:
+        end = task["end"]
+        if end is None or end["status"] != "completed":
+            continue
+        action = task["request"].get("action") or task["request"].get("choice") or "pin_only"
+        by_action.setdefault(action, []).append(end["elapsed"])
+        for step in task["executed"]:
+            if step["ok"]:
+                by_step.setdefault(step["type"], []).append(step["dur"])
+        if task["steps"]:
+            _, est = lint_sequence(task["steps"])
+            estimate_error.append(est["motion_s"] + est["dwell_s"] - end["elapsed"])
+    return {
+        "tasks": len(tasks),
+        "failed": sum(1 for t in tasks if t["end"] and t["end"]["status"] == "failed"),
+        "unfinished": sum(1 for t in tasks if t["end"] is None),
+        "actions": {a: _stats(v) for a, v in by_action.items()},
+        "step_types": {s: _stats(v) for s, v in by_step.items()},
+        "estimate_error_s": _stats(estimate_error),
+    }
+
+
+class VirtualClock:
+    """Stands in for the time module: sleeping advances the clock instantly"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def strftime(self, fmt, *args):
+        return time.strftime(fmt, *args)
+
+
+class SimulatedArm:
+    """Arm model for replay: moves take their trapezoidal-profile time on the virtual clock"""
+
+    def __init__(self, clock, joints=None):
+        self.clock = clock
+        self.angles = list(joints or [0.0] * 6)
+        self.tcp = None   # flange position after a linear move, None = from the angles
+        self.outputs = [0, 0, 0, 0, 0]
+        self.commands = 0
+
+    def set_servo_angle(self, angle=None, speed=None, is_radian=False, wait=True, **kwargs):
+        self.commands += 1
+        delta = max(abs(a - b) for a, b in zip(angle, self.angles))
+        self.clock.sleep(move_time(delta, speed or 20, JOINT_ACCEL_DEG_S2))
+        self.angles = list(angle)
+        self.tcp = None
+        return 0
+
+    def set_position(self, x=0, y=0, z=0, speed=20, wait=True, **kwargs):
+        from kinematics import link_points
+        self.commands += 1
+        start = self.tcp if self.tcp is not None else link_points(self.angles)[0][-1]
+        distance = sum((a - b) ** 2 for a, b in zip((x, y, z), start)) ** 0.5
+        self.clock.sleep(move_time(distance, speed, TOOL_ACCEL_MM_S2))
+        self.tcp = (x, y, z)
+        return 0
+
+    def set_tool_position(self, x=0, y=0, z=0, speed=20, wait=True, **kwargs):
+        self.commands += 1
+        self.clock.sleep(move_time((x * x + y * y + z * z) ** 0.5, speed, TOOL_ACCEL_MM_S2))
+        return 0
+
+    def open_lite6_gripper(self, sync=True):
+        self.commands += 1
+        self.outputs[:2] = [1, 0]
+        return 0
+
+    def close_lite6_gripper(self, sync=True):
+        self.commands += 1
+        self.outputs[:2] = [0, 1]
+        return 0
+
+    def stop_lite6_gripper(self, sync=True):
+        self.outputs[:2] = [0, 0]
+        return 0
+
+    def get_tgpio_output_digital(self, ionum=None):
+        return 0, list(self.outputs)
+
+    def get_tgpio_digital(self, ionum=None):
+        return 0, 0
+
+
+@contextmanager
+def virtual_time(clock):
+    """Point the engine modules' time at a virtual clock while replaying"""
+    import armsideclient
+    import gripper_control
+    modules = (armsideclient, gripper_control)
+    saved = [m.time for m in modules]
+    for m in modules:
+        m.time = clock
+    try:
+        yield
+    finally:
+        for m, t in zip(modules, saved):
+            m.time = t
+
+
+def simulate(tasks, simplify=False):
+    """
+    Run every journaled sequence of a finished task on a simulated arm;
+    returns per-task results. Unfinished tasks have no recorded time to
+    compare with and are skipped.
+    """
+    from armsideclient import run_sequence
+    from path_simplify import simplify as simplify_steps
+
+    results = []
+    clock = VirtualClock()
+    with virtual_time(clock):
+        for task in tasks:
+            steps = task["steps"]
+            if not steps or task["end"] is None:
+                continue
+            if simplify:
+                steps, _ = simplify_steps(steps)
+            first = next((s["joints"] for s in steps if s.get("type") == "move"), None)
+            arm = SimulatedArm(clock, first)
+            start = clock.now
+            run_sequence(arm, steps)
+            end = task["end"]
+            results.append({
+                "job": task["job"],
+                "action": task["request"].get("action") or task["request"].get("choice"),
+                "recorded_s": end.get("elapsed"),
+                "simulated_s": round(clock.now - start, 3),
+                "commands": arm.commands,
+            })
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay task journals for timing analysis or simulation")
+    parser.add_argument("mode", choices=["timing", "simulate"])
+    parser.add_argument("journals", nargs="+")
+    parser.add_argument("--simplify", action="store_true", help="apply path_simplify before simulating")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    tasks = load_journal(args.journals)
+    wall = time.time()
+    if args.mode == "timing":
+        report = timing_report(tasks)
+        print(json.dumps(report, indent=2))
+    else:
+        results = simulate(tasks, args.simplify)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            for r in results:
+                print(f"{r['job'][:8]} {str(r['action']):12} recorded {r['recorded_s']}s "
+                      f"simulated {r['simulated_s']}s ({r['commands']} commands)")
+        recorded = sum(r["recorded_s"] or 0 for r in results)
+        simulated = sum(r["simulated_s"] for r in results)
+        unfinished = sum(1 for t in tasks if t["steps"] and t["end"] is None)
+        print(f"{len(results)} tasks: recorded {recorded:.1f}s, simulated {simulated:.1f}s, "
+              f"replayed in {time.time() - wall:.2f}s ({unfinished} unfinished tasks skipped)")
@@ -7,27 +7,15 @@ import threading
 from PIL import Image
 import treepoem
 from pydantic import BaseModel
-from xarm.wrapper import XArmAPI
 from config import SYSTEMS, RECORDED_ACTION_FILE, PIN_STEP_FILE
+from startup import StartupOrchestrator
 
 # === Logger ===
 logging.basicConfig(filename='robot_server.log', level=logging.INFO, format='%(asctime)s [API] %(message)s')
 
-# === Init Arms ===
-ARMS = {}
-for sys_id, cfg in SYSTEMS.items():
-    try:
-        arm = XArmAPI(cfg["arm_ip"])
-        arm.connect()
-        arm.clean_error()
-        arm.clean_warn()
-        arm.motion_enable(enable=True)
-        arm.set_mode(0)
-        arm.set_state(0)
-        ARMS[sys_id] = arm
-        logging.info(f"System {sys_id} connected to arm at {cfg['arm_ip']}")
-    except Exception as e:
-        logging.error(f"Failed to connect to arm {sys_id} at {cfg['arm_ip']}: {e}")
+# === Init Arms and devices (in the background, see startup.py) ===
+startup = StartupOrchestrator().start()
+ARMS = startup.arms
 
 # === Load Sequences ===
 with open(RECORDED_ACTION_FILE, "r") as f:
@@ -196,8 +184,10 @@ def payment_action():
     action = data.get("action", "").lower()
     pin = data.get("pin")
 
-    if system not in ARMS:
+    if system not in SYSTEMS:
         return jsonify({"status": "error", "message": "Invalid system"}), 400
+    if system not in ARMS:
+        return jsonify({"status": "error", "message": f"System {system} is {startup.system_state(system)}"}), 503
 
     key = f"{action}_system{system}_rack{rack}"
     if key not in RECORDED:
@@ -255,7 +245,7 @@ def generate_barcode():
 # === Health Check ===
 @app.route("/healthcheck", methods=["GET"])
 def health():
-    return jsonify({"status": "ok", "systems": list(SYSTEMS.keys())})
+    return jsonify({"status": "ok", "systems": startup.status()})
 
 # === Arm Status Endpoint ===
 @app.route("/arm-status", methods=["GET"])
@@ -263,8 +253,10 @@ def arm_status():
     data = request.get_json()
     system = data.get("system_number")
 
-    if system not in ARMS:
+    if system not in SYSTEMS:
         return jsonify({'status': 'error', 'message': 'Invalid system'}), 400
+    if system not in ARMS:
+        return jsonify({'status': 'error', 'message': f'System {system} is {startup.system_state(system)}'}), 503
     
     arm = ARMS[system]
     try:
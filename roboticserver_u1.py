@@ -16,7 +16,6 @@ import numpy as np
 
 from logging.handlers import RotatingFileHandler
 
-from xarm.wrapper import XArmAPI
 from PIL import Image
 import treepoem
 import serial
@@ -26,6 +25,7 @@ from config import (
     PIN_STEP_FILE,
     
 )
+from startup import StartupOrchestrator
 
 
 # === Logger ===
@@ -48,22 +48,10 @@ logging.basicConfig(
 
 
  
-# === Init Robot ===
+# === Init Robot (arms, serial devices and cameras in the background, see startup.py) ===
  
-ARMS = {}
-for sys_id, cfg in SYSTEMS.items():
-    try:
-        arm = XArmAPI(cfg["arm_ip"])
-        arm.connect()
-        arm.clean_error()
-        arm.clean_warn()
-        arm.motion_enable(enable=True)
-        arm.set_mode(0)
-        arm.set_state(0)
-        ARMS[sys_id] = arm
-        logging.info(f"System {sys_id} connected to arm at {cfg['arm_ip']}")
-    except Exception as e:
-        logging.error(f"Failed to connect to arm {sys_id} at {cfg['arm_ip']}: {e}")
+startup = StartupOrchestrator().start()
+ARMS = startup.arms
 
 # === Load Sequences ===
 with open(RECORDED_ACTION_FILE, "r") as f:
@@ -94,7 +82,7 @@ button_alias = {
  
 # === Helper: Execute Steps ===
  
-def run_sequence(seq):
+def run_sequence(arm, seq):
  
     for step in seq:
  
@@ -330,9 +318,9 @@ class SerialCommunication:
 
 # === PIN Entry ===
  
-def run_pin_sequence(pin_str):
+def run_pin_sequence(arm, pin_str):
  
-    run_sequence(PIN_STEPS["entry"])
+    run_sequence(arm, PIN_STEPS["entry"])
  
     for ch in pin_str:
  
@@ -342,9 +330,9 @@ def run_pin_sequence(pin_str):
  
             return f"Invalid character: {ch}", False
  
-        run_sequence(PIN_STEPS["buttons"][key])
+        run_sequence(arm, PIN_STEPS["buttons"][key])
  
-    run_sequence(PIN_STEPS["exit"])
+    run_sequence(arm, PIN_STEPS["exit"])
  
     return "PIN sequence completed", True
  
@@ -384,6 +372,14 @@ def unified_action():
  
         return jsonify({"status": "error", "message": "Missing system/rack/action"}), 400
 
+    if system not in SYSTEMS:
+ 
+        return jsonify({"status": "error", "message": "Invalid system"}), 400
+
+    if system not in ARMS:
+ 
+        return jsonify({"status": "error", "message": f"System {system} is {startup.system_state(system)}"}), 503
+
     key = f"{action}_system{system}_rack{rack}"
 
     if key not in RECORDED:
@@ -394,7 +390,7 @@ def unified_action():
  
         logging.info(f"Executing action: {key}")
  
-        run_sequence(RECORDED[key])
+        run_sequence(ARMS[system], RECORDED[key])
  
     except Exception as e:
  
@@ -406,7 +402,7 @@ def unified_action():
  
         logging.info(f"Executing PIN sequence: {pin}")
  
-        msg, ok = run_pin_sequence(pin)
+        msg, ok = run_pin_sequence(ARMS[system], pin)
  
         if not ok:
  
@@ -472,7 +468,7 @@ def generate_barcode():
  
 def health():
  
-    return jsonify({"status": "xArm connected", "systems": {k: v._ip for k, v in ARMS.items()}})
+    return jsonify({"status": "ok", "systems": startup.status()})
 
  
 def open_camera(system_number):
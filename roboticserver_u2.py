@@ -1,22 +1,54 @@
 # Updated server by Vinayak - Multi-Arm Robotic Payment System
 # Started on Aug 29, 2025
 
-from flask import Flask, request, jsonify,Response
+from flask import Flask, request, jsonify,Response, copy_current_request_context
 import time
 from armsideclient import (
     SYSTEMS, task_queues, worker_threads, arm_connections, arm_status,
-    last_call, last_call_lock, initialize_systems
+    initialize_systems, setup_logging,
+    load_action_sequence, submit_task, find_job, jobs, jobs_lock, job_summary,
+    shutdown_systems, active_jobs, QueueFullError, job_eta
 )
+from admission import backlog, etas
+from concurrent.futures import TimeoutError as DeviceTimeoutError
+from config import SERVER_HOST, SERVER_PORT, SERVER_THREADS, SHUTDOWN_DRAIN_TIMEOUT
+from server_runtime import serve, run_device_io, DeviceBusyError
+from rate_limiter import TokenBucketLimiter
+from scenario import run_scenario
+from screen_flow import get_planner, CASH_DENOMINATIONS
+import checkpoints
 import logging
 import json
-from barcode_utils import BarcodeGenerator, ImageConverter, SerialCommunication
-from PIL import Image
+from barcode_utils import BarcodeGenerator, ImageConverter, SerialCommunication, Image
+from lazy_imports import prewarm, import_profile
 from camera_util import (
     capture_receipt_handler,
     camera_status_handler,
     gen_frames,capture_and_ocr_handler
 )
 app = Flask(__name__)
+# Default limits; per-system overrides live in SYSTEMS[...]["rate_limits"]
+rate_limiter = TokenBucketLimiter({
+    "payment_action": {"capacity": 1, "per_seconds": 60},
+    "screen_flow": {"capacity": 1, "per_seconds": 10},
+})
+
+@app.errorhandler(DeviceBusyError)
+def device_busy(e):
+    return jsonify({"status": "error", "message": str(e)}), 503
+
+@app.errorhandler(QueueFullError)
+def queue_full(e):
+    response = jsonify({
+        "status": "error", "message": str(e), "system": e.system,
+        "estimated_wait": e.estimated_wait, "retry_after": e.retry_after
+    })
+    response.headers["Retry-After"] = str(int(e.retry_after + 0.999))
+    return response, e.status
+
+@app.errorhandler(DeviceTimeoutError)
+def device_timeout(e):
+    return jsonify({"status": "error", "message": "Device operation timed out"}), 504
 
 @app.route("/payment_action", methods=["POST"])
 def unified_action():
@@ -34,26 +66,44 @@ def unified_action():
         return jsonify({"status": "error", "message": "System ID is required"}), 400
     if system not in SYSTEMS:
         return jsonify({"status": "error", "message": f"System {system} not found"}), 404
+    idempotency_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+    # Retries and identical submissions get the existing job back (no rate limit hit)
+    lookup = {"action": action or "pin_only", "rack": rack}
+    existing = find_job(system, lookup, pin, idempotency_key)
+    if existing is not None:
+        return jsonify({
+            "status": "success",
+            "message": f"Duplicate of job {existing['job_id']} on system {system}",
+            "job_id": existing["job_id"],
+            "job_status": existing["status"],
+            "deduplicated": True,
+            "queue_size": task_queues[system].qsize(),
+            **job_eta(existing),
+            "pin_executed": bool(pin),
+            "system": system
+        }), 200
     # Rate limiting per IP per system (allows same IP to hit different arms simultaneously)
-    rate_limit_key = f"{client_ip}_{system}"
-    with last_call_lock:
-        last_ts = last_call.get(rate_limit_key)
-        if last_ts is not None and (now - last_ts) < 60:
-            return jsonify({
-                "status": "error",
-                "message": "Please wait 1 minute before retrying the same system"
-            }), 429
-        last_call[rate_limit_key] = now
+    allowed, retry_after = rate_limiter.allow(client_ip, system, "payment_action")
+    if not allowed:
+        return jsonify({
+            "status": "error",
+            "message": f"Please wait {int(retry_after) + 1} sec before retrying the same system",
+            "retry_after": round(retry_after, 1)
+        }), 429
     # CASE 1: PIN ONLY (no action/rack specified)
     if not action and not rack and pin:
         meta = {"ip": client_ip, "action": "pin_only", "rack": None, "ts": now, "system": system}
-        task_queues[system].put((None, pin, meta))# sequence=None, pin provided
+        meta, created = submit_task(system, None, pin, meta, idempotency_key=idempotency_key)# sequence=None, pin provided
         qsize = task_queues[system].qsize()
-        logging.info(f"[System {system}] Queued PIN-only task {meta} | queue_size={qsize}")
+        logging.info(f"[System {system}] Queued PIN-only task {job_summary(meta)} | queue_size={qsize}")
         return jsonify({
             "status": "success",
             "message": f"PIN-only action queued for System {system}",
+            "job_id": meta["job_id"],
+            "deduplicated": not created,
             "queue_size": qsize,
+            "estimated_wait": meta.get("estimated_wait"),
+            **job_eta(meta),
             "pin_executed": True,
             "system": system
         }), 200
@@ -61,37 +111,162 @@ def unified_action():
     if not action or rack is None:
         return jsonify({"status": "error", "message": "Missing action or rack"}), 400
 
-    system_cfg = SYSTEMS.get(system)
-    actions = system_cfg.get("actions", {})
-    if action not in actions:
-        return jsonify({"status": "error", "message": f"Action '{action}' not available for system {system}"}), 404
-    if rack not in actions[action]:
-        return jsonify({"status": "error", "message": f"Rack {rack} not available for action '{action}' in system {system}"}), 404
-
-    filepath = actions[action][rack]
     # Load sequence file
     try:
-        if isinstance(filepath, str) and filepath.endswith(".json"):
-            with open(filepath, "r") as f:
-                sequence = json.load(f)
-        else:
-            sequence = filepath
+        sequence = load_action_sequence(system, action, rack)
+    except KeyError as e:
+        return jsonify({"status": "error", "message": e.args[0]}), 404
     except Exception as e:
-        logging.exception(f"Failed to load motion file: {filepath}")
+        logging.exception(f"Failed to load motion file for {action} rack {rack}")
         return jsonify({"status": "error", "message": f"Load failed: {e}"}), 500
     # Queue the task
     meta = {"ip": client_ip, "action": action, "rack": rack, "ts": now, "system": system}
-    task_queues[system].put((sequence, pin, meta))
+    meta, created = submit_task(system, sequence, pin, meta, idempotency_key=idempotency_key)
     qsize = task_queues[system].qsize()
-    logging.info(f"[System {system}] Queued task {meta} | queue_size={qsize}")
+    logging.info(f"[System {system}] Queued task {job_summary(meta)} | queue_size={qsize}")
     return jsonify({
         "status": "success",
         "message": f"Action '{action}' on system {system}, rack {rack} queued",
+        "job_id": meta["job_id"],
+        "deduplicated": not created,
         "queue_size": qsize,
+        "estimated_wait": meta.get("estimated_wait"),
+        **job_eta(meta),
         "pin_executed": bool(pin),
         "system": system
     }), 200
 
+@app.route("/screen_flow", methods=["POST"])
+def screen_flow():
+    """Guided food / cash / PIN screen interaction, executed as one compiled task"""
+    client_ip = request.remote_addr or "unknown"
+    now = time.time()
+    data = request.get_json(silent=True) or {}
+
+    for field in ("choice", "confirm", "denomination"):
+        value = data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int, float))):
+            return jsonify({"status": "error", "message": f"{field} must be a string or number"}), 400
+    system = data.get("system")
+    choice = str(data.get("choice") or "").lower().strip()
+    confirm = str(data.get("confirm") or "").lower().strip()
+    denomination = data.get("denomination")
+    denomination = "" if denomination is None else str(denomination).strip()   # 0 is a denomination
+    exact_amount = data.get("exact_amount")
+    pin = data.get("pin")
+
+    if system is None:
+        return jsonify({"status": "error", "message": "System ID required"}), 400
+    if system not in SYSTEMS:
+        return jsonify({"status": "error", "message": f"System {system} not found"}), 404
+
+    # Walk the client through the missing inputs
+    if choice not in ["food", "cash"]:
+        return jsonify({"status": "need_input", "message": "Choose: food or cash", "next": "choice"}), 200
+    if choice == "food":
+        confirm = "yes"
+    elif not confirm:
+        return jsonify({"status": "need_input", "message": "Confirm cash? yes / no", "next": "confirm"}), 200
+    if choice == "cash" and confirm == "yes":
+        if not denomination:
+            return jsonify({"status": "need_input", "message": "Choose denomination or other", "next": "denomination"}), 200
+        if denomination not in CASH_DENOMINATIONS and denomination != "other":
+            return jsonify({"status": "error", "message": f"Unknown denomination {denomination!r}, "
+                                                          f"choose one of {sorted(CASH_DENOMINATIONS, key=int)} or other"}), 400
+        if denomination == "other" and exact_amount is None:
+            return jsonify({"status": "need_input", "message": "Enter exact amount", "next": "exact_amount"}), 200
+    if not pin:
+        return jsonify({"status": "need_pin", "message": "Enter PIN", "next": "pin"}), 200
+
+    meta = {
+        "ip": client_ip, "action": "screen_flow", "rack": None, "ts": now, "system": system,
+        "choice": choice, "confirm": confirm,
+        "denomination": denomination or None, "exact_amount": exact_amount
+    }
+    try:
+        planner = get_planner(system)
+        keys = planner.keys_for(choice, meta["denomination"], exact_amount, pin, confirm)
+        missing = planner.missing_keys(keys)
+    except (ValueError, OSError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    if missing:
+        return jsonify({"status": "error", "message": f"Buttons not available on system {system}: {missing}"}), 400
+
+    idempotency_key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+    existing = find_job(system, meta, pin, idempotency_key)
+    if existing is None:
+        allowed, retry_after = rate_limiter.allow(client_ip, system, "screen_flow")
+        if not allowed:
+            return jsonify({"status": "error", "message": f"Wait {int(retry_after) + 1} seconds",
+                            "retry_after": round(retry_after, 1)}), 429
+
+    meta, created = submit_task(system, None, pin, meta, idempotency_key=idempotency_key)
+    return jsonify({
+        "status": "success",
+        "message": f"Processing {choice}",
+        "job_id": meta["job_id"],
+        "deduplicated": not created,
+        "queue_size": task_queues[system].qsize(),
+        "estimated_wait": meta.get("estimated_wait"),
+        **job_eta(meta),
+        "system": system
+    }), 200
+
+@app.route("/scenario", methods=["POST"])
+def scenario():
+    """
+    Run a multi-system scenario: a DAG of (system, action, rack, pin) steps.
+    Blocks until the scenario finishes and returns the aggregated result.
+    """
+    client_ip = request.remote_addr or "unknown"
+    data = request.get_json(silent=True) or {}
+    steps = data.get("steps")
+    timeout = data.get("timeout", 600)
+    try:
+        result = run_scenario(steps, client_ip=client_ip, timeout=float(timeout))
+    except ValueError as ve:
+        return jsonify({"status": "error", "message": str(ve)}), 400
+    except Exception as e:
+        logging.exception("Scenario execution failed")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    code = 200 if result["status"] == "success" else 504 if result["status"] == "timeout" else 500
+    return jsonify(result), code
+
+@app.route("/job/<job_id>", methods=["GET"])
+def get_job(job_id):
+    with jobs_lock:
+        meta = jobs.get(job_id)
+        if meta is None:
+            return jsonify({"status": "error", "message": f"Job {job_id} not found"}), 404
+        summary = job_summary(meta)
+    summary.update(job_eta(meta))
+    return jsonify({"status": "success", "data": summary}), 200
+
+@app.route("/checkpoint/<int:system_id>", methods=["GET"])
+def get_checkpoint(system_id):
+    if system_id not in SYSTEMS:
+        return jsonify({"status": "error", "message": f"System {system_id} not found"}), 404
+    return jsonify({"status": "success", "data": checkpoints.summary(checkpoints.load_checkpoint(system_id))}), 200
+
+@app.route("/checkpoint/<int:system_id>/retreat", methods=["POST"])
+def retreat_from_checkpoint(system_id):
+    """Queue the recovery path of an interrupted or failed run"""
+    if system_id not in SYSTEMS:
+        return jsonify({"status": "error", "message": f"System {system_id} not found"}), 404
+    record = checkpoints.load_checkpoint(system_id)
+    if not record or record["status"] not in ("running", "failed"):
+        return jsonify({"status": "error", "message": "No interrupted run to recover"}), 409
+    if arm_status.get(system_id) == "working":
+        return jsonify({"status": "error", "message": f"System {system_id} is busy"}), 409
+    steps = checkpoints.retreat_for(system_id, record)
+    meta = {
+        "ip": request.remote_addr, "action": "recovery", "rack": record.get("rack"),
+        "ts": time.time(), "system": system_id, "recovers": record.get("job_id")
+    }
+    meta, _ = submit_task(system_id, steps, None, meta, dedup=False, bounded=False)
+    logging.info(f"Queued recovery of job {record.get('job_id')} on system {system_id}")
+    return jsonify({"status": "success", "job_id": meta["job_id"], "steps": len(steps)}), 202
+
 @app.route("/system_status/<int:system_id>", methods=["GET"])
 def get_system_status(system_id):
     if system_id not in SYSTEMS:
@@ -103,7 +278,14 @@ def get_system_status(system_id):
          # Arm state: idle or working
         queue_size = task_queues[system_id].qsize() if system_id in task_queues else 0
          # Tasks waiting in the queue
-        status = {"system_id": system_id, "arm_connected": arm_connected, "arm_state": arm_state, "tasks_queued": queue_size}
+        with jobs_lock:
+            active = list(active_jobs.get(system_id, {}).values())
+            _, estimated_wait = backlog(active, time.time())
+            queue_etas = etas(active, time.time())
+        status = {"system_id": system_id, "arm_connected": arm_connected, "arm_state": arm_state,
+                  "tasks_queued": queue_size, "estimated_wait": estimated_wait,
+                  "jobs": [{"job_id": jid, "eta_start": start, "eta_finish": finish}
+                           for jid, (start, finish) in queue_etas.items()]}
         return jsonify({"status": "success", "data": status}), 200
     except Exception as e:
         logging.error(f"Error getting system {system_id} status: {e}")
@@ -133,7 +315,8 @@ def health_check():
                     "arm_connected": sid in arm_connections,
                     "arm_state": arm_status.get(sid, "idle")
                 }
-        return jsonify({"status": "success", "message": "Server is healthy", "systems": all_systems_status}), 200
+        return jsonify({"status": "success", "message": "Server is healthy", "systems": all_systems_status,
+                        "device_libraries": import_profile()}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -148,7 +331,7 @@ def capture_and_ocr():
         return jsonify({"status": "error", "message": "Missing system_number"}), 400
 
     # Call the single utility function in camera_util
-    result = capture_and_ocr_handler(system_number)
+    result = run_device_io(capture_and_ocr_handler, system_number)
 
     return jsonify(result)
 @app.route("/generate-barcode", methods=["POST"])
@@ -164,21 +347,9 @@ def generate_barcode():
 
         sku = data["SKU"]
 
-        # Generate barcode
-        barcode_generator = BarcodeGenerator(barcode_type="code128", data=sku)
-        image = barcode_generator.generate()
-
-        # Center it inside 128x128
-        centered_img = Image.new('1', (128, 128), 1)
-        offset_x = (128 - image.width) // 2
-        offset_y = (128 - image.height) // 2
-        centered_img.paste(image, (offset_x, offset_y))
-
-        byte_data = ImageConverter.image_to_bytearray(centered_img)
-
         # Select barcode display port from SYSTEMS config
         port = SYSTEMS[system_number]["devices"]["barcode_display"]
-        SerialCommunication.send_to_serial(byte_data, port=port)
+        run_device_io(render_and_send_barcode, sku, port)
 
         # Optional future extension: pick an action (tap/insert/swipe) automatically
         # Example: action_file = SYSTEMS[system_number]["actions"].get("insert", {}).get(1)
@@ -190,20 +361,37 @@ def generate_barcode():
             "port": port
         })
 
+    except (DeviceBusyError, DeviceTimeoutError):
+        raise
     except ValueError as ve:
         return jsonify({"status": "error", "message": str(ve)}), 400
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
+
+def render_and_send_barcode(sku, port):
+    """Render a Code128 barcode centred in 128x128 and send it to the display"""
+    barcode_generator = BarcodeGenerator(barcode_type="code128", data=sku)
+    image = barcode_generator.generate()
+
+    # Center it inside 128x128
+    centered_img = Image.new('1', (128, 128), 1)
+    offset_x = (128 - image.width) // 2
+    offset_y = (128 - image.height) // 2
+    centered_img.paste(image, (offset_x, offset_y))
+
+    byte_data = ImageConverter.image_to_bytearray(centered_img)
+    SerialCommunication.send_to_serial(byte_data, port=port)
+
 @app.route("/capture_receipt", methods=["GET"])
 def capture_receipt():
     system_number = request.args.get("system_number", type=int)
-    return capture_receipt_handler(system_number)
+    return run_device_io(copy_current_request_context(capture_receipt_handler), system_number)
 
 
 @app.route("/camera_status", methods=["GET"])
 def camera_status():
     system_number = request.args.get("system_number", type=int)
-    return camera_status_handler(system_number)
+    return run_device_io(copy_current_request_context(camera_status_handler), system_number)
 
 
 @app.route("/camera_preview", methods=["GET"])
@@ -212,6 +400,9 @@ def camera_preview():
 
 
 if __name__ == "__main__":
+    setup_logging()
     initialize_systems()
-    logging.info("All systems initialized, starting Flask server")
-    app.run(host="0.0.0.0", port=8000, debug=False, threaded=True)
+    logging.info("All systems initialized, starting server")
+    prewarm()   # camera / OCR / barcode libraries load while the server already serves
+    serve(app, SERVER_HOST, SERVER_PORT, SERVER_THREADS,
+          on_shutdown=lambda: shutdown_systems(SHUTDOWN_DRAIN_TIMEOUT))
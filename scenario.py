@@ -0,0 +1,193 @@
+"""
+scenario.py
+-----------
+Runs one logical test across several systems at once.
+
+A scenario is a list of steps forming a DAG. Each step drives one system
+(action/rack with optional PIN, or PIN only) and may depend on other steps.
+Steps whose dependencies are satisfied are dispatched to the per-system
+worker queues immediately, so different arms work in parallel while the
+worker of each arm still serialises its own motions.
+"""
+
+import queue
+import time
+import logging
+from armsideclient import SYSTEMS, load_action_sequence, submit_task, cancel_job
+
+
+def validate_scenario(steps):
+    """
+    Check the scenario structure and return the steps keyed by id, each a
+    copy with "depends_on" normalised to a set of step ids. Raises
+    ValueError on missing ids, malformed or unknown dependencies or cycles.
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("Scenario must contain a non-empty list of steps")
+
+    by_id = {}
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise ValueError(f"Step {i+1} must be an object")
+        step_id = str(step.get("id", i + 1))
+        if step_id in by_id:
+            raise ValueError(f"Duplicate step id '{step_id}'")
+        depends_on = step.get("depends_on") or []
+        if not isinstance(depends_on, list) or not all(isinstance(d, (str, int)) for d in depends_on):
+            raise ValueError(f"Step '{step_id}': depends_on must be a list of step ids")
+        by_id[step_id] = dict(step, depends_on={str(d) for d in depends_on})
+
+    for step_id, step in by_id.items():
+        for dep in step["depends_on"]:
+            if dep not in by_id:
+                raise ValueError(f"Step '{step_id}' depends on unknown step '{dep}'")
+        if step.get("barrier"):
+            continue
+        system = step.get("system")
+        if system not in SYSTEMS:
+            raise ValueError(f"Step '{step_id}': system {system} not found")
+        if not step.get("action") and not step.get("pin"):
+            raise ValueError(f"Step '{step_id}': action/rack or pin is required")
+
+    # Kahn's algorithm to reject cycles
+    indegree = {sid: len(s["depends_on"]) for sid, s in by_id.items()}
+    ready = [sid for sid, n in indegree.items() if n == 0]
+    visited = 0
+    while ready:
+        sid = ready.pop()
+        visited += 1
+        for other, s in by_id.items():
+            if sid in s["depends_on"]:
+                indegree[other] -= 1
+                if indegree[other] == 0:
+                    ready.append(other)
+    if visited != len(by_id):
+        raise ValueError("Scenario dependencies contain a cycle")
+
+    return by_id
+
+
+def _resolve_step(step_id, step):
+    """Load the motion sequence for a step (None for PIN-only steps)"""
+    action = (step.get("action") or "").lower().strip()
+    if not action:
+        return None
+    try:
+        return load_action_sequence(step["system"], action, step.get("rack"))
+    except KeyError as e:
+        raise ValueError(f"Step '{step_id}': {e.args[0]}")
+
+
+def run_scenario(steps, client_ip="unknown", timeout=600):
+    """
+    Execute a scenario and block until every step finished, failed,
+    was skipped because a dependency failed, or the timeout expired.
+    Returns one aggregated result with per-step and per-system timings.
+    """
+    by_id = validate_scenario(steps)
+    sequences = {sid: _resolve_step(sid, s) for sid, s in by_id.items() if not s.get("barrier")}
+
+    start = time.time()
+    deps = {sid: set(s["depends_on"]) for sid, s in by_id.items()}
+    results = {sid: {"status": "pending"} for sid in by_id}
+    dispatched = {}
+    completions = queue.Queue()
+
+    def dispatch(sid):
+        step = by_id[sid]
+        if step.get("barrier"):
+            results[sid] = {"status": "completed", "barrier": True}
+            completions.put(sid)
+            return
+        action = (step.get("action") or "").lower().strip() or "pin_only"
+        meta = {
+            "ip": client_ip, "action": action, "rack": step.get("rack"),
+            "ts": time.time(), "system": step["system"], "scenario_step": sid
+        }
+        # Repeated identical steps in a scenario are intentional, never fold them.
+        # Steps are dispatched as their dependencies finish, so they are not
+        # refused half-way through by the queue limits.
+        submit_task(step["system"], sequences[sid], step.get("pin"), meta,
+                    on_done=lambda m, sid=sid: completions.put(sid), dedup=False, bounded=False)
+        dispatched[sid] = meta
+        results[sid] = {"status": "queued"}
+        logging.info(f"[Scenario] Dispatched step '{sid}' to system {step['system']}")
+
+    def skip_dependents(failed_sid):
+        for sid, d in deps.items():
+            if failed_sid in d and results[sid]["status"] == "pending":
+                results[sid] = {"status": "skipped", "reason": f"dependency '{failed_sid}' did not complete"}
+                skip_dependents(sid)
+
+    for sid in by_id:
+        if not deps[sid]:
+            dispatch(sid)
+
+    unfinished = len(by_id) - sum(1 for r in results.values() if r["status"] == "skipped")
+    deadline = start + timeout
+    while unfinished > 0:
+        try:
+            sid = completions.get(timeout=max(0.0, deadline - time.time()))
+        except queue.Empty:
+            break
+        unfinished -= 1
+
+        meta = dispatched.get(sid)
+        if meta is not None:
+            results[sid] = {
+                "status": meta["status"],
+                "system": meta["system"],
+                "action": meta["action"],
+                "rack": meta["rack"],
+                "queued_at": round(meta["queued_at"] - start, 3),
+                "started_at": round(meta["started_at"] - start, 3) if "started_at" in meta else None,
+                "finished_at": round(meta["finished_at"] - start, 3),
+            }
+            if "error" in meta:
+                results[sid]["error"] = meta["error"]
+
+        if results[sid]["status"] != "completed":
+            before = sum(1 for r in results.values() if r["status"] == "skipped")
+            skip_dependents(sid)
+            unfinished -= sum(1 for r in results.values() if r["status"] == "skipped") - before
+            continue
+
+        for other, d in deps.items():
+            if sid in d:
+                d.discard(sid)
+                if not d and results[other]["status"] == "pending":
+                    dispatch(other)
+
+    timed_out = unfinished > 0
+    if timed_out:
+        for sid, meta in dispatched.items():
+            if results[sid]["status"] == "queued" and cancel_job(meta["job_id"]):
+                results[sid]["status"] = "cancelled"
+        for r in results.values():
+            if r["status"] == "pending":
+                r["status"] = "not_started"
+
+    elapsed = time.time() - start
+    busy = {}
+    for r in results.values():
+        if r.get("started_at") is not None:
+            busy[r["system"]] = busy.get(r["system"], 0.0) + r["finished_at"] - r["started_at"]
+
+    statuses = {r["status"] for r in results.values()}
+    if timed_out:
+        overall = "timeout"
+    elif statuses == {"completed"}:
+        overall = "success"
+    else:
+        overall = "failed"
+
+    logging.info(f"[Scenario] Finished with status={overall} in {elapsed:.2f}s")
+    return {
+        "status": overall,
+        "elapsed": round(elapsed, 3),
+        "steps": results,
+        "systems": {
+            sys_id: {"busy": round(t, 3), "utilisation": round(t / elapsed, 3) if elapsed else 0.0}
+            for sys_id, t in busy.items()
+        },
+    }
@@ -0,0 +1,181 @@
+"""
+screen_flow.py
+--------------
+Compiled screen-flow planner for the /screen_flow tasks.
+
+The interaction map of a system (entry path, buttons, exit path) is loaded
+once and reloaded only when the file changes on disk. Button segments are
+precomputed, and the entry plus choice / denomination / amount part of a
+flow is composed once per planner; the PIN and confirm presses are joined
+onto it per task, so no PIN is kept in the cache. When segments are joined, a waypoint that repeats
+the pose the arm is already at (same key pressed twice, "cash" and "yes"
+sharing one position, ...) is dropped, so the arm goes straight to the
+next press instead of commanding a move to where it already is.
+
+Keys missing from the interaction map (PIN digits) are taken from the
+system's PIN entry file when both files approach the screen through the
+same entry pose.
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from config import SYSTEMS
+
+POSE_TOLERANCE = 0.05   # degrees; joint poses closer than this are the same waypoint
+# The original flow pressed {0, 20, 30, 40, 50}; "10" was added because the
+# System 2 interaction map (Screen_Touch_System2.json) has a "10" button, which
+# was never pressed. A denomination without a button is refused by missing_keys().
+CASH_DENOMINATIONS = {"0", "10", "20", "30", "40", "50"}
+MAX_CACHED_PLANS = 256  # composed flow heads kept per planner
+
+
+def _load_json(path):
+    with open(path, "r") as f:
+        data = json.load(f)
+    # Unwrap dict format like {"screen_touch": {...}}
+    if isinstance(data, dict) and len(data) == 1:
+        data = list(data.values())[0]
+    return data
+
+
+def same_pose(a, b, tol=POSE_TOLERANCE):
+    """True if both steps are joint moves to the same pose"""
+    if a.get("type") != "move" or b.get("type") != "move":
+        return False
+    return all(abs(x - y) <= tol for x, y in zip(a["joints"], b["joints"]))
+
+
+def count_moves(sequence):
+    return sum(1 for step in sequence if step.get("type") == "move")
+
+
+def join_segments(segments):
+    """
+    Concatenate step lists, dropping a move that targets the pose the
+    previous move already reached.
+    """
+    joined = []
+    last_move = None
+    for segment in segments:
+        for step in segment:
+            if step.get("type") == "move":
+                if last_move is not None and same_pose(last_move, step):
+                    continue
+                last_move = step
+            joined.append(step)
+    return joined
+
+
+class ScreenFlowPlanner:
+    """Precomputed screen interaction segments for one system"""
+
+    def __init__(self, system_id):
+        self.system_id = system_id
+        devices = SYSTEMS[system_id].get("devices", {})
+        self.interaction_file = SYSTEMS[system_id].get("interaction_file")
+        self.pin_file = devices.get("pin_entry")
+        self._mtimes = None
+        self._lock = threading.Lock()
+        self.entry, self.exit, self.buttons = (), (), {}
+        self._plans = OrderedDict()   # {head keys: joined steps}, PIN-free
+
+    def _current_mtimes(self):
+        return tuple(
+            os.path.getmtime(p) if p and os.path.exists(p) else None
+            for p in (self.interaction_file, self.pin_file)
+        )
+
+    def _reload_if_changed(self):
+        mtimes = self._current_mtimes()
+        if mtimes == self._mtimes:
+            return
+        if not self.interaction_file:
+            raise ValueError(f"No interaction file configured for system {self.system_id}")
+
+        interaction = _load_json(self.interaction_file)
+        buttons = {k: tuple(v) for k, v in interaction.get("buttons", {}).items()}
+        entry = tuple(interaction.get("entry", []))
+
+        # Borrow keypad buttons from the PIN file if it reaches the screen the same way
+        if self.pin_file and os.path.exists(self.pin_file):
+            pin_steps = _load_json(self.pin_file)
+            pin_entry = pin_steps.get("entry", [])
+            if entry and pin_entry and same_pose(entry[-1], pin_entry[-1], tol=0.5):
+                for key, steps in pin_steps.get("buttons", {}).items():
+                    buttons.setdefault(key, tuple(steps))
+
+        self.entry, self.exit, self.buttons = entry, tuple(interaction.get("exit", [])), buttons
+        self._mtimes = mtimes
+        self._plans.clear()
+        logging.info(f"Screen flow map loaded for system {self.system_id}: {len(buttons)} buttons")
+
+    def keys_for(self, choice, denomination=None, exact_amount=None, pin=None, confirm=None):
+        """Ordered list of buttons pressed for a screen flow"""
+        keys = [choice] if choice else []
+        if choice == "cash":
+            if denomination in CASH_DENOMINATIONS:
+                keys.append(denomination)
+            elif exact_amount is not None:
+                keys.extend(str(exact_amount))
+        if pin:
+            keys.extend(str(pin))
+        if confirm == "yes":
+            keys.append("yes")
+        return keys
+
+    def missing_keys(self, keys):
+        with self._lock:
+            self._reload_if_changed()
+            return [k for k in keys if k not in self.buttons]
+
+    def plan(self, choice, denomination=None, exact_amount=None, pin=None, confirm=None):
+        """
+        Return the composed step list for a screen flow.
+        Unknown keys are skipped with a warning, like the original flow.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            head = tuple(self.keys_for(choice, denomination, exact_amount))
+            tail = self.keys_for(None, pin=pin, confirm=confirm)
+            sequence = self._plans.get(head)
+            if sequence is None:
+                sequence = self._plan(head)
+                self._plans[head] = sequence
+                if len(self._plans) > MAX_CACHED_PLANS:
+                    self._plans.popitem(last=False)
+            if not tail:
+                return sequence
+            return join_segments([sequence] + self._segments(tail, "PIN / confirm"))
+
+    def _segments(self, keys, label=None):
+        segments = []
+        for key in keys:
+            if key not in self.buttons:
+                logging.warning(f"Screen flow button '{label or key}' not found for system {self.system_id}")
+                continue
+            segments.append(self.buttons[key])
+        return segments
+
+    def _plan(self, keys):
+        sequence = join_segments([self.entry] + self._segments(keys))
+        naive = count_moves(self.entry) + sum(count_moves(self.buttons.get(k, ())) for k in keys)
+        logging.info(
+            f"Screen flow {keys} for system {self.system_id}: "
+            f"{count_moves(sequence)} moves (unjoined {naive})"
+        )
+        return sequence
+
+
+_planners = {}
+_planners_lock = threading.Lock()
+
+
+def get_planner(system_id):
+    """Shared planner per system, created on first use"""
+    with _planners_lock:
+        if system_id not in _planners:
+            _planners[system_id] = ScreenFlowPlanner(system_id)
+        return _planners[system_id]
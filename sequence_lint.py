@@ -0,0 +1,231 @@
+"""
+sequence_lint.py
+----------------
+Static checks and cost estimate for recorded motion JSON.
+
+Recorded files come in several shapes: a plain step list, a dict with one
+named list ({"tap_system2_rack1": [...]}), a keypad/screen map
+({"entry": [...], "buttons": {...}, "exit": [...]}) or a dict of several
+named lists. normalise() turns every shape into named segments, and each
+segment is checked for:
+
+    error    unknown step type (skipped silently by run_sequence), missing
+             or malformed joints/speed, joints outside JOINT_LIMITS_DEG
+    warning  duplicate consecutive waypoints, moves carrying a recorded
+             "delay" (slept again after the blocking move)
+
+check_config() also reports files referenced from config.SYSTEMS that do
+not exist (paths are case sensitive on the Linux hosts).
+
+The cycle time estimate uses a trapezoidal profile per joint move (largest
+joint delta at the step speed, JOINT_ACCEL_DEG_S2 acceleration), tool
+moves at their linear speed, and every sleep/delay the worker performs.
+The first move of a segment starts from an unknown pose and only its
+acceleration time is counted.
+
+Usage:
+    python sequence_lint.py                 # every file under Recorded_file/ and the root
+    python sequence_lint.py a.json b.json [--json] [--warnings-as-errors]
+"""
+
+import os
+import glob
+import json
+import math
+from kinematics import JOINT_LIMITS_DEG
+from screen_flow import same_pose
+from config import SYSTEMS
+
+# Must match armsideclient.STEP_HANDLERS
+KNOWN_STEP_TYPES = {"move", "sleep", "gripper_open", "gripper_close", "tool_move", "linear_move"}
+JOINT_ACCEL_DEG_S2 = 500.0      # controller default joint acceleration
+TOOL_ACCEL_MM_S2 = 2000.0       # controller default linear acceleration
+GRIPPER_DEFAULT_DELAY = 0.5     # handle_open / handle_close default sleep
+NON_MOTION_FILES = {"ocr.json", "rack_calibration.json"}
+
+
+def normalise(data):
+    """Return the named step lists of any recorded file shape"""
+    if isinstance(data, list):
+        return {"sequence": data}
+    if not isinstance(data, dict):
+        raise ValueError("Not a motion file: expected a list or an object")
+    if "buttons" in data or "entry" in data:
+        segments = {"entry": data.get("entry", [])}
+        for key, steps in data.get("buttons", {}).items():
+            segments[f"button:{key}"] = steps
+        segments["exit"] = data.get("exit", [])
+        return segments
+    segments = {k: v for k, v in data.items() if isinstance(v, list)}
+    if not segments:
+        raise ValueError("Not a motion file: no step lists found")
+    return segments
+
+
+def move_time(distance, speed, accel):
+    """Duration of a point-to-point move with a trapezoidal speed profile"""
+    if distance <= 0 or speed <= 0:
+        return 0.0
+    if distance > speed * speed / accel:
+        return distance / speed + speed / accel
+    return 2.0 * math.sqrt(distance / accel)
+
+
+def estimate_step(step, previous_joints):
+    """(motion seconds, dwell seconds) of one step as the worker runs it"""
+    stype = step.get("type")
+    if stype == "move":
+        speed = step.get("speed", 0)
+        if previous_joints is None:
+            motion = speed / JOINT_ACCEL_DEG_S2 if speed else 0.0
+        else:
+            delta = max(abs(a - b) for a, b in zip(step["joints"], previous_joints))
+            motion = move_time(delta, speed, JOINT_ACCEL_DEG_S2)
+        return motion, step.get("delay", 0)
+    if stype == "tool_move":
+        distance = math.sqrt(sum(step.get(k, 0) ** 2 for k in ("dx", "dy", "dz")))
+        return move_time(distance, step.get("speed", 20), TOOL_ACCEL_MM_S2), 0.0
+    if stype == "linear_move":
+        # The start pose is not known here, only the acceleration time is counted
+        return step.get("speed", 20) / TOOL_ACCEL_MM_S2, step.get("delay", 0)
+    if stype == "sleep":
+        return 0.0, step.get("duration", 0)
+    if stype in ("gripper_open", "gripper_close"):
+        return 0.0, step.get("delay", GRIPPER_DEFAULT_DELAY)
+    return 0.0, 0.0
+
+
+def lint_sequence(steps, segment="sequence"):
+    """Check one step list. Returns (issues, stats)."""
+    issues = []
+    stats = {"steps": len(steps), "moves": 0, "motion_s": 0.0, "dwell_s": 0.0, "move_delay_s": 0.0}
+
+    def issue(level, i, message):
+        issues.append({"level": level, "segment": segment, "step": i + 1, "message": message})
+
+    last_move = None
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict):
+            issue("error", i, "step is not an object")
+            continue
+        stype = step.get("type")
+        if stype not in KNOWN_STEP_TYPES:
+            issue("error", i, f"unknown step type '{stype}' is skipped at run time")
+            continue
+        if stype == "move":
+            joints = step.get("joints")
+            if not isinstance(joints, list) or len(joints) != 6:
+                issue("error", i, "move needs 6 joint angles")
+                continue
+            if not step.get("speed"):
+                issue("error", i, "move has no speed")
+                continue
+            outside = [
+                f"J{n+1}={a:.1f}" for n, (a, (low, high)) in enumerate(zip(joints, JOINT_LIMITS_DEG))
+                if not low <= a <= high
+            ]
+            if outside:
+                issue("error", i, f"joints outside limits: {', '.join(outside)}")
+            if last_move is not None and same_pose(last_move, step):
+                issue("warning", i, "duplicate of the previous waypoint")
+            if step.get("delay"):
+                stats["move_delay_s"] += step["delay"]
+            stats["moves"] += 1
+        elif stype == "linear_move":
+            cartesian = step.get("cartesian")
+            if not isinstance(cartesian, list) or len(cartesian) != 6:
+                issue("error", i, "linear_move needs a 6 value Cartesian pose")
+                continue
+        elif stype == "sleep" and step.get("duration", 0) < 0:
+            issue("error", i, "negative sleep duration")
+
+        motion, dwell = estimate_step(step, last_move["joints"] if last_move else None)
+        if stype in ("tool_move", "linear_move"):
+            last_move = None   # the arm left the last joint waypoint
+        stats["motion_s"] += motion
+        stats["dwell_s"] += dwell
+        if stype == "move":
+            last_move = step
+
+    if stats["move_delay_s"]:
+        issues.append({
+            "level": "warning", "segment": segment, "step": None,
+            "message": f"moves carry {stats['move_delay_s']:.2f}s of recorded delay slept after each blocking move",
+        })
+    return issues, stats
+
+
+def lint_file(path):
+    """Lint one JSON file. Returns a report dict."""
+    report = {"file": path, "issues": [], "segments": {}}
+    try:
+        with open(path, "r") as f:
+            segments = normalise(json.load(f))
+    except (OSError, ValueError) as e:
+        report["issues"].append({"level": "error", "segment": None, "step": None, "message": str(e)})
+        return report
+
+    totals = {"steps": 0, "moves": 0, "motion_s": 0.0, "dwell_s": 0.0, "move_delay_s": 0.0}
+    for name, steps in segments.items():
+        issues, stats = lint_sequence(steps, name)
+        report["issues"].extend(issues)
+        report["segments"][name] = {k: round(v, 3) if isinstance(v, float) else v for k, v in stats.items()}
+        for k in totals:
+            totals[k] += stats[k]
+    totals["estimated_s"] = totals["motion_s"] + totals["dwell_s"]
+    report.update({k: round(v, 3) if isinstance(v, float) else v for k, v in totals.items()})
+    return report
+
+
+def discover(root="."):
+    """Motion JSON files under Recorded_file/ and in the root directory"""
+    paths = glob.glob(os.path.join(root, "Recorded_file", "**", "*.json"), recursive=True)
+    paths += glob.glob(os.path.join(root, "*.json"))
+    return sorted(p for p in paths if os.path.basename(p) not in NON_MOTION_FILES)
+
+
+def check_config():
+    """Issues for motion files referenced by config.SYSTEMS that are missing"""
+    issues = []
+    for sys_id, cfg in SYSTEMS.items():
+        refs = [(f"{action} rack {rack}", path)
+                for action, racks in cfg.get("actions", {}).items() for rack, path in racks.items()]
+        refs.append(("pin_entry", cfg.get("devices", {}).get("pin_entry")))
+        refs.append(("interaction_file", cfg.get("interaction_file")))
+        refs += [(f"{action} template", path) for action, path in cfg.get("templates", {}).items()]
+        for what, path in refs:
+            if isinstance(path, str) and not os.path.exists(path):
+                issues.append({"level": "error", "segment": f"system {sys_id}", "step": None,
+                               "message": f"{what}: {path} does not exist"})
+    return issues
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate recorded motion files and rank them by cycle time")
+    parser.add_argument("paths", nargs="*", help="files to check (default: Recorded_file/ and the root)")
+    parser.add_argument("--json", action="store_true", help="print the full reports as JSON")
+    parser.add_argument("--warnings-as-errors", action="store_true")
+    args = parser.parse_args()
+
+    reports = [lint_file(p) for p in (args.paths or discover())]
+    if not args.paths:
+        reports.append({"file": "config.py", "issues": check_config()})
+    reports.sort(key=lambda r: r.get("estimated_s", 0), reverse=True)
+    failing = {"error", "warning"} if args.warnings_as_errors else {"error"}
+    bad = [r for r in reports if any(i["level"] in failing for i in r["issues"])]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        print(f"{'est. s':>8} {'dwell':>7} {'moves':>6}  file")
+        for r in reports:
+            if "estimated_s" in r:
+                print(f"{r['estimated_s']:8.1f} {r['dwell_s']:7.1f} {r['moves']:6d}  {r['file']}")
+        for r in reports:
+            for i in r["issues"]:
+                where = ":".join(str(x) for x in (i["segment"], i["step"]) if x is not None)
+                print(f"{i['level'].upper():7} {r['file']} {where} {i['message']}")
+        print(f"{len(reports)} files, {len(bad)} failing")
+    raise SystemExit(1 if bad else 0)
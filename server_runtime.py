@@ -0,0 +1,94 @@
+"""
+server_runtime.py
+-----------------
+Production serving helpers for the robot API servers.
+
+- serve(): runs the Flask app under waitress (a multi-threaded WSGI server
+  in a single process, so the per-arm queues and workers exist only once).
+  Without waitress it refuses to start, unless SERVER_DEV_FALLBACK allows
+  the Flask development server.
+- run_device_io(): runs blocking camera / OCR / barcode work on a bounded
+  executor so slow devices cannot tie up every request thread.
+- SIGTERM / SIGINT trigger a graceful shutdown through the on_shutdown hook;
+  further signals during the drain are logged and ignored.
+"""
+
+import signal
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import DEVICE_IO_WORKERS, DEVICE_IO_BACKLOG, DEVICE_IO_TIMEOUT, SERVER_DEV_FALLBACK
+
+device_executor = ThreadPoolExecutor(max_workers=DEVICE_IO_WORKERS, thread_name_prefix="DeviceIO")
+_device_slots = threading.BoundedSemaphore(DEVICE_IO_WORKERS + DEVICE_IO_BACKLOG)
+
+
+class DeviceBusyError(RuntimeError):
+    """Raised when the device I/O executor has no free slot"""
+
+
+def run_device_io(func, *args, timeout=DEVICE_IO_TIMEOUT, **kwargs):
+    """
+    Run a blocking device call on the bounded executor and wait for it.
+    Raises DeviceBusyError when the executor and its backlog are full and
+    concurrent.futures.TimeoutError when the call exceeds `timeout`.
+    """
+    if not _device_slots.acquire(blocking=False):
+        raise DeviceBusyError("Device I/O is saturated, retry later")
+    try:
+        future = device_executor.submit(func, *args, **kwargs)
+    except Exception:
+        _device_slots.release()
+        raise
+    future.add_done_callback(lambda _: _device_slots.release())
+    return future.result(timeout=timeout)
+
+
+def _raise_interrupt(signum, frame):
+    logging.info(f"Received signal {signum}, shutting down")
+    raise KeyboardInterrupt
+
+
+def _ignore_while_draining(signum, frame):
+    logging.warning(f"Received signal {signum} while shutting down, still draining")
+
+
+def serve(app, host, port, threads, on_shutdown=None):
+    """
+    Serve the app until SIGTERM/SIGINT, then stop accepting requests and
+    call `on_shutdown()` (drain queues, stop grippers) before returning.
+    """
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    signal.signal(signal.SIGINT, _raise_interrupt)
+
+    try:
+        from waitress import create_server
+    except ImportError:
+        create_server = None
+
+    server = None
+    try:
+        if create_server is None:
+            if not SERVER_DEV_FALLBACK:
+                raise RuntimeError("waitress is not installed (pip install waitress); "
+                                   "set SERVER_DEV_FALLBACK = True in config.py to use the Flask development server")
+            logging.warning("waitress not installed, using the Flask development server")
+            app.run(host=host, port=port, debug=False, threaded=True)
+        else:
+            server = create_server(app, host=host, port=port, threads=threads)
+            logging.info(f"Serving on {host}:{port} with {threads} threads (waitress)")
+            server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, _ignore_while_draining)
+        signal.signal(signal.SIGINT, _ignore_while_draining)
+        if server is not None:
+            server.close()
+        if on_shutdown:
+            try:
+                on_shutdown()
+            except Exception as e:
+                logging.error(f"Shutdown hook failed: {e}")
+        device_executor.shutdown(wait=False)
+        logging.info("Server stopped")
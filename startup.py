@@ -0,0 +1,164 @@
+"""
+startup.py
+----------
+Parallel, fail-fast device initialisation for the legacy servers
+(roboticserver_u.py / roboticserver_u1.py).
+
+Those servers used to connect every arm in SYSTEMS one after the other at
+import time, so one unplugged arm held the whole server for its connect
+timeout before Flask started. StartupOrchestrator runs one initialiser per
+device (arm, serial device, camera) on its own thread with its own timeout
+(STARTUP_TIMEOUTS), and the server starts serving immediately.
+
+Each system reports "initialising" until all of its devices have finished,
+then "ready", or "degraded" when the arm is up but a peripheral failed, or
+"failed" when the arm did not come up. A device that misses its timeout is
+marked "timeout"; if its initialiser still succeeds later the device and
+the system are upgraded. Startup takes max(timeout) instead of N x timeout.
+"""
+
+import time
+import logging
+import threading
+from config import SYSTEMS, STARTUP_TIMEOUTS
+
+
+def connect_arm(ip):
+    """Connect an arm and put it in position mode; raises if it is not reachable"""
+    from xarm.wrapper import XArmAPI
+    arm = XArmAPI(ip)
+    arm.connect()
+    if not arm.connected:
+        raise ConnectionError(f"arm at {ip} not reachable")
+    arm.clean_error()
+    arm.clean_warn()
+    arm.motion_enable(enable=True)
+    arm.set_mode(0)
+    arm.set_state(0)
+    return arm
+
+
+def probe_serial(port):
+    """Open and close a serial device to check that it is present"""
+    import serial
+    with serial.Serial(port, 115200, timeout=1):
+        pass
+    return port
+
+
+def probe_camera(path):
+    """Open and release a camera to check that it delivers frames"""
+    import cv2
+    cam = cv2.VideoCapture(path)
+    try:
+        if not cam.isOpened():
+            raise IOError(f"camera {path} not accessible")
+    finally:
+        cam.release()
+    return path
+
+
+def device_plan(cfg):
+    """(device name, kind, target) of everything to initialise for one system"""
+    plan = [("arm", "arm", cfg["arm_ip"])]
+    for name, target in cfg.get("devices", {}).items():
+        if not isinstance(target, str) or not target.startswith("/dev/"):
+            continue   # file paths (e.g. pin_entry) are not devices
+        plan.append((name, "camera" if name == "camera" else "serial", target))
+    return plan
+
+
+INITIALISERS = {"arm": connect_arm, "serial": probe_serial, "camera": probe_camera}
+
+
+class StartupOrchestrator:
+    """Initialises all devices of all systems concurrently"""
+
+    def __init__(self, systems=None, timeouts=None, initialisers=None):
+        self.systems = SYSTEMS if systems is None else systems
+        self.timeouts = dict(STARTUP_TIMEOUTS, **(timeouts or {}))
+        self.initialisers = dict(INITIALISERS, **(initialisers or {}))
+        self.arms = {}       # {system_id: connected arm}, filled as arms come up
+        self.devices = {}    # {system_id: {device: {"kind", "target", "state", "error", "seconds"}}}
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._threads = []
+
+    def start(self):
+        """Start every device initialiser and return immediately"""
+        self._started_at = time.monotonic()
+        for system_id, cfg in self.systems.items():
+            plan = device_plan(cfg)
+            self.devices[system_id] = {
+                name: {"kind": kind, "target": target, "state": "initialising", "error": None, "seconds": None}
+                for name, kind, target in plan
+            }
+            for name, kind, target in plan:
+                thread = threading.Thread(target=self._run, args=(system_id, name, kind, target),
+                                          daemon=True, name=f"Startup-{system_id}-{name}")
+                thread.start()
+                self._threads.append(thread)
+                timer = threading.Timer(self.timeouts[kind], self._expire, args=(system_id, name))
+                timer.daemon = True
+                timer.start()
+        logging.info(f"Startup: initialising {sum(len(d) for d in self.devices.values())} devices "
+                     f"on {len(self.devices)} systems")
+        return self
+
+    def _set(self, system_id, name, state, error=None):
+        with self._lock:
+            device = self.devices[system_id][name]
+            device.update(state=state, error=error, seconds=round(time.monotonic() - self._started_at, 2))
+        return device
+
+    def _run(self, system_id, name, kind, target):
+        try:
+            result = self.initialisers[kind](target)
+        except Exception as e:
+            self._set(system_id, name, "failed", str(e))
+            logging.error(f"Startup: system {system_id} {name} ({target}) failed: {e}")
+            return
+        if kind == "arm":
+            self.arms[system_id] = result
+        late = self.devices[system_id][name]["state"] == "timeout"
+        device = self._set(system_id, name, "ready")
+        logging.info(f"Startup: system {system_id} {name} ready after {device['seconds']}s"
+                     f"{' (after its timeout)' if late else ''}")
+
+    def _expire(self, system_id, name):
+        with self._lock:
+            device = self.devices[system_id][name]
+            if device["state"] != "initialising":
+                return
+        self._set(system_id, name, "timeout", f"no response within {self.timeouts[device['kind']]}s")
+        logging.error(f"Startup: system {system_id} {name} ({device['target']}) timed out")
+
+    def system_state(self, system_id):
+        """initialising / ready / degraded / failed for one system"""
+        with self._lock:
+            devices = self.devices.get(system_id)
+            if not devices:
+                return "unknown"
+            states = {name: d["state"] for name, d in devices.items()}
+        if states["arm"] in ("failed", "timeout"):
+            return "failed"
+        if "initialising" in states.values():
+            return "initialising"
+        return "ready" if all(s == "ready" for s in states.values()) else "degraded"
+
+    def ready(self, system_id):
+        """True once the system's arm is connected"""
+        return system_id in self.arms
+
+    def status(self):
+        """Per-system state and device details, for health checks"""
+        with self._lock:
+            devices = {sid: {name: dict(d) for name, d in devs.items()} for sid, devs in self.devices.items()}
+        return {sid: {"state": self.system_state(sid), "devices": devs} for sid, devs in devices.items()}
+
+    def wait(self, timeout=None):
+        """Block until every initialiser has returned (or timeout); True if all did"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(t.is_alive() for t in self._threads)
@@ -75,34 +75,7 @@ def log_error(code, msg=""):
     print(f"[ERROR] Code {code} ({desc}) at {filename}:{line_no} {msg}")
     traceback.print_stack(limit=2)
 
-import numpy as np
-from scipy.interpolate import CubicSpline
-
-# Your waypoints (X, Y, Z only for simplicity here)
-points = [
-    [107.6,629.3,152.7],
-    [107.6,609.8,144.7],
-    [107.6,592.0,140.0],
-    [107.6,578.4,132.4],
-    [107.6,561.6,126.4],
-    [107.6,553.6,124.4],
-    [107.6,539.8,119.4],
-    [107.6,524.7,112.9],
-    [107.6,503.2,104.4],
-    [107.6,493.7,101.9],
-]
-
-points = np.array(points)
-t = np.arange(len(points))
-
-# Fit spline for each axis
-spl_x = CubicSpline(t, points[:,0])
-spl_y = CubicSpline(t, points[:,1])
-spl_z = CubicSpline(t, points[:,2])
-
-# Generate 50 smooth intermediate points
-t_new = np.linspace(0, len(points)-1, 50)
-smooth_points = np.stack([spl_x(t_new), spl_y(t_new), spl_z(t_new)], axis=1)
+
 def normalize_angle(angle):
     # Wrap into [-180, 180]
     while angle > 180:
@@ -0,0 +1,135 @@
+"""
+task_journal.py
+---------------
+Append-only JSONL journal of every executed task.
+
+One file per system and day (journal/system2-2026-10-19.jsonl), one JSON
+object per line:
+
+    {"t": "sequence", "hash": ..., "steps": [...]}            once per file and sequence
+    {"t": "task", "job": ..., "ts": ..., "hash": ..., "request": {...}}
+    {"t": "step", "job": ..., "i": 3, "type": "move", "start": 1.204, "dur": 0.871,
+     "ok": true, "joints": [...]}                              joints: arm report sample after the step
+    {"t": "end", "job": ..., "status": "completed", "elapsed": 24.1, "error": null}
+
+Step start times are relative to the task start. Sequences are stored
+once per file under their hash, so repeated actions cost one "task" line
+plus their step lines; the hashes already in a file are read back the
+first time it is written after a restart. replay.py reads the journal back.
+
+A task with a PIN keeps only the number of digits. Its steps are
+journaled without the sequence and without joint samples, which would
+give the pressed keys away.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from config import JOURNAL
+
+REQUEST_FIELDS = ("action", "rack", "choice", "denomination", "exact_amount", "confirm", "ip", "scenario_step")
+
+
+def sequence_hash(steps):
+    """Stable short hash of a step list"""
+    blob = json.dumps(steps, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+class TaskJournal:
+    """Thread-safe JSONL writer, one file per system and day"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._seen = {}      # {path: set of sequence hashes written to it}
+        self._started = {}   # {job_id: task start time}
+        self._redacted = set()   # job_ids with a PIN: no joints in their step records
+
+    def _path(self, system_id):
+        return os.path.join(self.directory, f"system{system_id}-{time.strftime('%Y-%m-%d')}.jsonl")
+
+    def _seen_in(self, path):
+        """Sequence hashes already in a journal file (called with _lock held)"""
+        seen = self._seen.get(path)
+        if seen is None:
+            seen = self._seen[path] = set()
+            try:
+                with open(path, "r") as f:
+                    for line in f:
+                        if line.startswith('{"t":"sequence"'):
+                            try:
+                                seen.add(json.loads(line)["hash"])
+                            except (ValueError, KeyError):
+                                pass   # line cut off by a crash
+            except OSError:
+                pass
+        return seen
+
+    def _write(self, system_id, *records):
+        path = self._path(system_id)
+        lines = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "a") as f:
+                f.write(lines)
+        return path
+
+    def task_started(self, system_id, meta, steps, pin=None):
+        """Record a task start and its resolved sequence"""
+        now = time.time()
+        digest = sequence_hash(steps) if steps and not pin else None
+        request = {k: meta[k] for k in REQUEST_FIELDS if meta.get(k) is not None}
+        if pin:
+            request["pin_digits"] = len(str(pin))   # the PIN itself is never journaled
+        records = []
+        path = self._path(system_id)
+        with self._lock:
+            self._started[meta["job_id"]] = now
+            if pin:
+                self._redacted.add(meta["job_id"])
+            seen = self._seen_in(path)
+            if digest and digest not in seen:
+                seen.add(digest)
+                records.append({"t": "sequence", "hash": digest, "steps": steps})
+        records.append({"t": "task", "job": meta["job_id"], "system": system_id, "ts": round(now, 3),
+                        "hash": digest, "warm_start": meta.get("warm_start", False), "request": request})
+        self._write(system_id, *records)
+
+    def step(self, system_id, job_id, i, stype, started, duration, ok=True, error=None, joints=None):
+        """Record one executed step; `started` is an absolute time"""
+        t0 = self._started.get(job_id, started)
+        record = {"t": "step", "job": job_id, "i": i, "type": stype,
+                  "start": round(started - t0, 4), "dur": round(duration, 4), "ok": ok}
+        if error is not None:
+            record["error"] = str(error)
+        if joints is not None and job_id not in self._redacted:
+            record["joints"] = [round(float(a), 3) for a in joints]
+        self._write(system_id, record)
+
+    def task_finished(self, system_id, meta):
+        """Record the outcome of a started task"""
+        with self._lock:
+            t0 = self._started.pop(meta["job_id"], None)
+            self._redacted.discard(meta["job_id"])
+        if t0 is None:
+            return
+        self._write(system_id, {"t": "end", "job": meta["job_id"], "status": meta.get("status"),
+                                "elapsed": round(time.time() - t0, 3), "error": meta.get("error")})
+
+
+journal = TaskJournal(JOURNAL["dir"]) if JOURNAL["enabled"] else None
+
+
+def arm_joints(arm):
+    """Latest joint angles from the arm's report stream (no extra command), or None"""
+    if not JOURNAL["sample_reports"]:
+        return None
+    try:
+        return list(arm.angles)[:6]
+    except Exception as e:
+        logging.debug(f"No joint sample for the journal: {e}")
+        return None
@@ -0,0 +1,410 @@
+"""
+teach_compiler.py
+-----------------
+Compiles declarative teach specs into playback JSON.
+
+A teach spec (JSON, or YAML when PyYAML is installed) describes one action:
+
+    {
+        "name": "insert_system2_rack1",
+        "system": 2,
+        "output": "Recorded_file/SYSTEM2/INSERT/insert_system2_rack1.json",
+        "params": {"rack_offset": [0, 0, 0]},
+        "waypoints": {"home": [59, 608.9, -6.4, 6.7, 1, 173.1]},
+        "steps": [
+            {"pose": "home", "speed": 95},
+            {"pose": [115.5, 654.4, 54.9, 16.6, 0.7, 175], "speed": 95, "rack": true},
+            {"gripper": "open"},
+            {"sleep": 0.5},
+            {"tool_move": {"dz": 30}, "speed": 10},
+            {"linear": [81.9, 598.3, 133, 89.9, -20.7, 86.8], "speed": 60},
+            {"joints": [93.6, 4.4, 34.3, -46.8, 2.9, 137.2], "speed": 50},
+            {"rotate_joint": [6, -90], "speed": 50}
+        ]
+    }
+
+Step kinds:
+    pose          Cartesian target (or waypoint name), solved by IK -> "move"
+    linear        Cartesian straight-line target -> "linear_move"
+    joints        absolute joint target -> "move"
+    rotate_joint  [joint number, delta deg] from the previous joint target -> "move"
+    tool_move     tool-frame delta {dx, dy, dz, droll, dpitch, dyaw} -> "tool_move"
+    gripper       "open" / "close" -> "gripper_open" / "gripper_close"
+    sleep         dwell in seconds -> "sleep"
+
+Steps marked "rack": true are shifted by params.rack_offset, so the same
+spec serves every rack by changing one parameter (rack_frames.py generalises
+this to fitted per-rack rigid transforms). IK goes through
+kinematics.IKSolver, which answers from its on-disk cache and only
+connects to the arm for poses it has never solved.
+
+The cache can be filled without the arm from an existing recording of the
+same spec: the recorder scripts solved each pose on the controller and
+logged the joints they moved to, in step order. `seed` pairs the spec's
+pose steps with the recording's moves, checks that the pairing is
+consistent (same number of moves, matching joint steps, and one rigid
+transform mapping the spec poses onto the recorded joints' forward
+kinematics within SEED_MAX_RMS_MM) and stores the joints twice: per pose
+in the system's IK cache, for other specs and rack frames, and per step in
+ik_cache/seeds/<spec name>.json. A recording can reach the same pose with
+different joints at different steps (either wrist branch, or a few degrees
+apart where J4 and J6 trade off near the wrist singularity), so compile
+uses a step's seeded joints whenever the step still resolves to the seeded
+pose and reproduces the recording. ik_cache/ holds the seeds of the
+shipped specs, so they compile with --offline.
+
+Compiled files go to the spec's "output" (compiled/ for imported specs) or
+to the directory given with --out.
+
+Usage:
+    python teach_compiler.py compile teach_specs/*.json [--arm-ip IP] [--offline] [--out DIR]
+    python teach_compiler.py import insert_system2_rack1.py ... [--out-dir teach_specs]
+    python teach_compiler.py seed teach_specs/tap_system2_rack1.json Recorded_file/SYSTEM2/TAP/tap_system2_rack1.json
+"""
+
+import os
+import ast
+import json
+import logging
+from lazy_imports import lazy
+from kinematics import IKSolver, IKError, fit_rigid_transform, link_points, pose_key, unwrap_to, within_limits
+from config import SYSTEMS
+
+np = lazy("numpy")
+
+COMPILED_DIR = "compiled"   # default output folder, never overwrites recordings
+IK_CACHE_DIR = "ik_cache"   # one IK cache file per system
+SEEDS_DIR = os.path.join(IK_CACHE_DIR, "seeds")   # per-step joints of seeded specs
+SEED_MAX_RMS_MM = 5.0       # spec poses vs recorded joints' forward kinematics (TCP offset not modelled)
+JOINT_STEPS = ("pose", "joints", "rotate_joint")   # spec steps that compile to a joint move
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+def load_spec(path):
+    """Load a teach spec from JSON or YAML"""
+    with open(path, "r") as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError("PyYAML is required for YAML teach specs")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _offset(pose, offset):
+    return [v + d for v, d in zip(pose[:3], offset)] + list(pose[3:])
+
+
+def compile_spec(spec, solver, params=None, seeds=None):
+    """
+    Compile a teach spec into a playback step list.
+    `params` overrides the spec's own params (e.g. a different rack_offset).
+    `seeds` are per-step recorded joints (load_seeds()), used for the steps
+    whose pose still matches. Raises IKError / ValueError with the failing
+    step number.
+    """
+    merged = dict(spec.get("params", {}), **(params or {}))
+    rack_offset = merged.get("rack_offset", [0, 0, 0])
+    waypoints = spec.get("waypoints", {})
+
+    def resolve(target, step):
+        pose = waypoints[target] if isinstance(target, str) else target
+        return _offset(pose, rack_offset) if step.get("rack") else list(pose)
+
+    if hasattr(solver, "prefetch"):
+        # All IK cache misses of the spec in one pipelined batch
+        solver.prefetch([resolve(s["pose"], s) for s in spec["steps"]
+                         if "pose" in s and (not isinstance(s["pose"], str) or s["pose"] in waypoints)])
+
+    steps = []
+    last_joints = None
+    for i, step in enumerate(spec["steps"]):
+        speed = step.get("speed", spec.get("default_speed", 20))
+        try:
+            if "pose" in step:
+                pose = resolve(step["pose"], step)
+                seed = (seeds or {}).get(str(i + 1))
+                if seed is not None and seed["pose"] == pose_key(pose):
+                    joints = unwrap_to(seed["joints"], last_joints)
+                    if not within_limits(joints):
+                        raise IKError(f"Seeded joints of pose {pose} are out of joint range")
+                    last_joints = joints
+                else:
+                    last_joints = solver.solve(pose, last_joints)
+                steps.append({"type": "move", "joints": last_joints, "speed": speed})
+            elif "linear" in step:
+                steps.append({"type": "linear_move", "cartesian": resolve(step["linear"], step), "speed": speed})
+            elif "joints" in step:
+                last_joints = [float(a) for a in step["joints"]]
+                steps.append({"type": "move", "joints": last_joints, "speed": speed})
+            elif "rotate_joint" in step:
+                if last_joints is None:
+                    raise ValueError("rotate_joint needs a previous joint target")
+                joint, delta = step["rotate_joint"]
+                last_joints = list(last_joints)
+                last_joints[joint - 1] += delta
+                steps.append({"type": "move", "joints": last_joints, "speed": speed})
+            elif "tool_move" in step:
+                move = {"type": "tool_move", "dx": 0, "dy": 0, "dz": 0}
+                move.update(step["tool_move"])
+                move["speed"] = step.get("speed", 10)
+                steps.append(move)
+            elif "gripper" in step:
+                # Dwell is an explicit sleep step, like in the recordings
+                steps.append({"type": f"gripper_{step['gripper']}", "delay": 0})
+            elif "sleep" in step:
+                steps.append({"type": "sleep", "duration": step["sleep"]})
+            else:
+                raise ValueError(f"unknown step {step}")
+        except (IKError, ValueError, KeyError) as e:
+            raise type(e)(f"{spec.get('name')}: step {i+1}: {e}") from e
+    return steps
+
+
+def spec_name(spec, path):
+    return spec.get("name") or os.path.splitext(os.path.basename(path))[0]
+
+
+def load_seeds(name, seeds_dir=SEEDS_DIR):
+    """Per-step seeded joints of a spec ({step number: {"pose", "joints"}}), {} if not seeded"""
+    path = os.path.join(seeds_dir, f"{name}.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)["steps"]
+
+
+def compile_file(path, solver, params=None, output=None, seeds_dir=SEEDS_DIR):
+    """Compile one spec file and write its playback JSON. Returns the output path."""
+    spec = load_spec(path)
+    name = spec_name(spec, path)
+    steps = compile_spec(spec, solver, params, load_seeds(name, seeds_dir))
+    output = output or spec.get("output") or os.path.join(COMPILED_DIR, f"{name}.json")
+    out_dir = os.path.dirname(output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({name: steps}, f, indent=4)
+    logging.info(f"Compiled {path} -> {output} ({len(steps)} steps)")
+    return output
+
+
+def seed_cache(spec, recording, solver, params=None):
+    """
+    Store the controller's IK answers logged in `recording` (its step list)
+    for the pose steps of `spec`. Raises ValueError when the recording is
+    not a run of this spec. Returns (number of poses added to the cache,
+    per-step seeds for compile_spec()).
+    """
+    from warm_start import steps_of
+
+    merged = dict(spec.get("params", {}), **(params or {}))
+    rack_offset = merged.get("rack_offset", [0, 0, 0])
+    waypoints = spec.get("waypoints", {})
+    targets = [(i, s) for i, s in enumerate(spec["steps"]) if any(k in s for k in JOINT_STEPS)]
+    moves = [s for s in steps_of(recording) if s.get("type") == "move"]
+    if len(targets) != len(moves):
+        raise ValueError(f"{len(targets)} joint moves in the spec, {len(moves)} in the recording")
+
+    pairs, seeds = {}, {}
+    for n, ((i, step), move) in enumerate(zip(targets, moves)):
+        joints = [float(a) for a in move["joints"][:6]]
+        if "joints" in step and max(abs(a - b) for a, b in zip(step["joints"], joints)) > 0.5:
+            raise ValueError(f"joint move {n+1} differs from the recording")
+        if "pose" in step:
+            pose = waypoints[step["pose"]] if isinstance(step["pose"], str) else step["pose"]
+            pose = _offset(pose, rack_offset) if step.get("rack") else list(pose)
+            pairs[pose_key(pose)] = (pose, joints)
+            seeds[str(i + 1)] = {"pose": pose_key(pose), "joints": joints}
+    if len(pairs) >= 3:
+        src = np.array([pose[:3] for pose, _ in pairs.values()], dtype=float)
+        dst = np.array([link_points(joints)[0][-1] for _, joints in pairs.values()])
+        rms = fit_rigid_transform(src, dst)[2]
+        if rms > SEED_MAX_RMS_MM:
+            raise ValueError(f"poses do not match the recorded joints ({rms:.1f} mm residual)")
+
+    added = 0
+    for key, (pose, joints) in pairs.items():
+        known = solver.cache.get(key)
+        if known is None:
+            solver.cache[key] = joints
+            added += 1
+        elif np.linalg.norm(link_points(known)[0][-1] - link_points(joints)[0][-1]) > SEED_MAX_RMS_MM:
+            # other runs of the same pose land within a millimetre, on either wrist branch
+            logging.warning(f"Pose {pose}: keeping the cached solution {known}, recording has {joints}")
+    return added, seeds
+
+
+# === Import of the legacy recorder scripts ===
+_RECORDER_CALLS = {
+    "move_to_cartesian": ("pose", 20),
+    "move_to_cartesian2": ("linear", 20),
+    "move_to_joints": ("joints", 20),
+    "move_along_tool_z": ("tool_z", 10),
+    "move_along_tool_x": ("tool_x", 10),
+    "move_tool_relative": ("tool", 20),
+    "rotate_joint": ("rotate_joint", 20),
+    "open_gripper": ("gripper_open", None),
+    "close_gripper": ("gripper_close", None),
+    "timed_sleep": ("sleep", None),
+}
+
+
+def _call_args(call):
+    args = [ast.literal_eval(a) for a in call.args]
+    kwargs = {k.arg: ast.literal_eval(k.value) for k in call.keywords if k.arg}
+    return args, kwargs
+
+
+def _recorder_step(name, args, kwargs):
+    kind, default_speed = _RECORDER_CALLS[name]
+    speed = kwargs.get("speed", default_speed)
+    if kind in ("pose", "linear", "joints"):
+        return {kind: [float(v) for v in args[0]], "speed": args[1] if len(args) > 1 else speed}
+    if kind == "tool_z":
+        return {"tool_move": {"dz": args[0]}, "speed": args[1] if len(args) > 1 else speed}
+    if kind == "tool_x":
+        return {"tool_move": {"dx": args[0]}, "speed": args[1] if len(args) > 1 else speed}
+    if kind == "tool":
+        names = ["dx", "dy", "dz", "droll", "dpitch", "dyaw"]
+        delta = dict(zip(names, args))
+        delta.update({k: v for k, v in kwargs.items() if k in names})
+        return {"tool_move": {k: v for k, v in delta.items() if v}, "speed": speed}
+    if kind == "rotate_joint":
+        return {"rotate_joint": [args[0], args[1]], "speed": args[2] if len(args) > 2 else speed}
+    if kind == "sleep":
+        return {"sleep": args[0] if args else kwargs.get("duration", 0)}
+    return {"gripper": kind.split("_")[1]}
+
+
+def import_recorder(script_path, system=None):
+    """
+    Turn a legacy recorder script into a teach spec by reading the motion
+    calls of its recording function in source order (commented-out calls
+    are ignored). The arm is never contacted.
+    """
+    with open(script_path, "r") as f:
+        tree = ast.parse(f.read(), filename=script_path)
+
+    recorders = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name != "main" and node.name.split("_")[0] in ("insert", "tap", "swipe"):
+            recorders.append(node)
+    if not recorders:
+        raise ValueError(f"No recording function found in {script_path}")
+
+    steps = []
+    for stmt in recorders[0].body:
+        if not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call)):
+            continue
+        func = stmt.value.func
+        name = func.id if isinstance(func, ast.Name) else None
+        if name not in _RECORDER_CALLS:
+            continue
+        args, kwargs = _call_args(stmt.value)
+        steps.append(_recorder_step(name, args, kwargs))
+
+    name = os.path.splitext(os.path.basename(script_path))[0]
+    if system is None:
+        # The arm the script recorded on identifies the system
+        for node in tree.body:
+            if (isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant)
+                    and any(isinstance(t, ast.Name) and t.id == "xarm_ip" for t in node.targets)):
+                for sys_id, cfg in SYSTEMS.items():
+                    if cfg["arm_ip"] == node.value.value:
+                        system = sys_id
+    return {
+        "name": name,
+        "system": system,
+        "source": os.path.basename(script_path),
+        "output": os.path.join(COMPILED_DIR, f"{name}.json"),
+        "params": {"rack_offset": [0, 0, 0]},
+        "steps": steps,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [TEACH] %(message)s")
+    parser = argparse.ArgumentParser(description="Compile teach specs or import recorder scripts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_compile = sub.add_parser("compile", help="compile teach specs to playback JSON")
+    p_compile.add_argument("specs", nargs="+")
+    p_compile.add_argument("--arm-ip", help="arm used for IK cache misses (default: the spec's system)")
+    p_compile.add_argument("--offline", action="store_true", help="fail on IK cache misses instead of connecting")
+    p_compile.add_argument("--ik-cache-dir", default=IK_CACHE_DIR, help="one IK cache file per system")
+    p_compile.add_argument("--rack-offset", nargs=3, type=float, help="override params.rack_offset")
+    p_compile.add_argument("--out", metavar="DIR", help="write DIR/<name>.json instead of the spec's output")
+
+    p_import = sub.add_parser("import", help="convert recorder scripts into teach specs")
+    p_import.add_argument("scripts", nargs="+")
+    p_import.add_argument("--out-dir", default="teach_specs")
+
+    p_seed = sub.add_parser("seed", help="fill the IK cache from recordings of specs")
+    p_seed.add_argument("pairs", nargs="+", metavar="SPEC RECORDING")
+    p_seed.add_argument("--ik-cache-dir", default=IK_CACHE_DIR)
+
+    args = parser.parse_args()
+
+    if args.command == "import":
+        os.makedirs(args.out_dir, exist_ok=True)
+        for script in args.scripts:
+            spec = import_recorder(script)
+            out = os.path.join(args.out_dir, f"{spec['name']}.json")
+            with open(out, "w") as f:
+                json.dump(spec, f, indent=2)
+            print(f"{script} -> {out} ({len(spec['steps'])} steps)")
+    elif args.command == "seed":
+        if len(args.pairs) % 2:
+            parser.error("seed takes SPEC RECORDING pairs")
+        os.makedirs(args.ik_cache_dir, exist_ok=True)
+        solvers = {}
+        failed = 0
+        for spec_path, recording_path in zip(args.pairs[::2], args.pairs[1::2]):
+            spec = load_spec(spec_path)
+            system = spec.get("system")
+            if system not in solvers:
+                solvers[system] = IKSolver(cache_file=os.path.join(args.ik_cache_dir, f"system{system}.json"))
+            with open(recording_path, "r") as f:
+                recording = json.load(f)
+            try:
+                added, seeds = seed_cache(spec, recording, solvers[system])
+                seeds_dir = os.path.join(args.ik_cache_dir, "seeds")
+                os.makedirs(seeds_dir, exist_ok=True)
+                with open(os.path.join(seeds_dir, f"{spec_name(spec, spec_path)}.json"), "w") as f:
+                    json.dump({"recording": recording_path, "steps": seeds}, f, indent=1)
+                print(f"{spec_path}: {added} poses, {len(seeds)} steps from {recording_path}")
+            except ValueError as e:
+                failed += 1
+                logging.error(f"{spec_path}: not seeded from {recording_path}: {e}")
+        for solver in solvers.values():
+            solver.save()
+        raise SystemExit(1 if failed else 0)
+    else:
+        params = {"rack_offset": args.rack_offset} if args.rack_offset else None
+        solvers = {}
+        failed = 0
+        for path in args.specs:
+            spec = load_spec(path)
+            system = spec.get("system")
+            if system not in solvers:
+                # IK depends on each arm's TCP setup, so caches are per system
+                arm_ip = None if args.offline else (args.arm_ip or SYSTEMS.get(system, {}).get("arm_ip"))
+                os.makedirs(args.ik_cache_dir, exist_ok=True)
+                cache_file = os.path.join(args.ik_cache_dir, f"system{system}.json")
+                solvers[system] = IKSolver(arm_ip=arm_ip, cache_file=cache_file)
+            output = os.path.join(args.out, f"{spec_name(spec, path)}.json") if args.out else None
+            try:
+                compile_file(path, solvers[system], params, output,
+                             seeds_dir=os.path.join(args.ik_cache_dir, "seeds"))
+            except (IKError, ValueError) as e:
+                failed += 1
+                logging.error(str(e))
+        for solver in solvers.values():
+            solver.close()
+        raise SystemExit(1 if failed else 0)
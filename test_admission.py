@@ -0,0 +1,66 @@
+"""
+Tests for admission.py: refusals at capacity and above the wait limit,
+predicted waits and ETAs of a system's queue.
+
+    python -m pytest -q test_admission.py
+"""
+
+import pytest
+import admission
+from admission import QueueFullError, admit, etas, is_stale, predict_duration
+
+NOW = 1000.0
+LIMITS = {"capacity": 2, "max_wait": 100, "shed_after": 60,
+          "default_task_s": {"pin_only": 20, "default": 40}}
+
+
+def job(job_id, status="queued", predicted=30, started=None, queued=NOW):
+    meta = {"job_id": job_id, "status": status, "predicted_s": predicted, "queued_at": queued}
+    if started is not None:
+        meta["started_at"] = started
+    return meta
+
+
+def test_wait_is_running_remainder_plus_queue():
+    active = [job("run", "running", predicted=30, started=NOW - 10), job("q1")]
+    assert admit(2, active, NOW, LIMITS) == 50.0
+
+
+def test_full_queue_is_refused_with_429():
+    active = [job("run", "running", predicted=30, started=NOW - 10), job("q1", predicted=10), job("q2", predicted=10)]
+    with pytest.raises(QueueFullError) as e:
+        admit(2, active, NOW, LIMITS)
+    assert (e.value.status, e.value.estimated_wait, e.value.retry_after) == (429, 40.0, 20.0)
+
+
+def test_long_wait_is_refused_with_503():
+    active = [job("run", "running", predicted=130, started=NOW - 10)]
+    with pytest.raises(QueueFullError) as e:
+        admit(2, active, NOW, LIMITS)
+    assert (e.value.status, e.value.estimated_wait, e.value.retry_after) == (503, 120.0, 20.0)
+
+
+def test_limits_off():
+    active = [job(str(i), predicted=60) for i in range(10)]
+    assert admit(2, active, NOW, dict(LIMITS, capacity=None, max_wait=None)) == 600.0
+
+
+def test_etas_put_the_running_job_first():
+    active = [job("q1", predicted=20), job("run", "running", predicted=30, started=NOW - 10),
+              job("done", "completed"), job("q2", predicted=5)]
+    assert etas(active, NOW) == {"run": (0.0, 20.0), "q1": (20.0, 40.0), "q2": (40.0, 45.0)}
+
+
+def test_stale_only_when_queued_past_the_limit():
+    assert is_stale(job("old", queued=NOW - 61), NOW, LIMITS)
+    assert not is_stale(job("new", queued=NOW - 59), NOW, LIMITS)
+    assert not is_stale(job("run", "running", queued=NOW - 600), NOW, LIMITS)
+    assert not is_stale(job("old", queued=NOW - 600), NOW, dict(LIMITS, shed_after=None))
+
+
+def test_predicted_duration_falls_back_to_the_action_default(monkeypatch):
+    monkeypatch.setattr(admission, "duration_model", None)
+    meta = {"action": "pin_only"}
+    assert predict_duration(None, meta, LIMITS) == 20
+    assert meta["base_s"] is None
+    assert predict_duration(None, {"action": "tap"}, LIMITS) == 40
@@ -0,0 +1,65 @@
+"""
+Tests for approach_speed.split_approaches on hand-built sequences.
+
+    python -m pytest -q test_approach_speed.py
+"""
+
+import copy
+from approach_speed import split_approaches
+
+HOME = [0.0] * 6
+ABOVE = [90.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+NEAR = [95.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+
+def move(joints, speed):
+    return {"type": "move", "joints": list(joints), "speed": speed}
+
+
+def test_slow_press_gets_a_fast_transit():
+    steps = [move(HOME, 50), move(ABOVE, 20), move(HOME, 50)]
+    out, changes = split_approaches(steps)
+    assert [c["step"] for c in changes] == [2]
+    assert out[1] == move([82.0, 0.0, 0.0, 0.0, 0.0, 0.0], 180)   # final_deg (8) short, at transit_speed
+    assert out[2] == move(ABOVE, 20)
+    assert out[3] == move(HOME, 50)   # the retract from the target is left alone
+
+
+def test_fast_grasp_gets_a_capped_final_approach():
+    steps = [move(HOME, 50), move(ABOVE, 95), {"type": "gripper_close", "delay": 0}]
+    out, changes = split_approaches(steps, "tap")   # final_deg 10, final_speed 50
+    assert len(changes) == 1
+    assert out[1] == move([80.0, 0.0, 0.0, 0.0, 0.0, 0.0], 180)
+    assert out[2] == move(ABOVE, 50)
+    assert out[3]["type"] == "gripper_close"
+
+
+def test_first_move_short_move_and_free_moves_are_kept():
+    steps = [
+        move(ABOVE, 20),          # first move: start pose unknown
+        move(NEAR, 20),           # 5 deg, under min_deg
+        move(HOME, 100),          # free move, nothing follows
+    ]
+    out, changes = split_approaches(steps)
+    assert changes == [] and out == steps
+
+
+def test_move_after_a_gripper_step_is_not_split():
+    steps = [move(HOME, 50), {"type": "gripper_open", "delay": 0}, move(ABOVE, 20)]
+    _, changes = split_approaches(steps)
+    assert changes == []
+
+
+def test_move_after_a_tool_move_has_no_known_start():
+    steps = [move(HOME, 50), {"type": "tool_move", "dz": 10, "speed": 10},
+             {"type": "sleep", "duration": 0.5}, move(ABOVE, 20)]
+    _, changes = split_approaches(steps)
+    assert changes == []
+
+
+def test_input_is_not_modified():
+    steps = [move(HOME, 50), move(ABOVE, 20), move(HOME, 50)]
+    before = copy.deepcopy(steps)
+    out, _ = split_approaches(steps)
+    assert steps == before
+    assert all(a is not b for a, b in zip(out, steps))
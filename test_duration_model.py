@@ -0,0 +1,56 @@
+"""
+Tests for duration_model.py: calibration from measured runs and the
+debounced, atomic calibration file.
+
+    python -m pytest -q test_duration_model.py
+"""
+
+import json
+import time
+import pytest
+from config import DURATION_MODEL
+from duration_model import DurationModel
+
+META = {"action": "tap"}
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    monkeypatch.setitem(DURATION_MODEL, "save_interval", 0.05)
+    monkeypatch.setitem(DURATION_MODEL, "min_samples", 2)
+    return tmp_path / "duration_model.json"
+
+
+def test_ratio_is_used_after_min_samples(path):
+    model = DurationModel(str(path))
+    model.observe(2, META, 20.0, base=10.0)
+    assert model.predict(2, META, 10.0, 30.0) == 10.0
+    model.observe(2, META, 20.0, base=10.0)
+    assert model.predict(2, META, 12.0, 30.0) == 24.0
+    assert model.predict(2, {"action": "insert"}, None, 30.0) == 30.0
+
+
+def test_seconds_without_base_estimate(path):
+    model = DurationModel(str(path))
+    for _ in range(2):
+        model.observe(2, {}, 8.0)
+    assert model.predict(2, {}, None, 30.0) == 8.0
+
+
+def test_runs_are_written_once_per_interval(path, monkeypatch):
+    model = DurationModel(str(path))
+    model.observe(2, META, 20.0, base=10.0)
+    model.observe(2, META, 20.0, base=10.0)
+    assert not path.exists()   # not on the worker's thread
+    time.sleep(0.3)
+    assert json.loads(path.read_text())["2"]["tap"]["n"] == 2
+    assert not (path.parent / "duration_model.json.tmp").exists()
+
+
+def test_flush_writes_now_and_survives_restart(path, monkeypatch):
+    monkeypatch.setitem(DURATION_MODEL, "save_interval", 60)
+    model = DurationModel(str(path))
+    model.observe(2, META, 20.0, base=10.0)
+    model.flush()
+    assert model._timer is None
+    assert DurationModel(str(path)).calibration == model.calibration
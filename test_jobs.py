@@ -0,0 +1,98 @@
+"""
+Tests for the job registry of armsideclient.py: duplicate folding, queue
+shedding and the cancellation of queued tasks on shutdown. No worker
+threads or arms are started.
+
+    python -m pytest -q test_jobs.py
+"""
+
+import os
+import sys
+import queue
+from collections import OrderedDict
+import pytest
+
+try:
+    import xarm  # noqa: F401
+except ImportError:
+    # Outside my_env: use the vendored copy, after anything installed
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "my_env", "lib", "python3.10", "site-packages"))
+
+import armsideclient
+from admission import limits_for
+
+SYSTEM = 2
+SEQUENCE = [{"type": "move", "joints": [0.0] * 6, "speed": 50}]
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(armsideclient, "task_queues", {SYSTEM: queue.Queue()})
+    monkeypatch.setattr(armsideclient, "worker_threads", {})
+    monkeypatch.setattr(armsideclient, "arm_connections", {})
+    monkeypatch.setattr(armsideclient, "jobs", OrderedDict())
+    monkeypatch.setattr(armsideclient, "active_jobs", {})
+    monkeypatch.setattr(armsideclient, "dedup_index", {})
+    monkeypatch.setattr(armsideclient, "idempotency_index", OrderedDict())
+    monkeypatch.setattr(armsideclient, "journal", None)
+    monkeypatch.setattr(armsideclient, "duration_model", None)
+    monkeypatch.setattr(armsideclient, "shutting_down", armsideclient.threading.Event())
+    monkeypatch.setattr("admission.duration_model", None)
+
+
+def _submit(rack=1, **kw):
+    meta = {"action": "insert", "rack": rack}
+    return armsideclient.submit_task(SYSTEM, SEQUENCE, None, meta, **kw)
+
+
+def test_duplicate_submission_is_folded():
+    first, created = _submit()
+    again, created_again = _submit()
+    assert created and not created_again and again is first
+    assert first["duplicates"] == 1
+    assert armsideclient.task_queues[SYSTEM].qsize() == 1
+
+    other, created_other = _submit(rack=2)
+    assert created_other and other is not first
+
+
+def test_idempotency_key_folds_different_content():
+    first, _ = _submit(idempotency_key="k1")
+    again, created = _submit(rack=2, idempotency_key="k1")
+    assert again is first and not created
+
+
+def test_stale_queued_jobs_are_shed():
+    old, _ = _submit()
+    old["queued_at"] -= 100
+    limits = dict(limits_for(SYSTEM), shed_after=60)
+    with armsideclient.jobs_lock:
+        armsideclient._shed_stale_locked(SYSTEM, armsideclient.time.time(), limits)
+    assert old["status"] == "expired"
+    assert old["job_id"] not in armsideclient.active_jobs[SYSTEM]
+    # no longer a fold target: the same task is queued again
+    fresh, created = _submit()
+    assert created and fresh is not old
+
+
+def test_shutdown_cancels_queued_jobs_at_once():
+    done = []
+    metas = [_submit(rack=r, on_done=done.append)[0] for r in (1, 2, 3)]
+    armsideclient.shutdown_systems(timeout=0)
+
+    assert [m["status"] for m in metas] == ["cancelled"] * 3
+    assert done == metas
+    assert all(m["done"].is_set() for m in metas)
+    assert armsideclient.active_jobs[SYSTEM] == {}
+    # only the worker's stop sentinel is left
+    assert armsideclient.task_queues[SYSTEM].get_nowait() == (None, None, {})
+    assert armsideclient.task_queues[SYSTEM].empty()
+
+
+def test_submission_after_shutdown_is_cancelled():
+    armsideclient.shutdown_systems(timeout=0)
+    armsideclient.task_queues[SYSTEM].get_nowait()   # the stop sentinel
+    meta, created = _submit()
+    assert created and meta["status"] == "cancelled" and meta["done"].is_set()
+    assert armsideclient.task_queues[SYSTEM].empty()
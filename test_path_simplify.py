@@ -0,0 +1,53 @@
+"""
+Regression tests for path_simplify.py on the shipped recordings: taught
+dwells around contact must survive the pass.
+
+    python -m pytest -q test_path_simplify.py
+"""
+
+import json
+import pytest
+from path_simplify import simplify
+from warm_start import steps_of
+
+RECORDINGS = [
+    "Recorded_file/SYSTEM3/TAP/tap_system3_rack1.json",
+    "Recorded_file/SYSTEM2/TAP/tap_system2_rack1.json",
+    "Recorded_file/SYSTEM2/INSERT_HALF/insert_system2_rack1_down.json",
+    "Recorded_file/SYSTEM1/TAP/tap_system1_rack1.json",
+]
+
+
+def _load(path):
+    with open(path, "r") as f:
+        return steps_of(json.load(f))
+
+
+def _sleep_total(steps):
+    return round(sum(s.get("duration", 0) for s in steps if s.get("type") == "sleep"), 3)
+
+
+@pytest.mark.parametrize("path", RECORDINGS)
+def test_dwells_kept(path):
+    steps = _load(path)
+    simplified, changes = simplify(steps)
+    assert _sleep_total(simplified) == _sleep_total(steps)
+    assert not [c for c in changes if c["change"] == "removed" and "sleep" in c["reason"]]
+
+
+def test_hold_on_reader_kept():
+    # step 12: 5 s with the card on the reader after a tap move at speed 75
+    steps = _load("Recorded_file/SYSTEM3/TAP/tap_system3_rack1.json")
+    assert steps[11] == {**steps[11], "type": "sleep", "duration": 5}
+    simplified, _ = simplify(steps)
+    assert any(s.get("type") == "sleep" and s.get("duration") == 5 for s in simplified)
+
+
+def test_tagged_contact_protected_when_dropping_free_sleeps():
+    steps = _load("Recorded_file/SYSTEM2/TAP/tap_system2_rack1.json")
+    for i in (15, 17):   # steps 16 and 18, around the 1.5 s and 0.5 s dwells
+        steps[i] = dict(steps[i], contact=True)
+    simplified, _ = simplify(steps, {"drop_free_space_sleeps": True})
+    durations = [s.get("duration") for s in simplified if s.get("type") == "sleep"]
+    assert 1.5 in durations
+    assert 1.0 in durations   # steps 19 and 20 merged, same total
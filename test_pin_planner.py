@@ -0,0 +1,48 @@
+"""
+Regression tests for pin_planner.py on the shipped keypad recordings: the
+planned PIN path presses the same key poses as the recording, at the
+recorded contact speed, dwell and settle delays.
+
+    python -m pytest -q test_pin_planner.py
+"""
+
+import pytest
+from config import SYSTEMS, PIN_PLANNER
+from pin_planner import KeypadModel, load_pin_steps
+
+PIN_FILES = sorted({s["devices"]["pin_entry"] for s in SYSTEMS.values() if s.get("devices", {}).get("pin_entry")})
+DIGITS = "1234567890"
+
+
+def _contacts(steps):
+    """(joints, speed, delay) of the slowest move of each key and the dwells"""
+    moves = [s for s in steps if s.get("type") == "move"]
+    press = min(moves[1:], key=lambda s: s["speed"])
+    dwell = sum(s.get("duration", 0) for s in steps if s.get("type") == "sleep")
+    return press["joints"], press["speed"], press.get("delay"), round(dwell, 3)
+
+
+def test_planner_is_off_by_default():
+    assert PIN_PLANNER["enabled"] is False
+
+
+@pytest.mark.parametrize("path", PIN_FILES)
+def test_planned_keys_match_recording(path):
+    recorded = load_pin_steps(path)
+    model = KeypadModel(recorded)
+    for key in DIGITS:
+        if key not in model.segments:
+            continue
+        assert _contacts(model.segments[key]) == _contacts(recorded["buttons"][key])
+        for ours in model.segments[key]:
+            if ours["type"] == "move":
+                assert "delay" in ours
+
+
+@pytest.mark.parametrize("path", PIN_FILES)
+def test_plan_presses_every_digit_in_order(path):
+    model = KeypadModel(load_pin_steps(path))
+    pin = "".join(k for k in "2580" if k in model.segments)
+    plan = model.plan(pin)
+    presses = [s["joints"] for s in plan if s.get("type") == "move" and s["speed"] <= 10]
+    assert presses == [model.centres[k] for k in pin]
@@ -0,0 +1,71 @@
+"""
+Tests for prepositioning.Stager on a fake arm: staging, settling before a
+task and the home move after it.
+
+    python -m pytest -q test_prepositioning.py
+"""
+
+import pytest
+from checkpoints import MotionError
+from prepositioning import Stager, staging_pose
+
+HOME = [90.0, 0.0, 30.0, 0.0, 30.0, 0.0]
+ENTRY = [130.0, 20.0, 50.0, 0.0, 30.0, 0.0]
+
+
+class FakeArm:
+    def __init__(self, home_code=0):
+        self.log = []
+        self.home_code = home_code
+        self.error_code = 0
+        self.moving = False
+
+    def set_servo_angle(self, angle=None, speed=None, wait=True, **kw):
+        self.log.append(("move", list(angle), wait))
+        self.moving = not wait
+        if wait and angle == HOME and self.home_code:
+            self.error_code = 31
+            return self.home_code
+        return 0
+
+    def get_is_moving(self):
+        return self.moving
+
+    def set_state(self, state=0):
+        self.log.append(("state", state))
+        if state == 4:
+            self.moving = False
+        return 0
+
+
+def test_settle_stops_the_staging_move_and_goes_home():
+    arm = FakeArm()
+    stager = Stager(arm)
+    assert stager.stage(1, HOME, ENTRY)
+    stager.settle(keep=False)
+    assert arm.log == [("move", staging_pose(HOME, ENTRY), False), ("state", 4), ("state", 0),
+                       ("move", HOME, True)]
+    assert stager.home is None
+
+
+def test_settle_keeps_the_staging_line_for_the_predicted_task():
+    arm = FakeArm()
+    stager = Stager(arm)
+    stager.stage(1, HOME, ENTRY)
+    stager.settle(keep=True)
+    assert ("move", HOME, True) not in arm.log
+
+
+def test_settle_without_staging_does_nothing():
+    arm = FakeArm()
+    Stager(arm).settle(keep=False)
+    assert arm.log == []
+
+
+def test_failed_home_move_raises():
+    arm = FakeArm(home_code=1)
+    stager = Stager(arm)
+    stager.stage(1, HOME, ENTRY)
+    with pytest.raises(MotionError) as e:
+        stager.settle(keep=False)
+    assert e.value.error_code == 31
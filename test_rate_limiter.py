@@ -0,0 +1,75 @@
+"""
+Tests for rate_limiter.TokenBucketLimiter on an explicit clock.
+
+    python -m pytest -q test_rate_limiter.py
+"""
+
+import pytest
+from config import SYSTEMS
+from rate_limiter import TokenBucketLimiter
+
+LIMITS = {"payment_action": {"capacity": 2, "per_seconds": 10}}   # 2 per 10 s, refill 0.2/s
+
+
+def test_burst_then_retry_after():
+    limiter = TokenBucketLimiter(LIMITS)
+    assert limiter.allow("c", 2, "payment_action", now=0.0) == (True, 0.0)
+    assert limiter.allow("c", 2, "payment_action", now=0.0) == (True, 0.0)
+    allowed, retry_after = limiter.allow("c", 2, "payment_action", now=1.0)
+    assert not allowed and retry_after == pytest.approx(4.0)
+    assert limiter.allow("c", 2, "payment_action", now=4.9)[0] is False
+    assert limiter.allow("c", 2, "payment_action", now=5.0) == (True, 0.0)
+
+
+def test_buckets_are_per_client_system_and_endpoint():
+    limiter = TokenBucketLimiter({"payment_action": {"capacity": 1, "per_seconds": 60}})
+    assert limiter.allow("c", 2, "payment_action", now=0.0)[0]
+    assert not limiter.allow("c", 2, "payment_action", now=0.0)[0]
+    assert limiter.allow("other", 2, "payment_action", now=0.0)[0]
+    assert limiter.allow("c", 3, "payment_action", now=0.0)[0]
+    # endpoints without a limit are never refused
+    assert all(limiter.allow("c", 2, "status", now=0.0)[0] for _ in range(10))
+
+
+def test_system_override(monkeypatch):
+    monkeypatch.setitem(SYSTEMS[3], "rate_limits", {"payment_action": {"capacity": 5, "per_seconds": 1}})
+    limiter = TokenBucketLimiter(LIMITS)
+    assert limiter.limit_for(3, "payment_action") == (5.0, 5.0)
+    assert limiter.limit_for(2, "payment_action") == (2.0, 0.2)
+    assert sum(limiter.allow("c", 3, "payment_action", now=0.0)[0] for _ in range(6)) == 5
+
+
+def test_full_buckets_are_evicted():
+    limiter = TokenBucketLimiter(LIMITS, shards=1)
+    for client in range(10):
+        limiter.allow(client, 2, "payment_action", now=0.0)
+    assert limiter.size() == 10
+    # 5 s later each bucket holds 2 tokens again, the same as a fresh one
+    limiter.allow("late", 2, "payment_action", now=5.0)
+    assert limiter.size() == 1
+
+
+def test_shard_size_is_capped():
+    limiter = TokenBucketLimiter(LIMITS, shards=1, max_entries_per_shard=3)
+    for client in range(10):
+        limiter.allow(client, 2, "payment_action", now=0.0)
+    assert limiter.size() == 4   # the cap plus the bucket just added
+    # the least recently used buckets went first
+    assert list(limiter._shards[0].buckets) == [(c, 2, "payment_action") for c in range(6, 10)]
+
+
+@pytest.mark.parametrize("cfg", [
+    {"capacity": 0.5, "per_seconds": 10},
+    {"capacity": 1, "per_seconds": 0},
+    {"capacity": 1},
+    {"capacity": "many", "per_seconds": 10},
+])
+def test_bad_limits_fail_at_startup(cfg):
+    with pytest.raises(ValueError, match="Rate limit 'payment_action'"):
+        TokenBucketLimiter({"payment_action": cfg})
+
+
+def test_bad_system_override_fails_at_startup(monkeypatch):
+    monkeypatch.setitem(SYSTEMS[2], "rate_limits", {"screen_flow": {"capacity": 0, "per_seconds": 10}})
+    with pytest.raises(ValueError, match="of system 2"):
+        TokenBucketLimiter(LIMITS)
@@ -0,0 +1,156 @@
+"""
+Tests for the step recovery of armsideclient.run_with_recovery and the
+retreat paths of checkpoints.py, on a fake arm.
+
+    python -m pytest -q test_recovery.py
+"""
+
+import os
+import sys
+import pytest
+
+try:
+    import xarm  # noqa: F401
+except ImportError:
+    # Outside my_env: use the vendored copy, after anything installed
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "my_env", "lib", "python3.10", "site-packages"))
+
+import armsideclient
+import checkpoints
+from checkpoints import MotionError, build_retreat
+from config import GRIPPER, RECOVERY
+
+SYSTEM = 1
+A, P, Q, R = ([float(v)] + [0.0] * 5 for v in (10, 20, 30, 40))
+
+
+class FakeArm:
+    """The XArmAPI calls the step handlers make, logged; `fail` maps a J1 value to return codes"""
+
+    def __init__(self, fail=None, error_code=1):
+        self.log = []
+        self.fail = {k: list(v) for k, v in (fail or {}).items()}
+        self.error_code = 0
+        self.fail_error_code = error_code
+        self.position = [200.0, 0.0, 150.0, 180.0, 0.0, 0.0]
+
+    def set_servo_angle(self, angle=None, speed=None, wait=True, **kw):
+        self.log.append(("move", angle[0]))
+        codes = self.fail.get(angle[0])
+        if codes:
+            code = codes.pop(0)
+            if code:
+                self.error_code = self.fail_error_code
+                return code
+        return 0
+
+    def set_tool_position(self, x=0, y=0, z=0, **kw):
+        self.log.append(("tool", z))
+        return 0
+
+    def open_lite6_gripper(self, **kw):
+        self.log.append(("open",))
+        return 0
+
+    def close_lite6_gripper(self, **kw):
+        self.log.append(("close",))
+        return 0
+
+    def clean_error(self):
+        self.error_code = 0
+        return 0
+
+    def clean_warn(self):
+        return 0
+
+    def motion_enable(self, enable=True):
+        return 0
+
+    def set_mode(self, mode):
+        return 0
+
+    def set_state(self, state=0):
+        return 0
+
+
+def _move(joints):
+    return {"type": "move", "joints": list(joints), "speed": 50}
+
+
+PICK = [
+    _move(A), _move(P),
+    {"type": "gripper_close", "delay": 0},
+    {"type": "sleep", "duration": 0},
+    _move(Q),
+    {"type": "tool_move", "dz": 10, "speed": 10},
+    {"type": "gripper_open", "delay": 0},
+    {"type": "sleep", "duration": 0},
+    _move(R),
+]
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setitem(RECOVERY, "checkpoint_dir", str(tmp_path))
+    monkeypatch.setitem(GRIPPER, "async", False)
+    monkeypatch.setattr(armsideclient, "journal", None)
+    monkeypatch.setattr(checkpoints, "_records", {})
+
+
+def _run(arm, steps):
+    meta = {"job_id": "job-1", "action": "insert", "rack": 1}
+    armsideclient.run_with_recovery(arm, SYSTEM, {"insert": steps}, meta)
+
+
+def test_retreat_puts_the_card_back_where_it_was_picked():
+    types = [(s["type"], s.get("joints", [None])[0], s.get("dz")) for s in build_retreat(PICK, len(PICK) - 1)]
+    assert types == [
+        ("move", 40.0, None),
+        ("gripper_close", None, None), ("sleep", None, None),
+        ("tool_move", None, -10),
+        ("move", 30.0, None), ("move", 20.0, None),
+        ("gripper_open", None, None), ("sleep", None, None),
+        ("move", 10.0, None),
+    ]
+
+
+def test_retreat_before_any_gripper_step_has_none():
+    assert [s["type"] for s in build_retreat(PICK, 1)] == ["move", "move"]
+
+
+def test_failed_move_is_resumed():
+    arm = FakeArm(fail={30.0: [1]})
+    _run(arm, PICK)
+    assert arm.log.count(("move", 30.0)) == 2
+    assert checkpoints.load_checkpoint(SYSTEM)["status"] == "completed"
+
+
+def test_collision_is_not_resumed_and_retreats_with_the_card_released():
+    arm = FakeArm(fail={30.0: [1]}, error_code=22)
+    with pytest.raises(MotionError):
+        _run(arm, PICK)
+    assert arm.log.count(("move", 30.0)) == 1
+    after_failure = arm.log[arm.log.index(("move", 30.0)) + 1:]
+    assert after_failure == [("move", 20.0), ("open",), ("move", 10.0)]
+    assert checkpoints.load_checkpoint(SYSTEM)["status"] == "retreated"
+
+
+def test_failure_after_the_last_step_retreats_without_index_error(monkeypatch):
+    class Tracker:
+        pending = None
+        overlap_ok = False
+        calls = 0
+
+        def wait(self):
+            Tracker.calls += 1
+            if Tracker.calls == 1:
+                raise RuntimeError("jaw sensor timeout")
+
+    monkeypatch.setattr(armsideclient, "get_tracker", lambda arm: Tracker())
+    arm = FakeArm()
+    with pytest.raises(RuntimeError, match="jaw sensor"):
+        _run(arm, PICK)
+    record = checkpoints.load_checkpoint(SYSTEM)
+    assert record["status"] == "retreated" and record["attempts"] == 0
+    assert arm.log[-3:] == [("move", 20.0), ("open",), ("move", 10.0)]
@@ -0,0 +1,98 @@
+"""
+Tests for scenario.py: DAG validation, and dispatch order and failure
+propagation of run_scenario with submit_task replaced by a fake that
+finishes each job at once.
+
+    python -m pytest -q test_scenario.py
+"""
+
+import os
+import sys
+import time
+import pytest
+
+try:
+    import xarm  # noqa: F401
+except ImportError:
+    # Outside my_env: use the vendored copy, after anything installed
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "my_env", "lib", "python3.10", "site-packages"))
+
+import scenario
+from scenario import validate_scenario
+
+
+def step(sid, system=2, depends_on=None, **kw):
+    return dict({"id": sid, "system": system, "action": "tap", "rack": 1, "depends_on": depends_on or []}, **kw)
+
+
+def test_valid_dag_is_normalised():
+    by_id = validate_scenario([step("a"), step(2, depends_on=["a"]), step("c", depends_on=["a", 2])])
+    assert list(by_id) == ["a", "2", "c"]
+    assert by_id["c"]["depends_on"] == {"a", "2"}
+
+
+def test_steps_without_ids_are_numbered():
+    steps = [{"system": 2, "pin": "1234"}, {"system": 3, "action": "tap", "depends_on": [1]}]
+    assert validate_scenario(steps)["2"]["depends_on"] == {"1"}
+
+
+def test_barrier_needs_no_system():
+    by_id = validate_scenario([step("a"), {"id": "sync", "barrier": True, "depends_on": ["a"]}])
+    assert by_id["sync"]["barrier"]
+
+
+@pytest.mark.parametrize("steps, message", [
+    ([], "non-empty"),
+    (["tap"], "must be an object"),
+    ([step("a"), step("a")], "Duplicate step id"),
+    ([step("a", depends_on="b")], "depends_on must be a list"),
+    ([step("a", depends_on=["b"])], "unknown step 'b'"),
+    ([step("a", system=9)], "system 9 not found"),
+    ([{"id": "a", "system": 2}], "action/rack or pin is required"),
+    ([step("a", depends_on=["c"]), step("b", depends_on=["a"]), step("c", depends_on=["b"])], "cycle"),
+    ([step("a", depends_on=["a"])], "cycle"),
+])
+def test_invalid_scenarios_are_rejected(steps, message):
+    with pytest.raises(ValueError, match=message):
+        validate_scenario(steps)
+
+
+@pytest.fixture
+def fake_jobs(monkeypatch):
+    """Runs every submitted job at once; the steps added to `failing` fail"""
+    submitted = []
+    failing = set()
+
+    def submit_task(system_id, sequence, pin, meta, on_done=None, **kw):
+        submitted.append(meta["scenario_step"])
+        now = time.time()
+        meta.update(job_id=meta["scenario_step"], queued_at=now, started_at=now, finished_at=now,
+                    status="failed" if meta["scenario_step"] in failing else "completed")
+        on_done(meta)
+        return meta, True
+
+    monkeypatch.setattr(scenario, "submit_task", submit_task)
+    monkeypatch.setattr(scenario, "load_action_sequence", lambda system, action, rack: [])
+    return submitted, failing
+
+
+def test_steps_run_after_their_dependencies(fake_jobs):
+    submitted, _ = fake_jobs
+    steps = [step("c", depends_on=["a", "b"]), step("a", system=1), step("b", system=3, depends_on=["a"])]
+    result = scenario.run_scenario(steps, timeout=5)
+    assert result["status"] == "success"
+    assert submitted == ["a", "b", "c"]
+    assert set(result["systems"]) == {1, 2, 3}
+
+
+def test_failed_step_skips_its_dependents_only(fake_jobs):
+    submitted, failing = fake_jobs
+    failing.add("a")
+    steps = [step("a"), step("b", depends_on=["a"]), step("c", depends_on=["b"]),
+             {"id": "sync", "barrier": True, "depends_on": ["a"]}, step("d", system=3)]
+    result = scenario.run_scenario(steps, timeout=5)
+    statuses = {sid: r["status"] for sid, r in result["steps"].items()}
+    assert statuses == {"a": "failed", "b": "skipped", "c": "skipped", "sync": "skipped", "d": "completed"}
+    assert result["status"] == "failed"
+    assert sorted(submitted) == ["a", "d"]
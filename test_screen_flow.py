@@ -0,0 +1,99 @@
+"""
+Tests for screen_flow.py: segment joining, the plan cache (PIN-free, LRU
+bounded, reset when the map changes on disk) and the keypad buttons
+borrowed from the PIN entry file.
+
+    python -m pytest -q test_screen_flow.py
+"""
+
+import os
+import json
+import pytest
+import screen_flow
+from screen_flow import ScreenFlowPlanner, join_segments
+
+
+def move(j1, speed=50):
+    return {"type": "move", "joints": [float(j1)] + [0.0] * 5, "speed": speed}
+
+
+SLEEP = {"type": "sleep", "duration": 0.2}
+ENTRY = [move(0), move(10)]
+
+
+def press(j1):
+    return [move(j1), SLEEP, move(j1 + 0.5, speed=20), move(j1)]
+
+
+def _write(path, data, mtime=None):
+    with open(path, "w") as f:
+        json.dump(data, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def planner(tmp_path):
+    interaction = {"entry": ENTRY, "exit": [move(0)],
+                   "buttons": {"cash": press(20), "20": press(30), "yes": press(20)}}
+    pin = {"pin_entry": {"entry": [move(0), move(10.2)],
+                         "buttons": {str(d): press(40 + d) for d in range(10)}}}
+    p = ScreenFlowPlanner(2)
+    p.interaction_file = _write(tmp_path / "screen.json", interaction, mtime=1000)
+    p.pin_file = _write(tmp_path / "pin.json", pin, mtime=1000)
+    return p
+
+
+def _j1(steps):
+    return [s["joints"][0] for s in steps if s["type"] == "move"]
+
+
+def test_join_drops_a_move_to_the_current_pose():
+    joined = join_segments([[move(0), move(20)], [move(20.01), SLEEP, move(30)], [move(30)]])
+    assert _j1(joined) == [0, 20, 30]
+    assert SLEEP in joined
+
+
+def test_keys_for_flow():
+    p = ScreenFlowPlanner(2)
+    assert p.keys_for("cash", "20", pin="1234", confirm="yes") == ["cash", "20", "1", "2", "3", "4", "yes"]
+    assert p.keys_for("cash", "15", exact_amount=125) == ["cash", "1", "2", "5"]
+    assert p.keys_for("card", "20") == ["card"]
+
+
+def test_pin_buttons_are_borrowed_when_the_entry_matches(planner):
+    assert planner.missing_keys(["cash", "20", "7", "yes", "card"]) == ["card"]
+
+
+def test_pin_buttons_are_not_borrowed_through_another_entry(planner, tmp_path):
+    pin = {"entry": [move(0), move(25)], "buttons": {"7": press(47)}}
+    planner.pin_file = _write(tmp_path / "other_pin.json", pin)
+    assert planner.missing_keys(["7"]) == ["7"]
+
+
+def test_head_is_cached_without_the_pin(planner):
+    head = planner.plan("cash", "20")
+    assert planner.plan("cash", "20") is head
+    with_pin = planner.plan("cash", "20", pin="12", confirm="yes")
+    assert list(planner._plans) == [("cash", "20")]
+    assert with_pin[:len(head)] == head
+    # the PIN digits and "yes" are joined on per task
+    assert _j1(with_pin[len(head):]) == [41, 41.5, 41, 42, 42.5, 42, 20, 20.5, 20]
+
+
+def test_cache_is_bounded(planner, monkeypatch):
+    monkeypatch.setattr(screen_flow, "MAX_CACHED_PLANS", 2)
+    for amount in (11, 12, 13):
+        planner.plan("cash", exact_amount=amount)
+    assert list(planner._plans) == [("cash", "1", "2"), ("cash", "1", "3")]
+
+
+def test_map_change_on_disk_resets_the_cache(planner):
+    old = planner.plan("cash", "20")
+    interaction = {"entry": ENTRY, "buttons": {"cash": press(60), "20": press(30)}}
+    _write(planner.interaction_file, interaction, mtime=2000)
+    new = planner.plan("cash", "20")
+    assert new is not old
+    assert _j1(new)[2] == 60
+    assert list(planner._plans) == [("cash", "20")]
@@ -0,0 +1,88 @@
+"""
+Tests for task_journal.py: sequences are stored once per file, also
+across restarts, and PIN tasks are journaled step by step without the
+PIN.
+
+    python -m pytest -q test_task_journal.py
+"""
+
+import os
+import sys
+import json
+import pytest
+
+try:
+    import xarm  # noqa: F401
+except ImportError:
+    # Outside my_env: use the vendored copy, after anything installed
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "my_env", "lib", "python3.10", "site-packages"))
+
+import armsideclient
+from config import PIN_PLANNER
+from task_journal import TaskJournal
+
+SEQUENCE = [{"type": "move", "joints": [1.0] * 6, "speed": 50}, {"type": "sleep", "duration": 0.1}]
+PIN = "2580"
+
+
+def _records(directory):
+    out = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "r") as f:
+            out += [json.loads(line) for line in f]
+    return out
+
+
+def _task(journal, job_id, steps=SEQUENCE, pin=None):
+    meta = {"job_id": job_id, "action": "tap", "rack": 1}
+    journal.task_started(2, meta, steps, pin)
+    journal.step(2, job_id, 0, "move", 0.0, 0.5, joints=[1.0] * 6)
+    meta["status"] = "completed"
+    journal.task_finished(2, meta)
+
+
+def test_sequence_is_stored_once_across_restarts(tmp_path):
+    _task(TaskJournal(str(tmp_path)), "a")
+    _task(TaskJournal(str(tmp_path)), "b")   # a restarted server
+    records = _records(tmp_path)
+    assert sum(r["t"] == "sequence" for r in records) == 1
+    assert [r["hash"] for r in records if r["t"] == "task"] == [records[0]["hash"]] * 2
+
+
+def test_pin_task_keeps_only_the_digit_count(tmp_path):
+    _task(TaskJournal(str(tmp_path)), "a", pin=PIN)
+    records = _records(tmp_path)
+    assert PIN not in json.dumps(records)
+    task = next(r for r in records if r["t"] == "task")
+    assert task["request"]["pin_digits"] == len(PIN) and task["hash"] is None
+    assert not any(r["t"] == "sequence" for r in records)
+    assert all("joints" not in r for r in records if r["t"] == "step")
+
+
+class FakeArm:
+    def __init__(self):
+        self.moves = 0
+
+    def set_servo_angle(self, **kw):
+        self.moves += 1
+        return 0
+
+
+@pytest.mark.skipif(PIN_PLANNER["enabled"], reason="journals the recorded keypad path")
+def test_legacy_pin_path_journals_its_steps(tmp_path, monkeypatch):
+    journal = TaskJournal(str(tmp_path))
+    monkeypatch.setattr(armsideclient, "journal", journal)
+    monkeypatch.setattr(armsideclient.time, "sleep", lambda seconds: None)
+    journal.task_started(2, {"job_id": "pin"}, None, PIN)
+
+    arm = FakeArm()
+    msg, ok = armsideclient.run_pin_sequence(arm, PIN, 2, "pin", first_step=3)
+    assert ok, msg
+
+    steps = armsideclient.expand_pin_sequence(2, PIN)
+    records = [r for r in _records(tmp_path) if r["t"] == "step"]
+    assert [r["i"] for r in records] == list(range(3, 3 + len(steps)))
+    assert [r["type"] for r in records] == [s["type"] for s in steps]
+    assert arm.moves == sum(s["type"] == "move" for s in steps)
+    assert PIN not in json.dumps(_records(tmp_path))
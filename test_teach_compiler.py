@@ -0,0 +1,44 @@
+"""
+Regression tests for teach_compiler.py: every seeded teach spec must
+compile offline (IK cache + per-step seeds, no arm) to the joints of the
+recording it was seeded from.
+
+    python -m pytest -q test_teach_compiler.py
+"""
+
+import glob
+import json
+import os
+import pytest
+from kinematics import IKSolver
+from teach_compiler import IK_CACHE_DIR, SEEDS_DIR, compile_spec, load_seeds, load_spec
+from warm_start import steps_of
+
+JOINT_TOLERANCE_DEG = 0.5
+SEEDED = sorted(os.path.splitext(os.path.basename(p))[0] for p in glob.glob(os.path.join(SEEDS_DIR, "*.json")))
+
+
+def _recording(name):
+    with open(os.path.join(SEEDS_DIR, f"{name}.json"), "r") as f:
+        path = json.load(f)["recording"]
+    with open(path, "r") as f:
+        return steps_of(json.load(f))
+
+
+def test_every_shipped_spec_is_seeded():
+    shipped = sorted(os.path.splitext(os.path.basename(p))[0] for p in glob.glob("teach_specs/*.json"))
+    assert shipped == SEEDED
+
+
+@pytest.mark.parametrize("name", SEEDED)
+def test_compiled_spec_matches_recording(name):
+    spec = load_spec(os.path.join("teach_specs", f"{name}.json"))
+    solver = IKSolver(cache_file=os.path.join(IK_CACHE_DIR, f"system{spec.get('system', 1)}.json"))
+    compiled = compile_spec(spec, solver, seeds=load_seeds(name))
+    recorded = _recording(name)
+
+    assert [s["type"] for s in compiled] == [s["type"] for s in recorded]
+    for i, (ours, theirs) in enumerate(zip(compiled, recorded)):
+        if ours["type"] == "move":
+            worst = max(abs(a - b) for a, b in zip(ours["joints"], theirs["joints"]))
+            assert worst <= JOINT_TOLERANCE_DEG, f"step {i+1}: {ours['joints']} vs {theirs['joints']}"
@@ -0,0 +1,36 @@
+"""
+Tests for warm_start.py: the home move between two tasks is only skipped
+for listed action transitions.
+
+    python -m pytest -q test_warm_start.py
+"""
+
+from warm_start import can_splice
+
+HOME = [90.0, 0.0, 30.0, 0.0, 30.0, 0.0]
+
+
+def _move(joints, speed=50):
+    return {"type": "move", "joints": list(joints), "speed": speed}
+
+
+TAP = [_move(HOME), _move([100, 10, 40, 0, 30, 0]), _move(HOME)]
+INSERT = {"insert": [_move(HOME), _move([110, 15, 45, 0, 30, 0]), _move(HOME)]}
+ON = {"enabled": True, "transitions": [["tap", "insert"]]}
+
+
+def test_off_by_default():
+    assert not can_splice(TAP, INSERT, transition=("tap", "insert"))
+
+
+def test_only_listed_transitions():
+    assert can_splice(TAP, INSERT, ON, transition=("tap", "insert"))
+    assert not can_splice(TAP, INSERT, ON, transition=("insert", "tap"))
+    assert not can_splice(TAP, INSERT, ON)
+
+
+def test_large_jump_or_other_start_goes_home():
+    far = [_move(HOME), _move([170, 10, 40, 0, 30, 0]), _move(HOME)]
+    assert not can_splice(TAP, far, ON, transition=("tap", "insert"))
+    moved = [_move([91, 0, 30, 0, 30, 0])] + INSERT["insert"][1:]
+    assert not can_splice(TAP, moved, ON, transition=("tap", "insert"))
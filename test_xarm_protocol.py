@@ -0,0 +1,175 @@
+"""
+Regression tests for the vendored xArm SDK serial path: the Ux2HexProtocol
+frame parser, CRC16 and the byte converters.
+
+    python -m pytest -q test_xarm_protocol.py
+"""
+
+import os
+import sys
+import queue
+import random
+import struct
+import threading
+import time
+import pytest
+
+try:
+    import xarm  # noqa: F401
+except ImportError:
+    # Outside my_env: use the vendored copy, after anything installed
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "my_env", "lib", "python3.10", "site-packages"))
+
+from xarm.core.comm.uxbus_cmd_protocol import Ux2HexProtocol
+from xarm.core.config.x_config import XCONF
+from xarm.core.utils import convert, crc16
+
+FROMID = XCONF.SerialConf.UXBUS_DEF_FROMID
+TOID = XCONF.SerialConf.UXBUS_DEF_TOID
+
+
+def _crc_bitwise(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return bytes((crc & 0xFF, crc >> 8))
+
+
+def _frame(data, toid=TOID, fromid=FROMID):
+    """One reply frame: toid, fromid, len, data[len], crc_lo, crc_hi"""
+    body = bytes([toid, fromid, len(data)]) + bytes(data)
+    return body + crc16.crc_modbus(body)
+
+
+def _parser(maxsize=100):
+    que = queue.Queue(maxsize)
+    return Ux2HexProtocol(que, FROMID, TOID), que
+
+
+def _drain(que):
+    out = []
+    while not que.empty():
+        out.append(que.get())
+    return out
+
+
+# Replies as the controller sends them: get_version, motion_en state and
+# get_servo_angle (7 little-endian floats)
+REPLIES = [
+    _frame([0x01, 0x00] + list(b"xArm v1.10.0")),
+    _frame([0x0B, 0x00, 0x01]),
+    _frame([0x29, 0x00] + list(convert.fp32s_to_bytes([0.1, -0.5, 1.2, 3.1, -1.6, 0.0, 0.0], 7))),
+]
+
+
+def test_crc_modbus_check_value():
+    assert crc16.crc_modbus(b"123456789") == b"\x37\x4b"
+
+
+def test_crc_modbus_matches_bitwise_reference():
+    rng = random.Random(0)
+    for n in (0, 1, 2, 7, 64, 255):
+        data = bytes(rng.randrange(256) for _ in range(n))
+        assert crc16.crc_modbus(data) == _crc_bitwise(data)
+        assert crc16.crc_modbus(bytearray(data)) == crc16.crc_modbus(memoryview(data))
+
+
+def test_convert_round_trips():
+    values = [0.0, 1.5, -273.25, 3.4e38, -1e-30]
+    packed = convert.fp32s_to_bytes(values, len(values))
+    assert packed == struct.pack("<5f", *values)
+    assert convert.bytes_to_fp32s(packed, len(values)) == list(struct.unpack("<5f", packed))
+    assert convert.bytes_to_fp32s(bytearray(packed), 5) == convert.bytes_to_fp32s(list(packed), 5)
+    assert convert.bytes_to_fp32(convert.fp32_to_bytes(1.5)) == 1.5
+
+    u16 = [0, 1, 0x1234, 0xFFFF]
+    assert convert.bytes_to_u16s(convert.u16s_to_bytes(u16, 4), 4) == u16
+    assert convert.bytes_to_u16(convert.u16_to_bytes(0xBEEF)) == 0xBEEF
+    assert convert.bytes_to_16s(struct.pack(">3h", -1, 0, 32767), 3) == [-1, 0, 32767]
+
+    for v in (0, 1, -1, 2 ** 31 - 1, -2 ** 31):
+        assert convert.bytes_to_num32(convert.int32_to_bytes(v, is_big_endian=True)) == v
+        assert convert.bytes_to_int32(convert.int32_to_bytes(v, is_big_endian=True)) == v
+    assert convert.bytes_to_u32(b"\x01\x02\x03\x04") == 0x01020304
+    assert convert.bytes_to_u64(b"\x00\x00\x00\x01\x00\x00\x00\x02") == (1 << 32) | 2
+    assert convert.bytes_to_fp32s(b"", 0) == []
+
+
+def test_whole_frames():
+    parser, que = _parser()
+    parser.put(b"".join(REPLIES))
+    assert _drain(que) == REPLIES
+    assert parser.rxbuf == bytearray()
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 5, 7, 13])
+def test_frames_split_across_reads(chunk):
+    parser, que = _parser()
+    stream = b"".join(REPLIES)
+    for i in range(0, len(stream), chunk):
+        parser.put(stream[i:i + chunk])
+    assert _drain(que) == REPLIES
+
+
+def test_length_argument_truncates():
+    parser, que = _parser()
+    parser.put(REPLIES[1] + b"\xff\xff", len(REPLIES[1]))
+    assert _drain(que) == [REPLIES[1]]
+
+
+def test_noise_bad_crc_and_foreign_ids_are_skipped():
+    parser, que = _parser()
+    bad_crc = bytearray(REPLIES[0])
+    bad_crc[-1] ^= 0xFF
+    foreign = _frame([0x01, 0x00], fromid=(FROMID + 1) & 0xFF)
+    parser.put(b"\x00\x13" + bytes(bad_crc) + foreign + REPLIES[1] + b"\x37" + REPLIES[2])
+    assert _drain(que) == [REPLIES[1], REPLIES[2]]
+
+
+def test_full_queue_keeps_newest():
+    parser, que = _parser(maxsize=2)
+    parser.put(b"".join(REPLIES))
+    assert _drain(que) == REPLIES[1:]
+
+
+def test_flush_drops_partial_frame_and_sets_ids():
+    parser, que = _parser()
+    parser.put(REPLIES[0][:5])
+    parser.flush(0x11, 0x22)
+    assert (parser.fromid, parser.toid, parser.rxbuf) == (0x11, 0x22, bytearray())
+    reply = _frame([0x01, 0x00], toid=0x22, fromid=0x11)
+    parser.put(reply)
+    assert _drain(que) == [reply]
+
+
+def test_flush_during_put_does_not_break_the_receive_thread():
+    parser, que = _parser(maxsize=100000)
+    stream = b"".join(REPLIES) * 50
+    errors = []
+    stop = threading.Event()
+
+    def recv():
+        try:
+            while not stop.is_set():
+                for i in range(0, len(stream), 64):
+                    parser.put(stream[i:i + 64])
+        except Exception as e:   # recv_proc dies on any exception
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)   # interleave the two threads inside put()
+    try:
+        thread = threading.Thread(target=recv)
+        thread.start()
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline and not errors:
+            parser.flush()
+        stop.set()
+        thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert all(frame in REPLIES for frame in _drain(que))
@@ -13,7 +13,9 @@ import uuid
 import numpy as np
 from logging.handlers import RotatingFileHandler
 from xarm.wrapper import XArmAPI
-from config import SYSTEMS
+from config import SYSTEMS, SERVER_HOST, SERVER_PORT, SERVER_THREADS, SHUTDOWN_DRAIN_TIMEOUT
+from server_runtime import serve
+from rate_limiter import TokenBucketLimiter
 
 # Logging setup
 log_handler = RotatingFileHandler(
@@ -31,8 +33,11 @@ app = Flask(__name__)
 task_queues = {}           # {system_id: queue.Queue()}
 worker_threads = {}        # {system_id: threading.Thread}
 arm_connections = {}       # {system_id: XArmAPI}
-last_call_lock = threading.Lock()
-last_call = {}            # {ip: timestamp} for rate limiting
+# Default limits; per-system overrides live in SYSTEMS[...]["rate_limits"]
+rate_limiter = TokenBucketLimiter({
+    "payment_action": {"capacity": 1, "per_seconds": 10},
+    "screen_flow": {"capacity": 1, "per_seconds": 10},
+})
 
 # Step handlers for different action types
 def handle_move(arm, step):
@@ -167,6 +172,7 @@ def worker_thread(system_id):
     # Initialize arm connection
     try:
         arm = initialize_arm_connection(system_id)
+        arm_connections[system_id] = arm
         arm_status[system_id] = "idle"
     except Exception as e:
         logging.error(f"System {system_id} worker thread failed to start: {e}")
@@ -232,6 +238,27 @@ def initialize_systems():
         
         logging.info(f"System {system_id} initialized with worker thread")
 
+def shutdown_workers(timeout=SHUTDOWN_DRAIN_TIMEOUT):
+    """Drop the tasks still waiting, let running tasks finish (up to timeout), stop workers and grippers"""
+    deadline = time.time() + timeout
+    for system_id, queue_obj in task_queues.items():
+        while True:
+            try:
+                _, _, meta = queue_obj.get_nowait()
+            except queue.Empty:
+                break
+            logging.warning(f"System {system_id} dropping queued task on shutdown: {meta}")
+            queue_obj.task_done()
+        queue_obj.put((None, None, {}))
+    for system_id, thread in worker_threads.items():
+        thread.join(timeout=max(1.0, deadline - time.time()))
+    for system_id, arm in arm_connections.items():
+        try:
+            arm.stop_lite6_gripper(sync=True)
+            arm.disconnect()
+        except Exception as e:
+            logging.error(f"Failed to stop System {system_id} arm on shutdown: {e}")
+
 @app.route("/payment_action", methods=["POST"])
 def unified_action():
     """Unified endpoint for all robotic arm actions"""
@@ -262,15 +289,13 @@ def unified_action():
             }), 409
 
     # Rate limiting
-    rate_limit_key = f"{client_ip}_{system}"
-    with last_call_lock:
-        last_ts = last_call.get(rate_limit_key)
-        if last_ts is not None and (now - last_ts) < 10:
-            return jsonify({
-                "status": "error",
-                "message": "Please wait 10 sec before retrying the same system"
-            }), 429
-        last_call[rate_limit_key] = now
+    allowed, retry_after = rate_limiter.allow(client_ip, system, "payment_action")
+    if not allowed:
+        return jsonify({
+            "status": "error",
+            "message": f"Please wait {int(retry_after) + 1} sec before retrying the same system",
+            "retry_after": round(retry_after, 1)
+        }), 429
 
 
     # CASE 1: PIN ONLY (no action/rack specified)
@@ -386,11 +411,10 @@ def screen_flow():
         return jsonify({"status": "error", "message": f"System {system} not found"}), 404
 
     # ---------- RATE LIMIT ----------
-    rate_key = f"{client_ip}_{system}"
-    with last_call_lock:
-        if rate_key in last_call and (now - last_call[rate_key]) < 10:
-            return jsonify({"status": "error", "message": "Wait 10 seconds"}), 429
-        last_call[rate_key] = now
+    allowed, retry_after = rate_limiter.allow(client_ip, system, "screen_flow")
+    if not allowed:
+        return jsonify({"status": "error", "message": f"Wait {int(retry_after) + 1} seconds",
+                        "retry_after": round(retry_after, 1)}), 429
 
     # ---------- STEP 1: FOOD / CASH ----------
     if choice not in ["food", "cash"]:
@@ -518,7 +542,7 @@ if __name__ == "__main__":
     
         initialize_systems()
         
-        logging.info("All systems initialized, starting Flask server")
-        app.run(host="0.0.0.0", port=8000, debug=False, threaded=True)
+        logging.info("All systems initialized, starting server")
+        serve(app, SERVER_HOST, SERVER_PORT, SERVER_THREADS, on_shutdown=shutdown_workers)
         
     
\ No newline at end of file
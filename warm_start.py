@@ -0,0 +1,74 @@
+"""
+warm_start.py
+-------------
+Skips the return to the common start point between queued tasks.
+
+Every recorded action starts and ends at the common start point (home),
+so two tasks in a row drive: ... A -> home | home -> B ... When the worker
+sees that the next queued task starts at the pose the current one ends
+at, it drops the final home move of the current task and the first move
+of the next, and the arm goes A -> B directly.
+
+This is only done when it is safe:
+
+- both ends are joint moves to the same pose (the same IK branch, not just
+  the same Cartesian home)
+- the current task ends with that move, so nothing else (PIN entry, a
+  gripper action) happens at home
+- the next task continues with a joint move after the home move
+- the direct hop A -> B moves no joint more than WARM_START["max_joint_jump"]
+- the pair of actions is in WARM_START["transitions"]: the hop is not part
+  of any recording and nothing checks what it sweeps through, so each
+  transition has to be run and watched once before it is listed
+
+The worker only lets the next task skip its home move if the current task
+completed; after a failure or a different next task the arm goes home as
+recorded.
+"""
+
+from config import WARM_START
+from screen_flow import same_pose
+
+
+def steps_of(sequence):
+    """Step list of a sequence, unwrapping the {"name": [...]} file format"""
+    if isinstance(sequence, dict) and len(sequence) == 1:
+        return list(sequence.values())[0]
+    return sequence
+
+
+def can_splice(current, following, settings=None, transition=None):
+    """
+    True if the home move between two sequences can be skipped.
+    `transition` is the (current action, next action) pair.
+    """
+    s = dict(WARM_START, **(settings or {}))
+    if not s["enabled"]:
+        return False
+    if transition is None or list(transition) not in [list(t) for t in s["transitions"]]:
+        return False
+    current, following = steps_of(current), steps_of(following)
+    if not isinstance(current, list) or not isinstance(following, list):
+        return False
+    if len(current) < 2 or len(following) < 2:
+        return False
+    home_out, home_in, nxt = current[-1], following[0], following[1]
+    if not (home_out.get("type") == home_in.get("type") == nxt.get("type") == "move"):
+        return False
+    if not same_pose(home_out, home_in, s["home_tolerance"]):
+        return False
+    previous = [step for step in current[:-1] if step.get("type") == "move"]
+    if not previous:
+        return False
+    jump = max(abs(a - b) for a, b in zip(previous[-1]["joints"], nxt["joints"]))
+    return jump <= s["max_joint_jump"]
+
+
+def drop_home_tail(sequence):
+    """The current sequence without its final home move"""
+    return steps_of(sequence)[:-1]
+
+
+def drop_home_head(sequence):
+    """The next sequence without its initial home move"""
+    return steps_of(sequence)[1:]
@@ -0,0 +1,291 @@
+"""
+workspace.py
+------------
+Shared-workspace model and reservation table for arms whose racks are
+close together.
+
+Every system with a "base" pose in SYSTEMS ([x, y, z, yaw] of the arm base
+in a common cell frame, mm / deg) takes part; systems without one are out
+of reach of the others and are never checked.
+
+Volumes are axis-aligned boxes (lo, hi) in the cell frame:
+
+- the pose box of a joint configuration covers every link and the tool
+  (kinematics.link_points), grown by WORKSPACE["padding"]
+- the swept box of a joint move is the union of pose boxes sampled along
+  it (set_servo_angle interpolates linearly in joint space); a tool move
+  adds the current pose shifted by its displacement. The link poses along
+  a linear (Cartesian) move are not known without IK, so it reserves the
+  arm's whole reach.
+
+Each arm holds a reservation for the box of its current pose. Before every
+motion step (one segment) the arm's WorkspaceGuard asks the table for that
+box plus the step's swept box; it is granted only when it does not
+intersect another arm's reservation, otherwise the step waits at its
+boundary until the other arm has moved away, so arms working in the same
+space interleave their segments. After the step the reservation shrinks
+to the end pose. A step that waits longer than WORKSPACE["wait_timeout"]
+fails with WorkspaceTimeout and the normal step recovery applies.
+
+With motion processes (motion_process.py) the table lives in the server
+process and the guards reach it through the arm's pipe.
+
+Recorded sequences can be checked offline; two tasks whose total volumes
+do not intersect never wait for each other:
+
+    python workspace.py Recorded_file/SYSTEM2/TAP/tap_system2_rack1.json 2 other_rack.json 3
+"""
+
+import math
+import time
+import logging
+import threading
+from lazy_imports import lazy
+from config import SYSTEMS, WORKSPACE
+from kinematics import link_points
+
+np = lazy("numpy")
+
+MOTION_STEPS = ("move", "tool_move", "linear_move")
+REACH_MM = 440   # Lite6 reach from the base axis
+
+
+class WorkspaceTimeout(RuntimeError):
+    """Raised when a motion step cannot reserve its volume in time"""
+
+
+def base_of(system_id):
+    """Cell-frame base pose of a system, or None if it does not share space"""
+    return SYSTEMS.get(system_id, {}).get("base")
+
+
+def _to_cell(points, base):
+    x, y, z, yaw = base
+    c, s = math.cos(math.radians(yaw)), math.sin(math.radians(yaw))
+    rotation = np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]])
+    return points @ rotation.T + np.array([x, y, z], dtype=float), rotation
+
+
+def _box(points, padding=None):
+    padding = WORKSPACE["padding"] if padding is None else padding
+    return (points.min(axis=0) - padding).tolist(), (points.max(axis=0) + padding).tolist()
+
+
+def _cell_points(joints, base, offset=None):
+    points, flange = link_points(joints, WORKSPACE["tool_length"])
+    points, rotation = _to_cell(points, base)
+    if offset is not None:
+        points = points + offset
+    return points, rotation @ flange
+
+
+def pose_box(joints, base, offset=None):
+    """Box around the arm in one joint configuration"""
+    return _box(_cell_points(joints, base, offset)[0])
+
+
+def sweep_box(start, end, base, offset=None):
+    """Box swept by a joint move from `start` to `end`"""
+    start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+    samples = max(1, int(math.ceil(np.abs(end - start).max() / WORKSPACE["sample_deg"])))
+    points = [_cell_points(start + (end - start) * k / samples, base, offset)[0] for k in range(samples + 1)]
+    return _box(np.vstack(points))
+
+
+def reach_box(base):
+    """Box around everything the arm can reach"""
+    radius = REACH_MM + WORKSPACE["tool_length"] + WORKSPACE["padding"]
+    x, y, z, _ = base
+    return [x - radius, y - radius, z - radius], [x + radius, y + radius, z + radius]
+
+
+def tool_shift(joints, base, step):
+    """Cell-frame displacement of a tool move (dx/dy/dz are in the tool frame)"""
+    _, tool_rotation = _cell_points(joints, base)
+    return tool_rotation @ np.array([step.get("dx", 0), step.get("dy", 0), step.get("dz", 0)], dtype=float)
+
+
+def union(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return [min(x, y) for x, y in zip(a[0], b[0])], [max(x, y) for x, y in zip(a[1], b[1])]
+
+
+def intersects(a, b):
+    return all(a_lo <= b_hi and b_lo <= a_hi for a_lo, a_hi, b_lo, b_hi in zip(a[0], a[1], b[0], b[1]))
+
+
+def sequence_volumes(steps, base, start=None):
+    """
+    [(step index, swept box)] of the motion steps of a recorded sequence.
+    `start` are the joints before the first step; without them the first
+    move only covers its target pose.
+    """
+    joints, offset, volumes = start, None, []
+    for i, step in enumerate(steps):
+        stype = step.get("type")
+        if stype == "move":
+            target = step["joints"][:6]
+            box = sweep_box(joints, target, base) if joints is not None else pose_box(target, base)
+            if offset is not None and joints is not None:
+                box = union(box, pose_box(joints, base, offset))
+            joints, offset = target, None
+        elif stype == "linear_move":
+            box, joints, offset = reach_box(base), None, None
+        elif stype == "tool_move" and joints is not None:
+            shift = tool_shift(joints, base, step)
+            moved = shift if offset is None else offset + shift
+            box = union(pose_box(joints, base, offset), pose_box(joints, base, moved))
+            offset = moved
+        else:
+            continue
+        volumes.append((i, box))
+    return volumes
+
+
+def conflicts(steps_a, base_a, steps_b, base_b):
+    """Pairs (step of a, step of b) whose swept boxes intersect"""
+    volumes_b = sequence_volumes(steps_b, base_b)
+    return [(i, j) for i, box_a in sequence_volumes(steps_a, base_a)
+            for j, box_b in volumes_b if intersects(box_a, box_b)]
+
+
+class ReservationTable:
+    """Volumes currently reserved by each arm; grants only non-intersecting requests"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.reserved = {}   # {system_id: box}
+
+    def acquire(self, system_id, box, timeout):
+        """Reserve `box` for a system, waiting up to `timeout` seconds; False on timeout"""
+        deadline = time.monotonic() + timeout
+        waited_for = None
+        with self._cond:
+            while True:
+                blocker = next((sid for sid, other in self.reserved.items()
+                                if sid != system_id and intersects(box, other)), None)
+                if blocker is None:
+                    self.reserved[system_id] = box
+                    self._cond.notify_all()
+                    return True
+                if blocker != waited_for:
+                    waited_for = blocker
+                    logging.info(f"System {system_id} waiting for system {blocker} to clear the shared workspace")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+    def release_to(self, system_id, box):
+        """Shrink a system's reservation to `box` (its pose after a step)"""
+        with self._cond:
+            self.reserved[system_id] = box
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.reserved)
+
+
+table = ReservationTable()
+
+
+class WorkspaceGuard:
+    """Reserves the volume of each motion step of one arm before it runs"""
+
+    def __init__(self, system_id, arm, base, reservations):
+        self.system_id = system_id
+        self.arm = arm
+        self.base = base
+        self.table = reservations
+        self.joints = None
+        self.offset = None
+
+    def _sync(self):
+        """Joints from the arm's report stream; keeps the planned ones if there are none"""
+        try:
+            self.joints = [float(a) for a in list(self.arm.angles)[:6]]
+            self.offset = None
+        except Exception:
+            pass
+
+    def _box(self):
+        return pose_box(self.joints, self.base, self.offset) if self.joints is not None else None
+
+    def before(self, step, timeout=None):
+        stype = step.get("type")
+        if stype not in MOTION_STEPS:
+            return
+        self._sync()
+        if stype == "move":
+            target = step["joints"][:6]
+            swept = sweep_box(self.joints, target, self.base) if self.joints is not None else pose_box(target, self.base)
+        elif stype == "linear_move":
+            swept = reach_box(self.base)
+        elif self.joints is not None:
+            shift = tool_shift(self.joints, self.base, step)
+            moved = shift if self.offset is None else self.offset + shift
+            swept = pose_box(self.joints, self.base, moved)
+        else:
+            swept = None
+        wanted = union(self._box(), swept)
+        if wanted is None:
+            return
+        timeout = WORKSPACE["wait_timeout"] if timeout is None else timeout
+        if not self.table.acquire(self.system_id, wanted, timeout):
+            raise WorkspaceTimeout(f"System {self.system_id} could not reserve its workspace within {timeout}s")
+
+    def after(self, step):
+        stype = step.get("type")
+        if stype not in MOTION_STEPS:
+            return
+        if stype == "move":
+            self.joints, self.offset = step["joints"][:6], None
+        elif stype == "linear_move":
+            self.joints, self.offset = None, None
+        elif self.joints is not None:
+            shift = tool_shift(self.joints, self.base, step)
+            self.offset = shift if self.offset is None else self.offset + shift
+        self._sync()
+        box = self._box()
+        if box is not None:
+            self.table.release_to(self.system_id, box)
+
+
+def guard_for(system_id, arm):
+    """WorkspaceGuard for a system sharing the cell, or None"""
+    base = base_of(system_id)
+    if not WORKSPACE["enabled"] or base is None:
+        return None
+    return WorkspaceGuard(system_id, arm, base, table)
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    from warm_start import steps_of
+
+    parser = argparse.ArgumentParser(description="Check two recorded sequences for workspace overlap")
+    parser.add_argument("sequence_a")
+    parser.add_argument("system_a", type=int)
+    parser.add_argument("sequence_b")
+    parser.add_argument("system_b", type=int)
+    args = parser.parse_args()
+
+    loaded = []
+    for path, system_id in ((args.sequence_a, args.system_a), (args.sequence_b, args.system_b)):
+        if base_of(system_id) is None:
+            parser.error(f"System {system_id} has no cell-frame \"base\" in SYSTEMS")
+        with open(path, "r") as f:
+            loaded.append((steps_of(json.load(f)), base_of(system_id)))
+    (steps_a, base_a), (steps_b, base_b) = loaded
+    pairs = conflicts(steps_a, base_a, steps_b, base_b)
+    if not pairs:
+        print("No overlap: the two tasks can run fully concurrently")
+    else:
+        print(f"{len(pairs)} intersecting step pairs; these segments are interleaved:")
+        for i, j in pairs:
+            print(f"  {args.sequence_a} step {i+1}  x  {args.sequence_b} step {j+1}")